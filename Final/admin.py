@@ -0,0 +1,20 @@
+# ================= ADMIN (endpoint tulis direktori penerima) =================
+# POST/DELETE /recipients menentukan siapa yang bisa membuka kotak, padahal server listen di
+# 0.0.0.0. Dengan RECIPIENT_ADMIN_TOKEN, request wajib membawa header X-Admin-Token yang sama.
+# Tanpa token, hanya request dari mesin server sendiri yang diterima, dan yang membawa header
+# Origin (dikirim browser dari halaman web lain) ditolak. CORS untuk route ini dimatikan di server.
+import hmac
+import os
+
+ADMIN_HEADER = "X-Admin-Token"
+LOCAL_ADDRS = {"127.0.0.1", "::1"}
+# Route yang tidak diberi header CORS (flask_cors memakai re.match terhadap path)
+CORS_RESOURCES = {r"^/(?!recipients(/|$)).*": {"origins": "*"}}
+
+
+def authorized(headers, remote_addr, token=None):
+    """True kalau request boleh mengubah direktori penerima."""
+    token = token if token is not None else os.getenv('RECIPIENT_ADMIN_TOKEN', "")
+    if token:
+        return hmac.compare_digest(headers.get(ADMIN_HEADER, "").encode(), token.encode())
+    return remote_addr in LOCAL_ADDRS and not headers.get("Origin")
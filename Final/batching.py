@@ -0,0 +1,127 @@
+# ================= MICRO-BATCH GEMINI =================
+# Saat ramai, tiap ucapan jadi satu generate_content lengkap dengan system_instruction.
+# Batcher ini mengumpulkan ucapan selama beberapa milidetik (max_wait) atau sampai
+# max_batch, mengirimnya sebagai satu prompt yang minta JSON array, lalu membagikan
+# hasilnya kembali ke tiap pemanggil (thread MQTT worker / request HTTP) yang menunggu.
+import json
+import queue
+import threading
+import time
+
+BATCH_PROMPT = """Berikut daftar ucapan pengguna yang terpisah satu sama lain (bernomor).
+Putuskan masing-masing sesuai aturan, lalu kembalikan HANYA JSON array dengan panjang {count},
+urut sesuai nomor, tiap elemen adalah objek keputusan untuk ucapan itu.
+
+{items}"""
+
+
+class _Pending:
+    __slots__ = ("text", "event", "result", "error")
+
+    def __init__(self, text):
+        self.text = text
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GeminiBatcher:
+    def __init__(self, model, max_batch=8, max_wait=0.02, timeout=15.0, max_in_flight=4):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_in_flight)  # batch paralel ke Gemini
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="gemini-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        """Blok sampai keputusan untuk `text` tersedia (dict hasil json.loads)."""
+        pending = _Pending(text)
+        self._queue.put(pending)
+        if not pending.event.wait(self.timeout):
+            raise TimeoutError("Batch Gemini tidak selesai tepat waktu")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Thread ini hanya mengumpulkan; tiap batch dikirim di thread sendiri
+        # supaya batch berikutnya bisa terkumpul selagi Gemini memproses.
+        while True:
+            batch = self._collect()
+            self._slots.acquire()
+            threading.Thread(target=self._dispatch, args=(batch,), daemon=True).start()
+
+    def _dispatch(self, batch):
+        try:
+            try:
+                if len(batch) == 1:
+                    results = [self._ask_single(batch[0].text)]
+                else:
+                    results = self._ask_batch([p.text for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as e:
+                # Batch gagal di-parse → jangan gagalkan semua, ulangi satu-satu
+                print(f"[Batch] Gagal ({len(batch)} item): {e}, fallback per item")
+                with self._stats_lock:
+                    self.fallbacks += 1
+                for pending in batch:
+                    try:
+                        pending.result = self._ask_single(pending.text)
+                    except Exception as single_error:
+                        pending.error = single_error
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(batch)
+        finally:
+            self._slots.release()
+            for pending in batch:
+                pending.event.set()
+
+    def _ask_single(self, text):
+        response = self.model.generate_content(text)
+        return json.loads(response.text.strip())
+
+    def _ask_batch(self, texts):
+        items = "\n".join(f"{i + 1}. {json.dumps(t, ensure_ascii=False)}" for i, t in enumerate(texts))
+        response = self.model.generate_content(BATCH_PROMPT.format(count=len(texts), items=items))
+        raw = response.text.strip()
+        if raw.startswith("```"):
+            raw = raw.strip("`").strip()
+            if raw.startswith("json"):
+                raw = raw[4:]
+        results = json.loads(raw)
+        if not isinstance(results, list) or len(results) != len(texts):
+            raise ValueError(f"Jumlah hasil {len(results) if isinstance(results, list) else '?'} != {len(texts)}")
+        return results
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "fallbacks": self.fallbacks,
+            "queue_depth": self._queue.qsize(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
@@ -0,0 +1,106 @@
+# ================= DECISION CACHE (LRU + TTL) =================
+# Ucapan yang sama ("paket untuk nadia") tidak perlu ditanyakan ulang ke Gemini.
+# Key = teks ter-normalisasi, dikunci ke versi daftar penerima: kalau daftar berubah,
+# seluruh isi cache otomatis dibuang. Snapshot ke disk (opsional) supaya restart tetap "hangat".
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent import normalize
+
+
+class DecisionCache:
+    def __init__(self, maxsize=1024, ttl=6 * 3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, decision)
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._data:
+                print(f"[Cache] Daftar penerima berubah ({self.version} → {version}), cache dikosongkan")
+            self._data.clear()
+            self.version = version
+
+    def get(self, text, version):
+        key = normalize(text)
+        with self._lock:
+            self._check_version(version)
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, text, version, decision):
+        key = normalize(text)
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = (time.time() + self.ttl, dict(decision))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "version": self.version,
+        }
+
+    # ---------- snapshot ke disk ----------
+    def save(self):
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[k, exp, d] for k, (exp, d) in self._data.items() if exp > now]
+            snapshot = {"version": self.version, "entries": entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+        print(f"[Cache] Snapshot disimpan: {len(entries)} entri → {self.path}")
+
+    def load(self, version):
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Cache] Snapshot tidak bisa dibaca: {e}")
+            return 0
+        if snapshot.get("version") != version:
+            print("[Cache] Snapshot dari daftar penerima lama, diabaikan")
+            return 0
+        now = time.time()
+        with self._lock:
+            self.version = version
+            for key, expires_at, decision in snapshot.get("entries", [])[-self.maxsize:]:
+                if expires_at > now:
+                    self._data[key] = (expires_at, decision)
+        print(f"[Cache] Snapshot dimuat: {len(self._data)} entri")
+        return len(self._data)
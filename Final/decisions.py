@@ -0,0 +1,88 @@
+# ================= DECISION PIPELINE (main.py, main_async.py & maintest.py) =================
+# Urutan keputusan untuk satu ucapan sama di semua server (Flask, ASGI, percakapan):
+#   intent lokal → cache keputusan → Gemini (lewat single-flight + breaker) → fallback lokal
+# Bagian yang tidak tergantung sync/async ada di sini supaya server-server tidak menyimpang;
+# server hanya menyediakan cara memanggil Gemini-nya sendiri.
+import atexit
+import os
+
+from decision_cache import DecisionCache
+from directory import RecipientDirectory
+from intent import RESPONSES, IntentEngine, normalize
+from prompts import user_prompt
+from recipients import RecipientIndex
+
+DEFAULT_RECIPIENTS = ["aisyah", "rabiathul", "nadia"]  # Isi awal kalau database masih kosong
+
+
+class DecisionPipeline:
+    def __init__(self, db_path="recipients.db", poll_interval=5.0, prompt_candidates=5,
+                 cache_size=1024, cache_ttl=6 * 3600, cache_path=None, conversational=False):
+        self.prompt_candidates = prompt_candidates
+        self.index = RecipientIndex([])
+        self.intent = IntentEngine([], conversational=conversational, index=self.index)
+        # Direktori penerima (SQLite) → index di memori; berubah di database = index ikut diperbarui
+        self.directory = RecipientDirectory(db_path, seed=DEFAULT_RECIPIENTS, poll_interval=poll_interval)
+        self.directory.on_change(self._on_recipients_changed)
+        # Cache keputusan Gemini (key: teks ter-normalisasi + versi daftar penerima)
+        self.cache = DecisionCache(maxsize=cache_size, ttl=cache_ttl, path=cache_path)
+        self.cache.load(self.index.version)
+        atexit.register(self.cache.save)
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(
+            db_path=os.getenv('RECIPIENT_DB', "recipients.db"),
+            poll_interval=float(os.getenv('RECIPIENT_POLL_S', 5)),
+            prompt_candidates=int(os.getenv('PROMPT_CANDIDATES', 5)),
+            cache_size=int(os.getenv('DECISION_CACHE_SIZE', 1024)),
+            cache_ttl=int(os.getenv('DECISION_CACHE_TTL', 6 * 3600)),
+            cache_path=os.getenv('DECISION_CACHE_PATH'),  # contoh: decision_cache.json
+            **kwargs,
+        )
+
+    def _on_recipients_changed(self, names):
+        self.index.set_names(names)
+        self.intent.set_names(names)
+
+    def build_prompt(self, text):
+        # Hanya kandidat yang mirip yang dikirim → ukuran prompt tidak tergantung jumlah penghuni
+        return user_prompt(text, self.index.candidates(text, limit=self.prompt_candidates))
+
+    def flight_key(self, text):
+        return normalize(text), self.index.version
+
+    def before_gemini(self, text):
+        """Jawaban tanpa Gemini (intent lokal atau cache), atau None kalau Gemini perlu ditanya."""
+        local = self.intent.classify(text)
+        if local:
+            print(f"⚡ Intent lokal: {local}")
+            return local
+        cached = self.cache.get(text, self.index.version)
+        if cached:
+            print(f"💾 Cache hit: {cached}")
+        return cached
+
+    def remember(self, text, result):
+        if result.get("action") == "open" and not self.index.resolve(result.get("name")):
+            # Nama dari Gemini tidak ada di direktori → jangan buka, jangan di-cache
+            print(f"⚠️ Gemini membuka untuk nama tak terdaftar: {result.get('name')!r}")
+            return {"action": "ask_name", "message": "Paket atas nama siapa ya?", "tts": RESPONSES["ask_name"]}
+        self.cache.put(text, self.index.version, result)
+        return result
+
+    def fallback(self, text, error):
+        # Mode degradasi: hanya nama yang cocok persis yang membuka kotak
+        print(f"[Gemini Error] Fallback: {error}")
+        return self.intent.fallback(text)
+
+    def recipients(self):
+        return {"recipients": self.directory.names, "version": self.index.version}
+
+    def add_recipient(self, name, unit=None):
+        self.directory.add(name, unit)
+        return {"recipients": len(self.directory.names), "version": self.index.version}
+
+    def remove_recipient(self, name):
+        self.directory.remove(name)
+        return {"recipients": len(self.directory.names), "version": self.index.version}
@@ -0,0 +1,92 @@
+# ================= RECIPIENT DIRECTORY (SQLite) =================
+# Daftar penerima tidak lagi ditulis di WHITELIST & system_instruction. Sumbernya tabel
+# SQLite (RECIPIENT_DB); saat isinya berubah — lewat endpoint /recipients atau proses lain
+# yang menulis ke file yang sama — index di memori dibangun ulang tanpa restart.
+# Ke Gemini hanya dikirim beberapa kandidat nama yang mirip dengan ucapan (lihat
+# RecipientIndex.candidates), jadi prompt tetap pendek walau penghuninya ribuan.
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipients (
+    name TEXT PRIMARY KEY,
+    unit TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class RecipientDirectory:
+    def __init__(self, path="recipients.db", seed=(), poll_interval=5.0):
+        self.path = path
+        self.reloads = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(_SCHEMA)
+            if seed and not self._db.execute("SELECT 1 FROM recipients LIMIT 1").fetchone():
+                now = time.time()
+                self._db.executemany("INSERT INTO recipients (name, updated_at) VALUES (?, ?)",
+                                     [(name.lower(), now) for name in seed])
+        self.names = self._load()
+        self._data_version = self._version()
+        if poll_interval:
+            threading.Thread(target=self._watch, args=(poll_interval,),
+                             name="recipient-watch", daemon=True).start()
+
+    def on_change(self, fn):
+        """fn(names) dipanggil setiap daftar penerima berubah (dan sekali saat didaftarkan)."""
+        self._listeners.append(fn)
+        fn(self.names)
+
+    def _load(self):
+        with self._lock:
+            rows = self._db.execute("SELECT name FROM recipients WHERE active = 1 ORDER BY name").fetchall()
+        return [row[0] for row in rows]
+
+    def _version(self):
+        # data_version berubah kalau koneksi LAIN commit ke database ini
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                version = self._version()
+                if version != self._data_version:
+                    self._data_version = version
+                    self.reload()
+            except sqlite3.Error as e:
+                print(f"[Directory] Gagal cek perubahan: {e}")
+
+    def reload(self):
+        names = self._load()
+        if names == self.names:
+            return False
+        self.names = names
+        self.reloads += 1
+        print(f"[Directory] {len(names)} penerima aktif, index dibangun ulang")
+        for fn in self._listeners:
+            fn(names)
+        return True
+
+    def add(self, name, unit=None):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO recipients (name, unit, active, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET unit = excluded.unit, active = 1, updated_at = excluded.updated_at",
+                (name.strip().lower(), unit, time.time()))
+        return self.reload()
+
+    def remove(self, name):
+        with self._lock, self._db:
+            self._db.execute("UPDATE recipients SET active = 0, updated_at = ? WHERE name = ?",
+                             (time.time(), name.strip().lower()))
+        return self.reload()
+
+    def stats(self):
+        return {"recipients": len(self.names), "reloads": self.reloads, "path": self.path}
@@ -0,0 +1,133 @@
+# ================= LOCAL INTENT ENGINE =================
+# Jalur cepat tanpa LLM: ucapan yang jelas ("paket untuk aisyah", "hallo",
+# "sudah, terima kasih") langsung dijawab lokal dalam < 1 ms.
+# Kalau hasilnya ragu, classify() mengembalikan None dan pemanggil lanjut ke Gemini.
+# Kotak hanya dibuka lokal kalau, setelah kata pengisi dibuang, yang tersisa PERSIS satu nama:
+# "bukan nadia, untuk budi", "dari nadia untuk budi", "aisyah temannya siapa" → Gemini.
+import re
+
+# Kata/frasa pengisi yang sering muncul di depan nama penerima
+FILLER_PHRASES = [
+    "paket atas nama", "paket untuk", "paket buat", "paketnya untuk", "paketnya buat",
+    "atas nama", "nama saya", "namanya", "untuk", "buat", "punya", "ada paket", "paket",
+    "permisi", "mbak", "mba", "mas", "kak", "kakak", "bu", "ibu", "pak", "bapak", "dek", "adik",
+    "saudari", "saudara", "ini", "itu", "saya", "aku", "ya", "dong", "nih", "deh", "kok",
+    "tolong", "mau", "antar", "kirim", "ada", "kurir",
+]
+
+# Frasa pembawa nama: kalau muncul, kata sesudahnya hampir pasti sebuah nama
+CARRIER_PHRASES = ["paket atas nama", "atas nama", "paket untuk", "paket buat", "nama saya", "namanya", "untuk", "buat"]
+
+WAKE_WORDS = ["hallo", "halo"]
+SLEEP_PHRASES = ["sudah diambil", "sudah ambil", "sudah selesai", "terima kasih", "makasih", "selesai"]
+
+# Negasi membalik arti nama di dekatnya ("bukan nadia") → tidak pernah diputuskan lokal
+NEGATIONS = {"bukan", "tidak", "tak", "nggak", "ngga", "gak", "enggak", "jangan", "belum"}
+
+# Kata yang bukan nama walau muncul setelah frasa pembawa ("untuk siapa ya?");
+# "dari" = pengirim, bukan penerima ("paket dari nadia")
+NOT_A_NAME = {"siapa", "apa", "kamu", "anda", "dia", "mereka", "kami", "kita", "saya", "aku", "sini", "situ",
+              "rumah", "dari"} | NEGATIONS
+
+RESPONSES = {
+    "open": "Baik, paket atas nama {name}. Silakan diambil.",
+    "deny": "Maaf, nama tersebut tidak terdaftar pada paket ini.",
+    "ask_name": "Permisi, ada paket. Dengan siapa saya berbicara?",
+    "wake": "Permisi, ada paket. Dengan siapa saya berbicara?",
+    "sleep": "Terima kasih. Sampai jumpa.",
+}
+
+_NON_LETTER = re.compile(r"[^a-z\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def _phrase_regex(phrases):
+    # Frasa terpanjang duluan supaya "paket untuk" menang atas "paket"
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(p) for p in ordered) + r")\b")
+
+
+def normalize(text):
+    """Lowercase, buang tanda baca & spasi ganda."""
+    text = _NON_LETTER.sub(" ", (text or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class IntentEngine:
+    """Klasifikasi intent lokal: open / deny / ask_name / wake / sleep."""
+
+    def __init__(self, names, conversational=True, index=None):
+        # conversational=False → hanya open/deny/ask_name (server tanpa sleep mode)
+        # index (RecipientIndex, opsional) → nama yang meleset dicocokkan secara fuzzy
+        self.conversational = conversational
+        self.index = index
+        self._filler_re = _phrase_regex(FILLER_PHRASES)
+        self._carrier_re = _phrase_regex(CARRIER_PHRASES)
+        self._wake_re = _phrase_regex(WAKE_WORDS)
+        self._sleep_re = _phrase_regex(SLEEP_PHRASES)
+        self.set_names(names)
+
+    def set_names(self, names):
+        # Satu regex alternation untuk semua penerima (multi-pattern match sekali jalan)
+        self.names = sorted({n.lower() for n in names})
+        self._names_re = _phrase_regex(self.names) if self.names else None
+
+    def classify(self, text):
+        norm = normalize(text)
+
+        if self.conversational:
+            if self._wake_re.search(norm):
+                return {"action": "wake", "tts": RESPONSES["wake"]}
+            if self._sleep_re.search(norm) and not self._find_names(norm):
+                return {"action": "sleep", "tts": RESPONSES["sleep"]}
+
+        found = self._find_names(norm)
+        rest = self._filler_re.sub(" ", norm).split()
+        if found:
+            # Nama terdaftar disebut, tapi ada kata lain/negasi/nama kedua → biar Gemini yang putuskan
+            return self.open_decision(found[0]) if rest == found[0].split() else None
+        if not rest:
+            return {"action": "ask_name", "message": "Paket atas nama siapa ya?", "tts": RESPONSES["ask_name"]}
+
+        if self.index is not None:
+            whole = self.index.lookup(" ".join(rest))
+            if whole and whole[1] == 1.0:
+                return self.open_decision(whole[0])  # Hanya nama, kunci fonetik sama persis (aisah → aisyah)
+            if self.index.best_match(" ".join(rest)):
+                return None  # Mirip ("kadia" ~ nadia) atau ada kata lain → Gemini memutuskan dengan kandidat
+
+        # "ini buat budi" → ada frasa pembawa + sisa 1-2 kata nama → nama tidak terdaftar
+        if self._carrier_re.search(norm) and len(rest) <= 2 and not NOT_A_NAME.intersection(rest):
+            return {"action": "deny", "message": "Maaf, nama tidak terdaftar.", "tts": RESPONSES["deny"]}
+
+        return None
+
+    def fallback(self, text):
+        """Keputusan saat Gemini gagal/circuit open: hanya ucapan yang isinya persis satu nama
+        (teks atau kunci fonetik) yang membuka kotak. Nama yang sekadar mirip, atau disebut
+        bersama kata lain/negasi, ditanya ulang, bukan dibuka."""
+        norm = normalize(text)
+        found = self._find_names(norm)
+        rest = self._filler_re.sub(" ", norm).split()
+        if found and rest == found[0].split():
+            return self.open_decision(found[0])
+        whole = self.index.lookup(" ".join(rest)) if self.index is not None and not found and rest else None
+        if whole and whole[1] == 1.0:
+            return self.open_decision(whole[0])
+        hit = self.index.best_match(norm) if self.index is not None and not found else None
+        if found or hit:
+            return {"action": "ask_name", "message": "Paket atas nama siapa ya?", "tts": RESPONSES["ask_name"]}
+        return {"action": "deny", "message": "Maaf, nama tidak terdaftar.", "tts": RESPONSES["deny"]}
+
+    def open_decision(self, name):
+        display = name.title()
+        return {"action": "open", "name": display, "tts": RESPONSES["open"].format(name=display)}
+
+    def _find_names(self, norm):
+        if self._names_re is None:
+            return []
+        found = []
+        for match in self._names_re.finditer(norm):
+            if match.group(0) not in found:
+                found.append(match.group(0))
+        return found
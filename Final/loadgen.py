@@ -0,0 +1,196 @@
+# ================= LOAD GENERATOR =================
+# Kirim traffic HTTP / MQTT dengan laju tetap (open loop) lalu laporkan throughput
+# dan persentil latency. Hanya butuh stdlib + paho, jadi bisa jalan offline bersama
+# server yang dijalankan dengan GEMINI_FAKE=1 dan broker lokal (MQTT_BROKER=localhost).
+#
+#   python loadgen.py http --url http://localhost:5000/package-voice --rate 20 --duration 30
+#   python loadgen.py http --url http://localhost:5000/api/chat --payload chat --rate 5
+#   python loadgen.py mqtt --broker localhost --boxes 50 --rate 50 --duration 30
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+UTTERANCES = [
+    "paket untuk aisyah",
+    "ini buat mbak nadia",
+    "atas nama rabiathul",
+    "kiriman untuk budi",
+    "hallo",
+    "em paket untuk siapa ya",
+    "saya aisyah",
+    "untuk pak joko",
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def sent_one(self):
+        with self._lock:
+            self.sent += 1
+
+    def ok(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def report(self, elapsed):
+        ordered = sorted(self.latencies)
+
+        def pct(p):
+            if not ordered:
+                return float("nan")
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        done = len(ordered)
+        print(f"\nsent {self.sent}, ok {done}, error {self.errors}, lost {self.sent - done - self.errors}")
+        print(f"throughput {done / elapsed:.1f} req/s selama {elapsed:.1f}s")
+        print(f"latency ms  p50 {pct(0.5):.1f}  p90 {pct(0.9):.1f}  p99 {pct(0.99):.1f}  "
+              f"max {(ordered[-1] * 1000 if ordered else float('nan')):.1f}")
+
+
+def paced(rate, duration):
+    """Yield pada jadwal tetap; request tidak menunggu request sebelumnya selesai."""
+    interval = 1.0 / rate
+    start = time.monotonic()
+    for i in itertools.count():
+        due = start + i * interval
+        if due - start >= duration:
+            return
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield i
+
+
+def http_payload(kind, text):
+    if kind == "chat":
+        return {"user_id": 1, "message": text}
+    return {"text": text}
+
+
+def run_http(args, recorder):
+    def one(i):
+        body = json.dumps(http_payload(args.payload, random.choice(UTTERANCES))).encode()
+        req = urllib.request.Request(args.url, data=body, headers={
+            "Content-Type": "application/json",
+            "X-Device-Id": f"loadgen-{i % args.boxes}",
+        })
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(req, timeout=args.timeout) as resp:
+                resp.read()
+            recorder.ok(time.monotonic() - started)
+        except (urllib.error.URLError, OSError) as e:
+            recorder.error()
+            if args.verbose:
+                print(f"[HTTP] {e}")
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in paced(args.rate, args.duration):
+            recorder.sent_one()
+            pool.submit(one, i)
+
+
+def run_mqtt(args, recorder):
+    import paho.mqtt.client as mqtt
+
+    # Tiap box virtual hanya punya satu pesan in-flight supaya balasan bisa dicocokkan
+    in_flight = {}
+    lock = threading.Lock()
+
+    def on_connect(client, userdata, flags, rc):
+        client.subscribe(f"{args.prefix}/+/response")
+
+    def on_message(client, userdata, msg):
+        box_id = msg.topic.split("/")[1]
+        try:
+            action = json.loads(msg.payload.decode()).get("action")
+        except ValueError:
+            action = None
+        if action == "speak":
+            return  # lanjutan dari 'open' yang sudah dihitung
+        with lock:
+            started = in_flight.pop(box_id, None)
+        if started is not None:
+            recorder.ok(time.monotonic() - started)
+
+    client = mqtt.Client()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+    time.sleep(1.0)
+
+    boxes = itertools.cycle(f"loadgen{n}" for n in range(args.boxes))
+    for _ in paced(args.rate, args.duration):
+        box_id = next(boxes)
+        now = time.monotonic()
+        with lock:
+            started = in_flight.get(box_id)
+            if started is not None:
+                if now - started < args.timeout:
+                    continue  # box masih menunggu balasan, lewati slot ini
+                in_flight.pop(box_id)
+                recorder.error()
+            in_flight[box_id] = now
+        recorder.sent_one()
+        client.publish(f"{args.prefix}/{box_id}/text", random.choice(UTTERANCES))
+
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        with lock:
+            if not in_flight:
+                break
+        time.sleep(0.05)
+    with lock:
+        for _ in in_flight:
+            recorder.error()
+    client.loop_stop()
+    client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator Smart Package Box")
+    sub = parser.add_subparsers(dest="mode", required=True)
+    for mode in ("http", "mqtt"):
+        p = sub.add_parser(mode)
+        p.add_argument("--rate", type=float, default=10.0, help="request per detik")
+        p.add_argument("--duration", type=float, default=30.0, help="detik")
+        p.add_argument("--timeout", type=float, default=20.0)
+        p.add_argument("--boxes", type=int, default=20, help="jumlah box/device virtual")
+        p.add_argument("--verbose", action="store_true")
+    http = sub.choices["http"]
+    http.add_argument("--url", default="http://localhost:5000/package-voice")
+    http.add_argument("--payload", choices=("text", "chat"), default="text")
+    http.add_argument("--concurrency", type=int, default=64)
+    mqttp = sub.choices["mqtt"]
+    mqttp.add_argument("--broker", default="localhost")
+    mqttp.add_argument("--port", type=int, default=1883)
+    mqttp.add_argument("--prefix", default="package")
+    args = parser.parse_args()
+
+    recorder = Recorder()
+    started = time.monotonic()
+    if args.mode == "http":
+        run_http(args, recorder)
+    else:
+        run_mqtt(args, recorder)
+    recorder.report(time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,100 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 import json
+import time
+import metrics
+import tracing
+from workers import WorkerPool
+from singleflight import SingleFlight
+from batching import GeminiBatcher
+from circuit import CircuitBreaker
+from admin import CORS_RESOURCES, authorized
+from decisions import DecisionPipeline
+from prompts import DECISION_INSTRUCTION
+from topics import DEFAULT_BOX, ShardFilter, parse_topic, subscriptions, topic_for
 
 load_dotenv()
+if os.getenv('GEMINI_FAKE') == '1':
+    import fake_genai as genai  # Benchmark offline, lihat fake_genai.py
+else:
+    import google.generativeai as genai
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, resources=CORS_RESOURCES)  # /recipients tanpa CORS (lihat admin.py)
 
 # ================= MQTT SETUP (untuk balas ke ESP32) =================
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
-MQTT_SUB_TOPIC = "package/text"  # ESP32 kirim text ke sini
-MQTT_PUB_TOPIC = "package/response"  # Laptop balas JSON ke ESP32
-
-mqtt_client = mqtt.Client()
-mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-mqtt_client.loop_start()
+MQTT_BROKER = os.getenv('MQTT_BROKER', "broker.hivemq.com")
+MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
+# Topic per box: package/<box_id>/text (ESP32 → laptop), package/<box_id>/response (laptop → ESP32)
+MQTT_SHARE_GROUP = os.getenv('MQTT_SHARE_GROUP')  # Shared subscription antar beberapa server
+shard = ShardFilter(share_group=MQTT_SHARE_GROUP)  # SERVER_SHARD=i/n → hanya proses box milik shard ini
+
+def send_response_to_esp32(response_json, box_id=DEFAULT_BOX):
+    topic = topic_for(box_id, "response")
+    response_json = tracing.tag(response_json)  # ESP32 mengembalikan trace id di status
+    with metrics.timed("mqtt_publish"):
+        mqtt_client.publish(topic, json.dumps(response_json))
+    print(f"📡 Response ke {topic}: {response_json}")
+
+# Proses Gemini di worker pool, bukan di thread network paho
+mqtt_workers = WorkerPool(
+    "mqtt",
+    workers=int(os.getenv('MQTT_WORKERS', 4)),
+    queue_size=int(os.getenv('MQTT_QUEUE_SIZE', 64)),
+    deadline=float(os.getenv('MQTT_DEADLINE_S', 8)),
+    on_wait=lambda waited: metrics.observe("queue_wait", waited),
+)
 
-def send_response_to_esp32(response_json):
-    mqtt_client.publish(MQTT_PUB_TOPIC, json.dumps(response_json))
-    print(f"📡 Response ke ESP32: {response_json}")
+def process_text(box_id, user_text, trace):
+    with tracing.activate(trace):
+        trace.event("dequeued")
+        try:
+            decision = extract_name_with_gemini(user_text)
+            send_response_to_esp32(decision, box_id)
+        except Exception as e:
+            print(f"[MQTT Error]: {e}")
+            send_response_to_esp32({"action": "error", "message": "Server error"}, box_id)
+
+def on_text_expired(box_id, user_text, trace):
+    with tracing.activate(trace):
+        trace.event("expired")
+        send_response_to_esp32({"action": "error", "message": "Server sibuk, coba lagi."}, box_id)
 
 # Subscribe untuk nerima text dari ESP32
 def on_mqtt_message(client, userdata, msg):
-    try:
-        user_text = msg.payload.decode().strip()
-        print(f"👤 Text dari ESP32: {user_text}")
-        decision = extract_name_with_gemini(user_text)
-        send_response_to_esp32(decision)
-    except Exception as e:
-        print(f"[MQTT Error]: {e}")
-        send_response_to_esp32({"action": "error", "message": "Server error"})
+    with metrics.timed("mqtt_receive"):
+        handle_mqtt_message(msg)
+
+def handle_mqtt_message(msg):
+    box_id, kind = parse_topic(msg.topic)
+    if kind not in ("text", "status") or not shard.owns(box_id):
+        return
+    if kind == "status":
+        # Echo trace dari firmware menutup trace ucapan (latency ucapan → servo)
+        status = tracing.record_status(msg.payload.decode().strip())
+        print(f"📟 Status {box_id}: {status}")
+        return
+    user_text = msg.payload.decode().strip()
+    trace = tracing.tracer.start(source="mqtt", box=box_id)
+    print(f"👤 Text dari {box_id} [{trace.trace_id}]: {user_text}")
+    if not mqtt_workers.submit(process_text, box_id, user_text, trace, on_expired=on_text_expired):
+        on_text_expired(box_id, user_text, trace)
+
+def on_mqtt_connect(client, userdata, flags, rc):
+    # Subscribe ulang setiap (re)connect: text + status semua box
+    for kind in ("text", "status"):
+        for topic in subscriptions(kind, MQTT_SHARE_GROUP):
+            client.subscribe(topic)
+    print(f"✅ MQTT connected (rc={rc}), shard {shard.describe()}")
 
+mqtt_client = mqtt.Client()
+mqtt_client.on_connect = on_mqtt_connect
 mqtt_client.on_message = on_mqtt_message
-mqtt_client.subscribe(MQTT_SUB_TOPIC)
+mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+mqtt_client.loop_start()
 
 # ================= GEMINI AI SETUP (sama seperti punyamu) =================
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
@@ -45,49 +103,52 @@ MODEL_NAME = "gemini-1.5-flash"
 
 model = genai.GenerativeModel(
     MODEL_NAME,
-    system_instruction="""  # [Sama persis seperti punyamu – daftar nama: aisyah, rabiathul, nadia ]
-    Kamu adalah asisten pintar untuk Smart Package Box.
-    Tugasmu: dari ucapan pengguna, tentukan apakah nama yang disebutkan termasuk dalam daftar penerima paket resmi.
-    
-    Daftar nama resmi (case-insensitive):
-    - aisyah
-    - rabiathul
-    - nadia
-    
-    Aturan:
-    1. Jika ucapan mengandung salah satu nama di atas (bisa dengan tambahan kata seperti "untuk", "buat", "mbak", "paket untuk", dll), kembalikan JSON:
-       {"action": "open", "name": "NamaAsli"}
-    
-    2. Jika nama tidak ada di daftar, kembalikan:
-       {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
-    
-    3. Jika belum jelas atau tidak ada nama sama sekali, kembalikan:
-       {"action": "ask_name", "message": "Paket atas nama siapa ya?"}
-    
-    Hanya kembalikan JSON valid. Jangan tambahkan teks lain.
-    Contoh:
-    Input: "Paket untuk Aisyah"
-    Output: {"action": "open", "name": "Aisyah"}
-    
-    Input: "Ini buat Budi"
-    Output: {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
-    """
+    system_instruction=DECISION_INSTRUCTION,
+)
+
+# Intent lokal, direktori penerima, cache keputusan & fallback (sama dengan server lainnya)
+decisions = DecisionPipeline.from_env()
+
+# Request identik yang datang bersamaan cukup memanggil Gemini sekali
+gemini_flight = SingleFlight()
+
+# Gemini down/lambat → circuit open, semua request langsung ke fallback lokal (direktori penerima)
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=float(os.getenv('GEMINI_CB_THRESHOLD', 0.5)),
+    cooldown=float(os.getenv('GEMINI_CB_COOLDOWN_S', 30)),
+    call_timeout=float(os.getenv('GEMINI_TIMEOUT_S', 5)),
 )
 
-WHITELIST = ["aisyah", "rabiathul", "nadia"]
+# Opsional: kumpulkan ucapan beberapa ms lalu kirim sebagai satu prompt (GEMINI_BATCH=1)
+batcher = None
+if os.getenv('GEMINI_BATCH', '0') == '1':
+    batcher = GeminiBatcher(
+        model,
+        max_batch=int(os.getenv('GEMINI_BATCH_MAX', 8)),
+        max_wait=float(os.getenv('GEMINI_BATCH_WAIT_MS', 20)) / 1000,
+    )
+
+def ask_gemini(text):
+    if batcher:
+        with metrics.timed("gemini"):
+            result = batcher.submit(decisions.build_prompt(text))
+    else:
+        with metrics.timed("gemini"):
+            response = model.generate_content(decisions.build_prompt(text))
+        with metrics.timed("json_parse"):
+            result = json.loads(response.text.strip())
+    return decisions.remember(text, result)
 
 def extract_name_with_gemini(text):
+    # Jalur cepat: ucapan yang jelas dijawab lokal tanpa nunggu Gemini
+    decision = decisions.before_gemini(text)
+    if decision:
+        return decision
     try:
-        response = model.generate_content(text)
-        result = json.loads(response.text.strip())
-        return result
+        return gemini_flight.do(decisions.flight_key(text), gemini_breaker.call, ask_gemini, text)
     except Exception as e:
-        print(f"[Gemini Error] Fallback: {e}")
-        text_lower = text.lower()
-        for name in WHITELIST:
-            if name in text_lower:
-                return {"action": "open", "name": name.capitalize()}
-        return {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
+        return decisions.fallback(text, e)
 
 # ================= ROUTE (HTTP fallback, kalau MQTT gagal) =================
 @app.route('/package-voice', methods=['POST'])
@@ -98,21 +159,74 @@ def handle_voice_input():
             return jsonify({"error": "Text input required"}), 400
 
         user_speech = data['text'].strip()
-        print(f"👤 HTTP Input: {user_speech}")
+        trace = tracing.tracer.start(request.headers.get('X-Trace-Id'), source="http")
+        print(f"👤 HTTP Input [{trace.trace_id}]: {user_speech}")
 
-        decision = extract_name_with_gemini(user_speech)
-        return jsonify(decision)
+        with tracing.activate(trace):
+            decision = extract_name_with_gemini(user_speech)
+            return jsonify(tracing.tag(decision))
 
     except Exception as e:
         print(f"[ERROR] {e}")
         return jsonify({"error": "Server error"}), 500
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/recipients', methods=['GET'])
+def list_recipients():
+    return jsonify(decisions.recipients())
+
+@app.route('/recipients', methods=['POST'])
+def add_recipient():
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    data = request.get_json() or {}
+    name = (data.get('name') or "").strip()
+    if not name:
+        return jsonify({"error": "Nama wajib diisi"}), 400
+    return jsonify(decisions.add_recipient(name, data.get('unit'))), 201
+
+@app.route('/recipients/<name>', methods=['DELETE'])
+def remove_recipient(name):
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    return jsonify(decisions.remove_recipient(name))
+
+@app.route('/traces')
+def traces():
+    return jsonify(tracing.tracer.dump(request.args.get('limit', 100, type=int)))
+
+@app.route('/traces/<trace_id>')
+def trace_detail(trace_id):
+    trace = tracing.tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace tidak ditemukan"}), 404
+    return jsonify(trace.to_dict())
+
 @app.route('/health')
 def health():
-    return jsonify({"status": "OK", "model": MODEL_NAME})
+    return jsonify({"status": "OK", "model": MODEL_NAME, "decision_cache": decisions.cache.stats(),
+                    "mqtt_queue": mqtt_workers.stats(),
+                    "singleflight": gemini_flight.stats(),
+                    "batching": batcher.stats() if batcher else None,
+                    "circuit": gemini_breaker.stats(),
+                    "tracing": tracing.tracer.stats(),
+                    "directory": decisions.directory.stats()})
 
 if __name__ == '__main__':
     print("🚀 Laptop: Gemini AI Server Aktif! (MQTT ready)")
     print(f"Model: {MODEL_NAME}")
-    print("ESP32 kirim text ke 'package/text' via MQTT")
+    print("ESP32 kirim text ke 'package/<box_id>/text' via MQTT")
     app.run(host='0.0.0.0', port=5000, debug=True)
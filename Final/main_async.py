@@ -0,0 +1,250 @@
+# ================= ASGI SERVER (asyncio) =================
+# Versi async dari main.py: satu event loop untuk HTTP (Quart), MQTT (aiomqtt) dan Gemini
+# (generate_content_async). Ratusan ucapan bisa menunggu Gemini bersamaan tanpa satu
+# thread per request; jumlah panggilan Gemini & pesan MQTT yang diproses dibatasi semaphore.
+#
+#   pip install quart quart-cors aiomqtt
+#   python main_async.py                      (hypercorn bawaan Quart)
+#   uvicorn main_async:app --port 5000        (atau server ASGI lain)
+import asyncio
+import json
+import os
+import time
+
+import aiomqtt
+from dotenv import load_dotenv
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors, cors_exempt
+
+import metrics
+import tracing
+from admin import authorized
+from circuit import CircuitBreaker
+from decisions import DecisionPipeline
+from prompts import DECISION_INSTRUCTION
+from singleflight import AsyncSingleFlight
+from topics import DEFAULT_BOX, ShardFilter, parse_topic, subscriptions, topic_for
+
+load_dotenv()
+if os.getenv('GEMINI_FAKE') == '1':
+    import fake_genai as genai  # Benchmark offline, lihat fake_genai.py
+else:
+    import google.generativeai as genai
+
+app = cors(Quart(__name__))
+
+# ================= MQTT SETUP =================
+MQTT_BROKER = os.getenv('MQTT_BROKER', "broker.hivemq.com")
+MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
+MQTT_SHARE_GROUP = os.getenv('MQTT_SHARE_GROUP')  # Shared subscription antar beberapa server
+shard = ShardFilter(share_group=MQTT_SHARE_GROUP)  # SERVER_SHARD=i/n → hanya proses box milik shard ini
+
+# Batas konkurensi (semaphore dibuat di startup, di event loop yang benar)
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', 64))
+MQTT_INFLIGHT = int(os.getenv('MQTT_INFLIGHT', 256))
+gemini_slots = None
+mqtt_slots = None
+mqtt_client = None  # aiomqtt.Client yang sedang terhubung
+in_flight = {"gemini": 0, "mqtt": 0, "http": 0}
+_tasks = set()
+
+# ================= GEMINI AI SETUP =================
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+MODEL_NAME = "gemini-1.5-flash"
+model = genai.GenerativeModel(MODEL_NAME, system_instruction=DECISION_INSTRUCTION)
+
+# Intent lokal, direktori penerima, cache keputusan & fallback (sama dengan server lainnya)
+decisions = DecisionPipeline.from_env()
+
+gemini_flight = AsyncSingleFlight()
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=float(os.getenv('GEMINI_CB_THRESHOLD', 0.5)),
+    cooldown=float(os.getenv('GEMINI_CB_COOLDOWN_S', 30)),
+    call_timeout=float(os.getenv('GEMINI_TIMEOUT_S', 5)),
+)
+
+async def ask_gemini(text):
+    with metrics.timed("gemini"):
+        response = await model.generate_content_async(decisions.build_prompt(text))
+    with metrics.timed("json_parse"):
+        result = json.loads(response.text.strip())
+    return decisions.remember(text, result)
+
+async def call_gemini(text):
+    # Slot lokal dulu, baru breaker: antre semaphore tidak ikut dihitung ke timeout Gemini
+    # (dan tidak membuat circuit open saat yang lambat sebenarnya antrean kita sendiri)
+    waiting = time.perf_counter()
+    async with gemini_slots:
+        metrics.observe("queue_wait", time.perf_counter() - waiting)
+        in_flight["gemini"] += 1
+        try:
+            return await gemini_breaker.call_async(ask_gemini, text)
+        finally:
+            in_flight["gemini"] -= 1
+
+async def extract_name_with_gemini(text):
+    decision = decisions.before_gemini(text)
+    if decision:
+        return decision
+    try:
+        return await gemini_flight.do(decisions.flight_key(text), call_gemini, text)
+    except Exception as e:
+        return decisions.fallback(text, e)
+
+# ================= MQTT (async) =================
+async def send_response_to_esp32(response_json, box_id=DEFAULT_BOX):
+    topic = topic_for(box_id, "response")
+    response_json = tracing.tag(response_json)
+    if mqtt_client is None:
+        print(f"[MQTT] Belum terhubung, respons ke {topic} dibuang")
+        return
+    with metrics.timed("mqtt_publish"):
+        await mqtt_client.publish(topic, json.dumps(response_json))
+    print(f"📡 Response ke {topic}: {response_json}")
+
+async def process_text(box_id, user_text, trace):
+    in_flight["mqtt"] += 1
+    try:
+        with tracing.activate(trace):
+            try:
+                decision = await extract_name_with_gemini(user_text)
+                await send_response_to_esp32(decision, box_id)
+            except Exception as e:
+                print(f"[MQTT Error]: {e}")
+                await send_response_to_esp32({"action": "error", "message": "Server error"}, box_id)
+    finally:
+        in_flight["mqtt"] -= 1
+        mqtt_slots.release()
+
+async def mqtt_loop():
+    global mqtt_client
+    while True:
+        try:
+            async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as client:
+                for kind in ("text", "status"):
+                    for topic in subscriptions(kind, MQTT_SHARE_GROUP):
+                        await client.subscribe(topic)
+                mqtt_client = client
+                print(f"✅ MQTT connected, shard {shard.describe()}")
+                async for message in client.messages:
+                    with metrics.timed("mqtt_receive"):
+                        box_id, kind = parse_topic(message.topic.value)
+                        if kind not in ("text", "status") or not shard.owns(box_id):
+                            continue
+                        if kind == "status":
+                            status = tracing.record_status(message.payload.decode().strip())
+                            print(f"📟 Status {box_id}: {status}")
+                            continue
+                        user_text = message.payload.decode().strip()
+                        trace = tracing.tracer.start(source="mqtt", box=box_id)
+                        print(f"👤 Text dari {box_id} [{trace.trace_id}]: {user_text}")
+                    # Penuh → berhenti membaca; broker yang menahan pesan (backpressure)
+                    await mqtt_slots.acquire()
+                    task = asyncio.create_task(process_text(box_id, user_text, trace))
+                    _tasks.add(task)
+                    task.add_done_callback(_tasks.discard)
+        except aiomqtt.MqttError as e:
+            mqtt_client = None
+            print(f"[MQTT] Terputus: {e}, coba lagi 5 detik")
+            await asyncio.sleep(5)
+        except Exception as e:
+            # Error lain (payload rusak, bug handler) jangan sampai mematikan task diam-diam
+            mqtt_client = None
+            print(f"[MQTT] Loop error: {e!r}, sambung ulang 5 detik")
+            await asyncio.sleep(5)
+
+@app.before_serving
+async def startup():
+    global gemini_slots, mqtt_slots
+    gemini_slots = asyncio.Semaphore(GEMINI_CONCURRENCY)
+    mqtt_slots = asyncio.Semaphore(MQTT_INFLIGHT)
+    app.mqtt_task = asyncio.get_running_loop().create_task(mqtt_loop())
+
+@app.after_serving
+async def shutdown():
+    app.mqtt_task.cancel()
+
+# ================= ROUTES =================
+@app.route('/package-voice', methods=['POST'])
+async def handle_voice_input():
+    data = await request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({"error": "Text input required"}), 400
+    user_speech = data['text'].strip()
+    trace = tracing.tracer.start(request.headers.get('X-Trace-Id'), source="http")
+    print(f"👤 HTTP Input [{trace.trace_id}]: {user_speech}")
+    in_flight["http"] += 1
+    try:
+        with tracing.activate(trace):
+            decision = await extract_name_with_gemini(user_speech)
+            return jsonify(tracing.tag(decision))
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return jsonify({"error": "Server error"}), 500
+    finally:
+        in_flight["http"] -= 1
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+async def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/recipients', methods=['GET'])
+async def list_recipients():
+    return jsonify(decisions.recipients())
+
+@app.route('/recipients', methods=['POST'])
+@cors_exempt  # Tanpa CORS, lihat admin.py
+async def add_recipient():
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    data = await request.get_json() or {}
+    name = (data.get('name') or "").strip()
+    if not name:
+        return jsonify({"error": "Nama wajib diisi"}), 400
+    return jsonify(decisions.add_recipient(name, data.get('unit'))), 201
+
+@app.route('/recipients/<name>', methods=['DELETE'])
+@cors_exempt
+async def remove_recipient(name):
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    return jsonify(decisions.remove_recipient(name))
+
+@app.route('/traces')
+async def traces():
+    return jsonify(tracing.tracer.dump(request.args.get('limit', 100, type=int)))
+
+@app.route('/traces/<trace_id>')
+async def trace_detail(trace_id):
+    trace = tracing.tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace tidak ditemukan"}), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/health')
+async def health():
+    return jsonify({"status": "OK", "model": MODEL_NAME, "mode": "asgi",
+                    "in_flight": dict(in_flight),
+                    "limits": {"gemini": GEMINI_CONCURRENCY, "mqtt": MQTT_INFLIGHT},
+                    "mqtt_connected": mqtt_client is not None,
+                    "decision_cache": decisions.cache.stats(),
+                    "singleflight": gemini_flight.stats(),
+                    "circuit": gemini_breaker.stats(),
+                    "tracing": tracing.tracer.stats(),
+                    "directory": decisions.directory.stats()})
+
+if __name__ == '__main__':
+    print("🚀 Laptop: Gemini AI Server Aktif! (ASGI/asyncio)")
+    print(f"Model: {MODEL_NAME}, Gemini paralel maks {GEMINI_CONCURRENCY}")
+    app.run(host='0.0.0.0', port=5000)
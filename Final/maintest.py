@@ -1,55 +1,152 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 import json
+import threading
+import time
+import metrics
+import tracing
+from admin import CORS_RESOURCES, authorized
+from workers import WorkerPool
+from singleflight import SingleFlight
+from batching import GeminiBatcher
+from circuit import CircuitBreaker
+from decisions import DecisionPipeline
+from streaming import StreamingJSONParser
+from sessions import SessionStore
+from speech import SpeechWorker
+from topics import DEFAULT_BOX, ShardFilter, parse_topic, subscriptions, topic_for
 
 load_dotenv()
+if os.getenv('GEMINI_FAKE') == '1':
+    import fake_genai as genai  # Benchmark offline, lihat fake_genai.py
+else:
+    import google.generativeai as genai
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, resources=CORS_RESOURCES)  # /recipients tanpa CORS (lihat admin.py)
 
 # ================= MQTT SETUP (untuk balas ke ESP32) =================
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
-MQTT_SUB_TOPIC = "package/text"  # ESP32 kirim text ke sini
-MQTT_PUB_TOPIC = "package/response"  # Laptop balas JSON ke ESP32
-MQTT_STATUS_TOPIC = "package/status"  # Subscribe ke status ESP32 (boot, opened, dll)
+MQTT_BROKER = os.getenv('MQTT_BROKER', "broker.hivemq.com")
+MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
+# Topic per box: package/<box_id>/text, package/<box_id>/response, package/<box_id>/status
+MQTT_SHARE_GROUP = os.getenv('MQTT_SHARE_GROUP')  # Shared subscription antar beberapa server
+shard = ShardFilter(share_group=MQTT_SHARE_GROUP)  # SERVER_SHARD=i/n → hanya proses box milik shard ini
 
-mqtt_client = mqtt.Client()
-mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-mqtt_client.loop_start()
+def send_response_to_esp32(response_json, box_id=DEFAULT_BOX):
+    topic = topic_for(box_id, "response")
+    response_json = tracing.tag(response_json)  # ESP32 mengembalikan trace id di status
+    with metrics.timed("mqtt_publish"):
+        mqtt_client.publish(topic, json.dumps(response_json))
+    print(f"📡 Response ke {topic}: {response_json}")
+
+# TTS lokal (espeak) di worker terpisah: handler tidak menunggu suara selesai
+speech = SpeechWorker(
+    max_concurrent=int(os.getenv('TTS_MAX_CONCURRENT', 1)),
+    queue_size=int(os.getenv('TTS_QUEUE_SIZE', 32)),
+    timeout=float(os.getenv('TTS_TIMEOUT_S', 30)),
+)
+
+# Proses Gemini di worker pool, bukan di thread network paho
+mqtt_workers = WorkerPool(
+    "mqtt",
+    workers=int(os.getenv('MQTT_WORKERS', 4)),
+    queue_size=int(os.getenv('MQTT_QUEUE_SIZE', 64)),
+    deadline=float(os.getenv('MQTT_DEADLINE_S', 8)),
+    on_wait=lambda waited: metrics.observe("queue_wait", waited),
+)
 
-def send_response_to_esp32(response_json):
-    mqtt_client.publish(MQTT_PUB_TOPIC, json.dumps(response_json))
-    print(f"📡 Response ke ESP32: {response_json}")
+def on_text_expired(box_id, kind, payload, trace):
+    if kind == "text":
+        with tracing.activate(trace):
+            trace.event("expired")
+            send_response_to_esp32({"action": "error", "message": "Server sibuk, coba lagi.", "tts": "Maaf, bisa diulangi?"}, box_id)
 
 # Subscribe untuk nerima text dari ESP32 DAN status
 def on_mqtt_message(client, userdata, msg):
-    topic = msg.topic
+    with metrics.timed("mqtt_receive"):
+        handle_mqtt_message(msg)
+
+def handle_mqtt_message(msg):
+    box_id, kind = parse_topic(msg.topic)
+    if kind not in ("text", "status") or not shard.owns(box_id):
+        return
     payload = msg.payload.decode().strip()
-    
-    if topic == MQTT_STATUS_TOPIC:
-        print(f"📟 Status ESP32: {payload}")
+    trace = None
+    if kind == "status":
+        # Echo trace dari firmware dicatat langsung (bukan lewat antrean) supaya latency akurat
+        payload = tracing.record_status(payload)
+    else:
+        speech.cancel(box_id)  # Barge-in: pengguna bicara lagi → hentikan suara box ini
+        trace = tracing.tracer.start(source="mqtt", box=box_id)
+    if not mqtt_workers.submit(process_mqtt_message, box_id, kind, payload, trace, on_expired=on_text_expired):
+        on_text_expired(box_id, kind, payload, trace)
+
+def process_mqtt_message(box_id, kind, payload, trace):
+    if kind == "status":
+        print(f"📟 Status {box_id}: {payload}")
         if payload == "boot_ready":
             print("🔊 TTS: Alat aktif")
-            os.system('espeak "Permisi. Smart Package Box aktif dan siap digunakan."')
+            speech.say("Permisi. Smart Package Box aktif dan siap digunakan.", box_id)
         return
     
+    with tracing.activate(trace):
+        trace.event("dequeued")
+        process_text(box_id, payload)
+
+def process_text(box_id, user_text):
+    # Callback stream jalan di thread breaker dan bisa terlambat (setelah timeout → fallback):
+    # cek "sudah selesai" dan publish open dilakukan di bawah lock yang sama dengan penutupan,
+    # jadi open awal selalu terlihat oleh thread ini dan dikoreksi kalau perlu.
+    lock = threading.Lock()
+    opened = []
+    finished = []
+
+    def on_open(partial):
+        # Perintah buka langsung dikirim, TTS menyusul
+        with lock:
+            if finished:
+                return  # Stream telat (timeout) dan sudah dijawab fallback
+            opened.append(partial)
+            send_response_to_esp32(partial, box_id)
+
     try:
         # Kalau text dari ESP32
-        user_text = payload
-        print(f"👤 Text dari ESP32: {user_text}")
-        decision = extract_name_with_gemini(user_text)
-        send_response_to_esp32(decision)
+        print(f"👤 Text dari {box_id} [{tracing.current_id()}]: {user_text}")
+        try:
+            decision = extract_name_with_gemini(user_text, box_id, on_open)
+        finally:
+            with lock:
+                finished.append(True)
+        if opened and decision.get("action") == "open" \
+                and decisions.index.resolve(decision.get("name")) == decisions.index.resolve(opened[0]["name"]):
+            send_response_to_esp32({"action": "speak", "tts": decision.get("tts", "")}, box_id)
+            return
+        if opened:
+            # Keputusan akhir berbeda (atau stream gagal) setelah kotak terlanjur dibuka → tutup lagi
+            print(f"↩️ Koreksi buka awal untuk {opened[0]['name']}: {decision.get('action')}")
+            send_response_to_esp32({"action": "close", "name": opened[0]["name"]}, box_id)
+        send_response_to_esp32(decision, box_id)
     except Exception as e:
         print(f"[MQTT Error]: {e}")
-        send_response_to_esp32({"action": "error", "message": "Server error"})
+        if opened:
+            send_response_to_esp32({"action": "close", "name": opened[0]["name"]}, box_id)
+        send_response_to_esp32({"action": "error", "message": "Server error"}, box_id)
 
+def on_mqtt_connect(client, userdata, flags, rc):
+    # Subscribe ulang setiap (re)connect: text + status semua box
+    for kind in ("text", "status"):
+        for topic in subscriptions(kind, MQTT_SHARE_GROUP):
+            client.subscribe(topic)
+    print(f"✅ MQTT connected (rc={rc}), shard {shard.describe()}")
+
+mqtt_client = mqtt.Client()
+mqtt_client.on_connect = on_mqtt_connect
 mqtt_client.on_message = on_mqtt_message
-mqtt_client.subscribe(MQTT_SUB_TOPIC)
-mqtt_client.subscribe(MQTT_STATUS_TOPIC)  # Tambah subscribe status
+mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
+mqtt_client.loop_start()
 
 # ================= GEMINI AI SETUP (dengan prompt baru) =================
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
@@ -72,7 +169,7 @@ KONDISI SISTEM:
 ATURAN PERILAKU WAJIB:
 1. Percakapan SELALU dimulai dengan:    "Permisi, ada paket."
 2. Setelah itu kamu WAJIB menanyakan:    "Dengan siapa saya berbicara?"
-3. HANYA ada 3 nama valid untuk membuka paket:    - aisyah    - rabiathul    - nadia
+3. Nama valid untuk membuka paket HANYA nama di baris "Kandidat penerima" pada setiap pesan (format pesan: "Kandidat penerima: <nama, dipisah koma, atau ->" lalu "Ucapan: <teks pengguna>"; ejaan STT bisa sedikit meleset)
 4. Jika user menyebutkan SALAH SATU dari nama valid:    - Akui nama tersebut    - Konfirmasi paket    - Gunakan nada profesional kurir    - Contoh respons:      "Baik, paket atas nama Aisyah. Silakan diambil."
 5. Jika nama TIDAK valid:    - Jangan membuka paket    - Jangan menyebut kata 'akses ditolak'    - Jawab sopan dan netral    - Contoh:      "Maaf, nama tersebut tidak terdaftar pada paket ini."
 6. Setelah paket berhasil diambil:    - Katakan satu kalimat penutup    - Masuk ke MODE TIDUR (sleep mode)    - Jangan berbicara lagi sampai wake word diterima
@@ -102,49 +199,104 @@ Tugasmu: dari ucapan pengguna, tentukan action berdasarkan aturan di atas. Kemba
 Hanya kembalikan JSON valid. Jangan tambahkan teks lain."""
 )
 
-WHITELIST = ["aisyah", "rabiathul", "nadia"]
-SLEEP_MODE = False  # Global flag untuk mode sleep
+sessions = SessionStore(idle_ttl=int(os.getenv('SESSION_IDLE_TTL', 15 * 60)))  # Status sleep per box
+# Direktori penerima, intent lokal, cache & prompt: sama dengan main.py/main_async.py (lihat decisions.py)
+decisions = DecisionPipeline.from_env(conversational=True)
 
-def extract_name_with_gemini(text):
-    global SLEEP_MODE
+# Request identik yang datang bersamaan cukup memanggil Gemini sekali
+gemini_flight = SingleFlight()
+
+# Gemini down/lambat → circuit open, semua request langsung ke fallback lokal (direktori penerima)
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=float(os.getenv('GEMINI_CB_THRESHOLD', 0.5)),
+    cooldown=float(os.getenv('GEMINI_CB_COOLDOWN_S', 30)),
+    call_timeout=float(os.getenv('GEMINI_TIMEOUT_S', 5)),
+)
+
+# Opsional: kumpulkan ucapan beberapa ms lalu kirim sebagai satu prompt (GEMINI_BATCH=1)
+batcher = None
+if os.getenv('GEMINI_BATCH', '0') == '1':
+    batcher = GeminiBatcher(
+        model,
+        max_batch=int(os.getenv('GEMINI_BATCH_MAX', 8)),
+        max_wait=float(os.getenv('GEMINI_BATCH_WAIT_MS', 20)) / 1000,
+    )
+
+# Streaming: "action"/"name" sudah bisa dipakai sebelum kalimat "tts" selesai digenerate
+GEMINI_STREAM = os.getenv('GEMINI_STREAM', '1') == '1'
+
+def ask_gemini_streaming(prompt, on_open):
+    parser = StreamingJSONParser()
+    sent = False
+    for chunk in model.generate_content(prompt, stream=True):
+        parser.feed(chunk.text)
+        fields = parser.fields
+        if not sent and on_open and fields.get("action") == "open" and "name" in fields:
+            # Buka lebih awal hanya untuk nama yang benar-benar terdaftar; sisanya tunggu jawaban lengkap
+            name = decisions.index.resolve(fields["name"])
+            if name:
+                on_open({"action": "open", "name": name.title()})
+                sent = True
+    # Kotak sudah dibuka → jawaban yang terpotong/rusak harus error (koreksi + tidak di-cache)
+    return parser.result(strict=sent)
+
+def ask_gemini(text, on_open=None):
+    if batcher:
+        with metrics.timed("gemini"):
+            result = batcher.submit(decisions.build_prompt(text))
+    elif GEMINI_STREAM:
+        with metrics.timed("gemini"):
+            result = ask_gemini_streaming(decisions.build_prompt(text), on_open)
+    else:
+        with metrics.timed("gemini"):
+            response = model.generate_content(decisions.build_prompt(text))
+        with metrics.timed("json_parse"):
+            result = json.loads(response.text.strip())
+    
+    # Tambah TTS ke response jika ada
+    if "tts" not in result:
+        result["tts"] = result.get("message", "Respons default")
+    return decisions.remember(text, result)
+
+def extract_name_with_gemini(text, device_id=DEFAULT_BOX, on_open=None):
+    # on_open(decision) dipanggil lebih awal saat stream Gemini sudah memutuskan "open"
+    session = sessions.get(device_id)
     try:
-        if SLEEP_MODE and "hallo" not in text.lower():
+        if session.sleeping and "hallo" not in text.lower():
             return {"action": "sleep", "tts": "Saya sedang istirahat. Katakan 'hallo' untuk bangun."}
         
         if "hallo" in text.lower():
-            SLEEP_MODE = False
+            session.sleeping = False
             return {"action": "wake", "tts": "Permisi, ada paket. Dengan siapa saya berbicara?"}
         
-        response = model.generate_content(text)
-        result = json.loads(response.text.strip())
+        # Jalur cepat: ucapan yang jelas dijawab lokal, sisanya baru ke Gemini
+        result = decisions.before_gemini(text)
+        if not result:
+            result = gemini_flight.do(decisions.flight_key(text), gemini_breaker.call, ask_gemini, text, on_open)
         
         # Update sleep flag jika action sleep
         if result.get("action") == "sleep":
-            SLEEP_MODE = True
-        
-        # Tambah TTS ke response jika ada
-        if "tts" not in result:
-            result["tts"] = result.get("message", "Respons default")
+            session.sleeping = True
         
         return result
     except Exception as e:
-        print(f"[Gemini Error] Fallback: {e}")
         text_lower = text.lower()
-        if SLEEP_MODE and "hallo" not in text_lower:
+        if session.sleeping and "hallo" not in text_lower:
             return {"action": "sleep", "tts": "Saya sedang istirahat."}
         if "hallo" in text_lower:
-            SLEEP_MODE = False
+            session.sleeping = False
             return {"action": "wake", "tts": "Permisi, ada paket."}
         
-        for name in WHITELIST:
-            if name in text_lower:
-                SLEEP_MODE = False
-                return {"action": "open", "name": name.capitalize(), "tts": f"Baik, paket atas nama {name.capitalize()}. Silakan diambil."}
-        if SLEEP_MODE:
-            return {"action": "sleep", "tts": "Maaf, sedang istirahat."}
-        return {"action": "deny", "message": "Maaf, nama tidak terdaftar.", "tts": "Maaf, nama tersebut tidak terdaftar pada paket ini."}
+        return decisions.fallback(text, e)
 
 # ================= ROUTE (HTTP fallback, kalau MQTT gagal) =================
+def request_device_id(data=None):
+    # Satu sumber id box untuk sesi, trace & barge-in: header X-Device-Id (pc-server, loadgen),
+    # lalu "device_id" di body JSON, terakhir alamat IP pengirim
+    return (request.headers.get('X-Device-Id') or (data or {}).get('device_id')
+            or request.remote_addr)
+
 @app.route('/package-voice', methods=['POST'])
 def handle_voice_input():
     try:
@@ -152,22 +304,83 @@ def handle_voice_input():
         if not data or 'text' not in data:
             return jsonify({"error": "Text input required"}), 400
         user_speech = data['text'].strip()
-        print(f"👤 HTTP Input: {user_speech}")
-        decision = extract_name_with_gemini(user_speech)
-        # Simulate TTS via espeak untuk HTTP juga
-        if "tts" in decision:
-            os.system(f'espeak "{decision["tts"]}"')
-        return jsonify(decision)
+        device_id = request_device_id(data)
+        trace = tracing.tracer.start(request.headers.get('X-Trace-Id'), source="http", box=device_id)
+        print(f"👤 HTTP Input ({device_id}) [{trace.trace_id}]: {user_speech}")
+        speech.cancel(device_id)  # Barge-in
+        with tracing.activate(trace):
+            decision = extract_name_with_gemini(user_speech, device_id)
+            # Simulate TTS via espeak untuk HTTP juga (diputar di belakang, response tidak menunggu)
+            if "tts" in decision:
+                speech.say(decision["tts"], device_id)
+            return jsonify(tracing.tag(decision))
     except Exception as e:
         print(f"[ERROR] {e}")
         return jsonify({"error": "Server error"}), 500
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/recipients', methods=['GET'])
+def list_recipients():
+    return jsonify(decisions.recipients())
+
+@app.route('/recipients', methods=['POST'])
+def add_recipient():
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    data = request.get_json() or {}
+    name = (data.get('name') or "").strip()
+    if not name:
+        return jsonify({"error": "Nama wajib diisi"}), 400
+    return jsonify(decisions.add_recipient(name, data.get('unit'))), 201
+
+@app.route('/recipients/<name>', methods=['DELETE'])
+def remove_recipient(name):
+    if not authorized(request.headers, request.remote_addr):
+        return jsonify({"error": "Tidak diizinkan"}), 403
+    return jsonify(decisions.remove_recipient(name))
+
+@app.route('/speech/<device_id>', methods=['DELETE'])
+def cancel_speech(device_id):
+    return jsonify({"cancelled": speech.cancel(device_id)})
+
+@app.route('/traces')
+def traces():
+    return jsonify(tracing.tracer.dump(request.args.get('limit', 100, type=int)))
+
+@app.route('/traces/<trace_id>')
+def trace_detail(trace_id):
+    trace = tracing.tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace tidak ditemukan"}), 404
+    return jsonify(trace.to_dict())
+
 @app.route('/health')
 def health():
-    return jsonify({"status": "OK", "model": MODEL_NAME})
+    return jsonify({"status": "OK", "model": MODEL_NAME, "decision_cache": decisions.cache.stats(),
+                    "mqtt_queue": mqtt_workers.stats(),
+                    "speech": speech.stats(),
+                    "sessions": sessions.stats(),
+                    "singleflight": gemini_flight.stats(),
+                    "batching": batcher.stats() if batcher else None,
+                    "circuit": gemini_breaker.stats(),
+                    "tracing": tracing.tracer.stats(),
+                    "directory": decisions.directory.stats()})
 
 if __name__ == '__main__':
     print("🚀 Laptop: Gemini AI Server Aktif! (MQTT ready)")
     print(f"Model: {MODEL_NAME}")
-    print("ESP32 kirim text ke 'package/text' via MQTT")
+    print("ESP32 kirim text ke 'package/<box_id>/text' via MQTT")
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,86 @@
+# ================= METRICS (Prometheus) =================
+# Histogram latency per tahap pipeline (mqtt_receive, queue_wait, stt, gemini, json_parse,
+# tts, resample, mqtt_publish, http_response). observe() cuma bisect + increment di bawah
+# lock, jadi aman dipanggil di jalur panas. /metrics merender format teks Prometheus.
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label="stage", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [counts per bucket (+Inf terakhir), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(value)
+            if series is None:
+                series = self._series[value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    @contextmanager
+    def time(self, value):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(value, time.perf_counter() - started)
+
+    def render(self):
+        with self._lock:
+            snapshot = {k: (list(counts), total) for k, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value in sorted(snapshot):
+            counts, total = snapshot[value]
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return "\n".join(lines)
+
+
+stage_seconds = Histogram("package_stage_seconds", "Latency per tahap pipeline dalam detik")
+
+
+def observe(stage, seconds):
+    stage_seconds.observe(stage, seconds)
+
+
+_listeners = []
+
+
+def add_listener(fn):
+    """fn(stage, started, seconds) dipanggil tiap blok timed() selesai (mis. span tracing)."""
+    _listeners.append(fn)
+
+
+@contextmanager
+def timed(stage):
+    """with timed("gemini"): ...  → catat durasi blok ke histogram tahap."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(stage, seconds)
+        for fn in _listeners:
+            fn(stage, started, seconds)
+
+
+def render():
+    return stage_seconds.render() + "\n"
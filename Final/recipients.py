@@ -0,0 +1,176 @@
+# ================= RECIPIENT INDEX (fuzzy + fonetik) =================
+# Hasil STT sering meleset sedikit: "aisah" / "aisya" untuk aisyah, "nadiyah" untuk nadia,
+# "rabiatul" untuk rabiathul. Index ini menyimpan kunci fonetik tiap nama dan index
+# hapus-huruf (edit distance) supaya nama yang mirip bisa dicocokkan lokal dengan cepat,
+# juga untuk direktori ribuan penghuni.
+import hashlib
+import re
+
+from intent import FILLER_PHRASES, NOT_A_NAME, normalize
+
+# Ejaan Indonesia yang bunyinya sama (urutan penting: digraf dulu)
+_PHONETIC_RULES = [
+    (re.compile(r"sy|sh"), "s"),
+    (re.compile(r"kh"), "k"),
+    (re.compile(r"dh"), "d"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"dj"), "j"),
+    (re.compile(r"tj|ch"), "c"),
+    (re.compile(r"oe"), "u"),
+    (re.compile(r"q"), "k"),
+    (re.compile(r"v"), "f"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"iy(?=[aeiou])"), "i"),    # nadiyah → nadiah
+    (re.compile(r"uw(?=[aeiou])"), "u"),    # dhuwi → dui
+    (re.compile(r"h(?![aeiou])"), ""),      # h mati: aisah → aisa, nadiah → nadia
+    (re.compile(r"(.)\1+"), r"\1"),         # huruf dobel: annisa → anisa
+]
+
+# Kata yang tidak perlu dicari di direktori (bukan nama)
+_STOPWORDS = {p for p in FILLER_PHRASES if " " not in p} | NOT_A_NAME
+
+
+def phonetic_key(word):
+    """Kunci fonetik sederhana untuk nama Indonesia."""
+    key = re.sub(r"[^a-z]", "", word.lower())
+    for pattern, repl in _PHONETIC_RULES:
+        key = pattern.sub(repl, key)
+    return key
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance; berhenti lebih awal kalau sudah pasti > limit."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if limit is not None and min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def _deletes(word, depth):
+    """Semua varian `word` dengan maksimal `depth` huruf dihapus (termasuk word sendiri)."""
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+class DeletionIndex:
+    """Index hapus-huruf (ala SymSpell): query radius edit distance tanpa scan semua kunci.
+
+    Dua kata berjarak <= d pasti punya varian hapus-<=d yang sama, jadi query cukup
+    membangkitkan varian kata itu sendiri lalu memverifikasi kandidat dengan edit_distance.
+    Biayanya tidak tumbuh dengan jumlah nama (BK-tree melambat di ribuan penghuni).
+    """
+
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self._keys = set()
+        self._by_delete = {}
+
+    def add(self, word):
+        if word in self._keys:
+            return
+        self._keys.add(word)
+        for variant in _deletes(word, self.max_distance):
+            self._by_delete.setdefault(variant, set()).add(word)
+
+    def search(self, word, tolerance):
+        tolerance = min(tolerance, self.max_distance)
+        candidates = set()
+        for variant in _deletes(word, tolerance):
+            candidates |= self._by_delete.get(variant, set())
+        found = []
+        for key in candidates:
+            dist = edit_distance(word, key, tolerance)
+            if dist <= tolerance:
+                found.append((dist, key))
+        return sorted(found)
+
+
+class RecipientIndex:
+    """Cocokkan kata hasil STT ke nama penerima resmi, lengkap dengan skor 0..1."""
+
+    def __init__(self, names, min_score=0.8):
+        self.min_score = min_score
+        self.set_names(names)
+
+    def set_names(self, names):
+        # Bangun di variabel lokal lalu tukar sekaligus: aman saat hot reload dari thread lain
+        sorted_names = sorted({n.lower() for n in names})
+        by_key, names_by_key, tree = {}, {}, DeletionIndex()
+        for name in sorted_names:
+            key = phonetic_key(name)
+            by_key.setdefault(key, name)
+            names_by_key.setdefault(key, []).append(name)
+            tree.add(key)
+        self._by_key, self._names_by_key, self._fuzzy = by_key, names_by_key, tree
+        self._known = frozenset(sorted_names)
+        self.names = sorted_names
+        self.version = hashlib.sha1("|".join(sorted_names).encode()).hexdigest()[:12]
+
+    def resolve(self, name):
+        """Nama resmi kalau `name` persis ada di direktori (bukan sekadar mirip), selain itu None."""
+        name = " ".join(normalize(name or "").split())
+        return name if name in self._known else None
+
+    def lookup(self, word):
+        """(nama, skor) untuk satu kata, atau None kalau tidak ada yang cukup mirip."""
+        key = phonetic_key(word)
+        if len(key) < 3:
+            return None
+        if key in self._by_key:
+            return self._by_key[key], 1.0
+        tolerance = max(1, len(key) // 4)
+        hits = self._fuzzy.search(key, tolerance)
+        if not hits:
+            return None
+        dist, best = hits[0]
+        score = 1.0 - dist / max(len(key), len(best))
+        if score < self.min_score:
+            return None
+        return self._by_key[best], round(score, 3)
+
+    def best_match(self, text):
+        """Cari kandidat terbaik di seluruh kalimat (per kata + gabungan dua kata)."""
+        words = normalize(text).split()
+        candidates = words + [a + b for a, b in zip(words, words[1:])]
+        best = None
+        for word in candidates:
+            hit = self.lookup(word)
+            if hit and (best is None or hit[1] > best[1]):
+                best = hit
+                if hit[1] == 1.0:
+                    break
+        return best
+
+    def candidates(self, text, limit=5, min_score=0.6):
+        """Beberapa nama yang paling mungkin dimaksud, skor tertinggi dulu (untuk prompt Gemini)."""
+        words = [w for w in normalize(text).split() if w not in _STOPWORDS]
+        scores = {}
+        for word in words + [a + b for a, b in zip(words, words[1:])]:
+            key = phonetic_key(word)
+            if len(key) < 3:
+                continue
+            for dist, hit in self._fuzzy.search(key, max(1, len(key) // 3)):
+                score = 1.0 - dist / max(len(key), len(hit))
+                if score < min_score:
+                    continue
+                for name in self._names_by_key[hit]:
+                    if score > scores.get(name, 0.0):
+                        scores[name] = score
+        return sorted(scores, key=lambda name: (-scores[name], name))[:limit]
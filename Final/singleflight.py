@@ -0,0 +1,104 @@
+# ================= SINGLE-FLIGHT =================
+# Kalau ucapan yang sama datang bersamaan (HTTP fallback + MQTT untuk utterance yang sama,
+# atau beberapa box di satu lobi mendengar kurir yang sama), cukup satu panggilan Gemini.
+# Pemanggil lain menunggu hasil panggilan yang sedang berjalan lalu ikut memakainya.
+import asyncio
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0   # panggilan yang benar-benar dieksekusi
+        self.saved = 0   # panggilan yang ditumpangkan ke panggilan lain
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.saved += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                print(f"[SingleFlight] 1 panggilan dipakai bersama {call.waiters} request lain")
+            call.event.set()
+
+    def stats(self):
+        return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._calls)}
+
+
+class LeaderCancelled(Exception):
+    """Panggilan pertama dibatalkan (request-nya putus); penunggu lain mencoba sendiri."""
+
+
+class AsyncSingleFlight:
+    """Versi asyncio (server ASGI): pemanggil lain await future milik panggilan pertama."""
+
+    def __init__(self):
+        self._calls = {}
+        self.calls = 0
+        self.saved = 0
+
+    async def do(self, key, fn, *args):
+        future = self._calls.get(key)
+        if future is not None:
+            self.saved += 1
+            try:
+                return copy.deepcopy(await asyncio.shield(future))
+            except LeaderCancelled:
+                self.saved -= 1
+                return await self.do(key, fn, *args)  # Salah satu penunggu jadi pemanggil baru
+
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self.calls += 1
+        try:
+            result = await fn(*args)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Jangan cancel future bersama: penunggu yang request-nya masih hidup akan ikut
+            # mendapat CancelledError. Beri tahu mereka untuk memanggil ulang.
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # tandai sudah dibaca kalau tidak ada yang menunggu
+            raise
+        finally:
+            del self._calls[key]
+
+    def stats(self):
+        return {"calls": self.calls, "saved": self.saved, "in_flight": len(self._calls)}
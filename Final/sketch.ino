@@ -15,10 +15,22 @@ const int mqtt_port = 1883;
 const char* mqtt_user = "";  // Kosong kalau public broker
 const char* mqtt_pass = "";
 
-// Topics
-const char* text_topic = "package/text";      // Kirim text STT ke laptop
-const char* response_topic = "package/response";  // Terima JSON dari Gemini
-const char* status_topic = "package/status";  // Publish status (opened/closed)
+// Topics per box: package/<box_id>/... (ganti box_id supaya unik tiap box)
+const char* box_id = "box01";
+String text_topic = String("package/") + box_id + "/text";          // Kirim text STT ke laptop
+String response_topic = String("package/") + box_id + "/response";  // Terima JSON dari Gemini
+String status_topic = String("package/") + box_id + "/status";      // Publish status (opened/closed)
+String current_trace = "";  // Trace id dari perintah terakhir, dikembalikan di status
+
+// ================= STATE KOTAK (non-blocking) =================
+// Alur buka → tanya "sudah selesai?" → dengar → tutup dijalankan dari loop(), bukan di dalam
+// mqttCallback. Jadi perintah yang menyusul dari server streaming ("speak", atau "close" kalau
+// keputusan akhir berubah) langsung diproses saat kotak masih terbuka.
+enum BoxState { BOX_IDLE, BOX_OPEN, BOX_LISTEN };
+BoxState box_state = BOX_IDLE;
+unsigned long state_since = 0;
+const unsigned long ASK_DONE_AFTER_MS = 2000;  // Jeda sebelum tanya "sudah selesai?"
+const unsigned long LISTEN_MS = 2000;          // Lama mendengar jawaban
 
 // Hardware Pins (sesuai deskripsimu)
 #define I2S_MIC_WS 35
@@ -106,6 +118,7 @@ void loop() {
     reconnectMQTT();
   }
   mqtt_client.loop();
+  boxStep();
   
   // Deteksi suara & STT (sederhana: ambil sample audio, konversi ke text via threshold atau kirim ke cloud STT)
   // Untuk STT full, integrasikan ESP-SR library atau kirim audio ke Google STT via HTTP (tapi butuh WiFi stable).
@@ -116,8 +129,8 @@ void loop() {
 // ================= MQTT =================
 void reconnectMQTT() {
   while (!mqtt_client.connected()) {
-    if (mqtt_client.connect("ESP32Client", mqtt_user, mqtt_pass)) {
-      mqtt_client.subscribe(response_topic);
+    if (mqtt_client.connect(box_id, mqtt_user, mqtt_pass)) {
+      mqtt_client.subscribe(response_topic.c_str());
       Serial.println("MQTT connected!");
     } else {
       delay(5000);
@@ -138,27 +151,22 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   deserializeJson(doc, message);
   
   String action = doc["action"];
+  current_trace = doc["trace"] | "";
   String name = doc["name"];
   String speak_msg = doc["message"] | "";
   
   if (action == "open") {
+    // Server streaming mengirim "open" tanpa tts; kalimatnya menyusul lewat "speak"
+    String tts = doc["tts"] | "";
     oledUpdate("Buka untuk: " + name);
-    servoOpen();
-    mqttPublishStatus("opened");
-    ttsSpeak("Selamat! Paket untuk " + name + ". Kotak terbuka.");
-    
-    // Tanya selesai
-    delay(2000);
-    ttsSpeak("Sudah selesai ambil paket?");
-    // Listen reply (implement STT di sini)
-    String reply = listenSTT();  // Fungsi custom STT
-    if (reply.indexOf("sudah") >= 0 || reply.indexOf("ya") >= 0) {
-      servoClose();
-      ttsSpeak("Terima kasih!");
-    } else {
-      servoClose();
-      ttsSpeak("Waktu habis, kotak ditutup.");
+    if (box_state == BOX_IDLE) {
+      servoOpen();
+      mqttPublishStatus("opened");
     }
+    if (tts.length() > 0) {
+      ttsSpeak(tts);
+    }
+    setBoxState(BOX_OPEN);
     
   } else if (action == "deny") {
     oledUpdate("Akses Ditolak");
@@ -167,11 +175,50 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   } else if (action == "ask_name") {
     oledUpdate("Tanya Nama");
     ttsSpeak(speak_msg);
+
+  } else if (action == "close") {
+    // Koreksi dari server: keputusan akhir berbeda dengan perintah "open" yang dikirim lebih awal
+    if (box_state != BOX_IDLE) {
+      oledUpdate("Dibatalkan");
+      servoClose();
+      setBoxState(BOX_IDLE);
+    }
+
+  } else if (action == "speak") {
+    // Kalimat TTS yang menyusul setelah perintah "open" (server streaming)
+    String tts = doc["tts"] | "";
+    ttsSpeak(tts);
+    if (box_state == BOX_OPEN) {
+      setBoxState(BOX_OPEN);  // Tanya "sudah selesai?" dihitung sejak kalimat ini
+    }
   }
   
   // Kirim text STT ke laptop via MQTT
   void sendTextToLaptop(String text) {
-    mqtt_client.publish(text_topic, text.c_str());
+    mqtt_client.publish(text_topic.c_str(), text.c_str());
+  }
+}
+
+void setBoxState(BoxState state) {
+  box_state = state;
+  state_since = millis();
+}
+
+// Dipanggil tiap loop(): maju ke langkah berikutnya kalau waktunya sudah lewat, tanpa delay()
+void boxStep() {
+  unsigned long elapsed = millis() - state_since;
+  if (box_state == BOX_OPEN && elapsed >= ASK_DONE_AFTER_MS) {
+    ttsSpeak("Sudah selesai ambil paket?");
+    setBoxState(BOX_LISTEN);
+  } else if (box_state == BOX_LISTEN && elapsed >= LISTEN_MS) {
+    String reply = listenSTT();  // Fungsi custom STT
+    servoClose();
+    setBoxState(BOX_IDLE);
+    if (reply.indexOf("sudah") >= 0 || reply.indexOf("ya") >= 0) {
+      ttsSpeak("Terima kasih!");
+    } else {
+      ttsSpeak("Waktu habis, kotak ditutup.");
+    }
   }
 }
 
@@ -195,7 +242,13 @@ void servoClose() {
 }
 
 void mqttPublishStatus(String status) {
-  mqtt_client.publish(status_topic, status.c_str());
+  if (current_trace.length() > 0) {
+    // Echo trace id supaya server bisa hitung latency ucapan → servo
+    String payload = "{\"status\":\"" + status + "\",\"trace\":\"" + current_trace + "\"}";
+    mqtt_client.publish(status_topic.c_str(), payload.c_str());
+  } else {
+    mqtt_client.publish(status_topic.c_str(), status.c_str());
+  }
 }
 
 void ttsSpeak(String text) {
@@ -209,9 +262,9 @@ void ttsSpeak(String text) {
 // STT Sederhana (placeholder – expand dengan ESP-SR atau Google Speech API)
 String listenSTT() {
   // Ambil sample dari I2S mic, threshold untuk detect word.
-  // Contoh: size_t bytesRead; int16_t sample[128]; i2s_read(I2S_NUM_0, sample, sizeof(sample), &bytesRead, portMAX_DELAY);
-  // Analisis sample untuk keyword (sudah/ya).
+  // Contoh: size_t bytesRead; int16_t sample[128]; i2s_read(I2S_NUM_0, sample, sizeof(sample), &bytesRead, 0);
+  // Analisis sample untuk keyword (sudah/ya). Jendela dengar (LISTEN_MS) diatur boxStep(),
+  // jadi fungsi ini tidak boleh delay().
   // Return "sudah" atau "".
-  delay(2000);  // Simulate listen
   return "sudah";  // Dummy
 }
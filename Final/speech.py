@@ -0,0 +1,131 @@
+# ================= SPEECH WORKER (espeak lokal) =================
+# Dulu os.system(f'espeak "{teks}"') dipanggil langsung di handler: response HTTP baru
+# keluar setelah suara selesai, dan teks dari Gemini/pengguna masuk ke shell apa adanya.
+# Sekarang handler cukup say(); thread worker menjalankan espeak tanpa shell (teks lewat
+# stdin), maksimal `max_concurrent` proses sekaligus. Job per box bisa dibatalkan:
+# ucapan baru dari box yang sama memotong suara yang sedang/akan diputar (barge-in).
+import contextvars
+import itertools
+import os
+import shlex
+import subprocess
+import threading
+import time
+from collections import deque
+
+import metrics
+
+DEFAULT_COMMAND = "espeak --stdin"
+
+
+class SpeechJob:
+    __slots__ = ("job_id", "key", "text", "context", "enqueued", "cancelled", "process")
+
+    def __init__(self, job_id, key, text):
+        self.job_id = job_id
+        self.key = key
+        self.text = text
+        self.context = contextvars.copy_context()  # Trace aktif ikut ke thread worker
+        self.enqueued = time.monotonic()
+        self.cancelled = False
+        self.process = None
+
+
+class SpeechWorker:
+    def __init__(self, command=None, max_concurrent=1, queue_size=32, timeout=30.0):
+        self.command = shlex.split(command or os.getenv('TTS_COMMAND', DEFAULT_COMMAND))
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._pending = deque()
+        self._running = {}  # job_id -> SpeechJob
+        self._cond = threading.Condition()
+        self.queued = 0
+        self.spoken = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.failed = 0
+        for i in range(max_concurrent):
+            threading.Thread(target=self._run, name=f"speech-{i}", daemon=True).start()
+
+    def say(self, text, key=None, interrupt=True):
+        """Antrekan teks untuk diucapkan, langsung kembali. job id, atau None kalau ditolak."""
+        text = (text or "").strip()
+        if not text:
+            return None
+        with self._cond:
+            if interrupt:
+                self._cancel_locked(key)
+            if len(self._pending) >= self.queue_size:
+                self.rejected += 1
+                print(f"[Speech] Antrean penuh ({self.queue_size}), teks dibuang: {text}")
+                return None
+            job = SpeechJob(next(self._ids), key, text)
+            self._pending.append(job)
+            self.queued += 1
+            self._cond.notify()
+        return job.job_id
+
+    def cancel(self, key=None):
+        """Batalkan suara milik `key` (antre maupun yang sedang diputar); jumlah job dibatalkan."""
+        with self._cond:
+            return self._cancel_locked(key)
+
+    def _cancel_locked(self, key):
+        dropped = [job for job in self._pending if job.key == key]
+        if dropped:
+            self._pending = deque(job for job in self._pending if job.key != key)
+        for job in self._running.values():
+            if job.key == key and not job.cancelled:
+                dropped.append(job)
+                if job.process is not None and job.process.poll() is None:
+                    job.process.terminate()
+        for job in dropped:
+            job.cancelled = True
+        self.cancelled += len(dropped)
+        return len(dropped)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._running[job.job_id] = job
+            try:
+                job.context.run(self._speak, job)
+            finally:
+                with self._cond:
+                    del self._running[job.job_id]
+
+    def _speak(self, job):
+        metrics.observe("tts_wait", time.monotonic() - job.enqueued)
+        try:
+            with metrics.timed("tts"):
+                with self._cond:
+                    if job.cancelled:
+                        return
+                    job.process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    job.process.communicate(job.text.encode(), timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    job.process.kill()
+                    job.process.wait()
+                    raise
+        except (OSError, subprocess.SubprocessError) as e:
+            with self._cond:
+                self.failed += 1
+            print(f"[Speech] Gagal mengucapkan ({self.command[0]}): {e}")
+            return
+        if not job.cancelled:
+            with self._cond:
+                self.spoken += 1
+
+    def stats(self):
+        with self._cond:
+            return {"pending": len(self._pending), "speaking": len(self._running),
+                    "max_concurrent": self.max_concurrent, "queued": self.queued,
+                    "spoken": self.spoken, "cancelled": self.cancelled,
+                    "rejected": self.rejected, "failed": self.failed}
@@ -0,0 +1,98 @@
+# ================= STREAMING JSON PARSER =================
+# Gemini (stream=True) mengirim jawaban sepotong-sepotong. Urutan field dari prompt:
+# "action", "name", lalu "tts" yang panjang. Parser ini membaca objek JSON datar secara
+# inkremental dan mengeluarkan tiap pasangan key/value begitu value-nya lengkap, jadi
+# perintah buka kotak bisa dikirim ke ESP32 sementara kalimat TTS masih digenerate.
+import json
+from json.decoder import scanstring
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_VALUE_END = ",}" + _WHITESPACE
+
+
+class StreamingJSONParser:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._started = False
+
+    def feed(self, chunk):
+        """Tambah potongan teks; kembalikan list (key, value) yang baru selesai."""
+        self.buffer += chunk
+        completed = []
+        while True:
+            pair = self._next_pair()
+            if pair is None:
+                break
+            key, value = pair
+            self.fields[key] = value
+            completed.append(pair)
+        return completed
+
+    def _skip(self, chars):
+        while self._pos < len(self.buffer) and self.buffer[self._pos] in chars:
+            self._pos += 1
+
+    def _next_pair(self):
+        buf = self.buffer
+        if not self._started:
+            start = buf.find("{")  # lewati ```json atau teks pembuka
+            if start < 0:
+                return None
+            self._pos = start + 1
+            self._started = True
+
+        pos = self._pos
+        self._skip(_WHITESPACE + ",")
+        if self._pos >= len(buf) or buf[self._pos] != '"':
+            self._pos = pos
+            return None
+        try:
+            key, after_key = scanstring(buf, self._pos + 1)
+        except ValueError:
+            self._pos = pos  # key belum lengkap
+            return None
+
+        colon = after_key
+        while colon < len(buf) and buf[colon] in _WHITESPACE:
+            colon += 1
+        if colon >= len(buf) or buf[colon] != ":":
+            self._pos = pos
+            return None
+        value_start = colon + 1
+        while value_start < len(buf) and buf[value_start] in _WHITESPACE:
+            value_start += 1
+        if value_start >= len(buf):
+            self._pos = pos
+            return None
+
+        try:
+            value, value_end = _DECODER.raw_decode(buf, value_start)
+        except ValueError:
+            self._pos = pos  # value belum lengkap
+            return None
+        # Angka/literal bisa masih berlanjut di chunk berikutnya ("12" → "123")
+        if buf[value_start] not in '"{[' and (value_end >= len(buf) or buf[value_end] not in _VALUE_END):
+            self._pos = pos
+            return None
+
+        self._pos = value_end
+        return key, value
+
+    def result(self, strict=False):
+        """Objek lengkap di akhir stream (pakai json.loads biasa kalau bisa).
+
+        strict=True: stream yang terpotong/rusak tetap error, bukan dikembalikan sebagian.
+        """
+        raw = self.buffer.strip()
+        start, end = raw.find("{"), raw.rfind("}")
+        if start >= 0 and end > start:
+            try:
+                return json.loads(raw[start:end + 1])
+            except ValueError:
+                pass
+        if strict or not self.fields:
+            raise ValueError(f"Respons stream bukan JSON: {raw[:80]!r}")
+        return dict(self.fields)
@@ -0,0 +1,5 @@
+# Modul server ada langsung di Final/ (bukan package), jadi folder itu dimasukkan ke sys.path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+import re
+
+from admin import CORS_RESOURCES, authorized
+
+
+def test_token_required_when_configured():
+    assert authorized({"X-Admin-Token": "rahasia"}, "10.0.0.5", token="rahasia")
+    assert not authorized({"X-Admin-Token": "salah"}, "127.0.0.1", token="rahasia")
+    assert not authorized({}, "127.0.0.1", token="rahasia")
+
+
+def test_without_token_only_local_requests_are_allowed():
+    assert authorized({}, "127.0.0.1", token="")
+    assert authorized({}, "::1", token="")
+    assert not authorized({}, "192.168.1.20", token="")
+
+
+def test_browser_requests_are_rejected_without_token():
+    assert not authorized({"Origin": "http://evil.example"}, "127.0.0.1", token="")
+
+
+def test_token_read_from_env(monkeypatch):
+    monkeypatch.setenv("RECIPIENT_ADMIN_TOKEN", "rahasia")
+    assert not authorized({}, "127.0.0.1")
+    assert authorized({"X-Admin-Token": "rahasia"}, "10.0.0.5")
+
+
+def test_cors_skips_recipient_routes():
+    (pattern,) = CORS_RESOURCES
+    assert re.match(pattern, "/health")
+    assert re.match(pattern, "/recipientsx")
+    assert not re.match(pattern, "/recipients")
+    assert not re.match(pattern, "/recipients/aisyah")
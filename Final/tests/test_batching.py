@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+
+import pytest
+
+from batching import GeminiBatcher
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Prompt batch dijawab `batch_reply`; prompt tunggal dijawab keputusan untuk teks itu."""
+
+    def __init__(self, batch_reply=None):
+        self.batch_reply = batch_reply
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        if prompt.startswith("Berikut daftar"):
+            return _Response(self.batch_reply)
+        if prompt == "rusak":
+            return _Response("bukan json")
+        return _Response(json.dumps({"action": "deny", "text": prompt}))
+
+
+def submit_together(batcher, texts):
+    results = {}
+
+    def run(text):
+        try:
+            results[text] = batcher.submit(text)
+        except Exception as e:
+            results[text] = e
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in texts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_batch_answers_are_split_back_in_order():
+    reply = "```json\n" + json.dumps([{"action": "open", "name": "A"}, {"action": "deny"}]) + "\n```"
+    batcher = GeminiBatcher(FakeModel(reply), max_batch=2, max_wait=0.5)
+    results = submit_together(batcher, ["satu", "dua"])
+    assert sorted(r["action"] for r in results.values()) == ["deny", "open"]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_wrong_length_falls_back_to_single_calls_and_keeps_errors_per_item():
+    batcher = GeminiBatcher(FakeModel(json.dumps([{"action": "open"}])), max_batch=2, max_wait=0.5)
+    results = submit_together(batcher, ["satu", "rusak"])
+    assert results["satu"] == {"action": "deny", "text": "satu"}
+    assert isinstance(results["rusak"], ValueError)
+    assert batcher.stats()["fallbacks"] == 1
+
+
+def test_submit_times_out():
+    class Hanging(FakeModel):
+        def generate_content(self, prompt):
+            time.sleep(0.3)
+            return super().generate_content(prompt)
+
+    batcher = GeminiBatcher(Hanging(), max_batch=1, timeout=0.05)
+    with pytest.raises(TimeoutError):
+        batcher.submit("satu")
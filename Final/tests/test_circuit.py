@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from circuit import CircuitBreaker, CircuitBusyError, CircuitOpenError
+
+
+def test_timeout_counts_as_failure():
+    breaker = CircuitBreaker("t", call_timeout=0.1, max_workers=1)
+    release = threading.Event()
+    with pytest.raises(TimeoutError):
+        breaker.call(release.wait, 5)
+    release.set()
+    stats = breaker.stats()
+    assert stats["timeouts"] == 1
+    assert stats["window_calls"] == 1 and stats["error_rate"] == 1.0
+
+
+def test_deadline_starts_when_the_call_runs_not_when_it_is_queued():
+    # 1 worker, 3 panggilan 0.2 s dengan timeout 0.3 s: yang kedua antre 0.2 s tapi tetap sukses
+    breaker = CircuitBreaker("t", call_timeout=0.3, max_workers=1, max_queue=2)
+    results, errors = [], []
+
+    def caller():
+        try:
+            results.append(breaker.call(time.sleep, 0.2))
+        except Exception as e:
+            errors.append(e)
+
+    threads = []
+    for _ in range(3):
+        threads.append(threading.Thread(target=caller))
+        threads[-1].start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    # Yang ketiga antre 0.4 s > timeout → ditolak sebelum jalan, bukan timeout backend
+    assert len(results) == 2
+    assert len(errors) == 1 and isinstance(errors[0], CircuitBusyError)
+    assert breaker.stats()["timeouts"] == 0
+    assert breaker.stats()["error_rate"] == 0.0
+
+
+def test_queued_call_that_waits_too_long_never_runs():
+    breaker = CircuitBreaker("t", call_timeout=0.1, max_workers=1)
+    release = threading.Event()
+    ran = []
+
+    def block():
+        with pytest.raises(TimeoutError):
+            breaker.call(release.wait, 1)
+
+    blocker = threading.Thread(target=block)
+    blocker.start()
+    time.sleep(0.02)
+    with pytest.raises(CircuitBusyError):
+        breaker.call(ran.append, True)
+    release.set()
+    blocker.join()
+    time.sleep(0.05)
+    assert ran == []
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_full_queue_is_rejected_immediately():
+    breaker = CircuitBreaker("t", call_timeout=1.0, max_workers=1, max_queue=0)
+    release = threading.Event()
+    worker = threading.Thread(target=breaker.call, args=(release.wait, 1))
+    worker.start()
+    time.sleep(0.02)
+    started = time.monotonic()
+    with pytest.raises(CircuitBusyError):
+        breaker.call(lambda: None)
+    assert time.monotonic() - started < 0.1
+    release.set()
+    worker.join()
+    assert breaker.stats()["pending"] == 0
+
+
+def test_trips_open_then_recovers_through_half_open():
+    breaker = CircuitBreaker("t", min_calls=2, cooldown=0.05, call_timeout=1.0)
+
+    def fail():
+        raise RuntimeError("down")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: "never")
+    time.sleep(0.06)
+    assert breaker.call(lambda: "up") == "up"
+    assert breaker.state == "closed"
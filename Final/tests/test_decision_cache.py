@@ -0,0 +1,61 @@
+import time
+
+from decision_cache import DecisionCache
+
+OPEN = {"action": "open", "name": "Nadia"}
+
+
+def test_hit_uses_normalized_text_and_returns_a_copy():
+    cache = DecisionCache()
+    cache.put("Paket untuk Nadia!", "v1", OPEN)
+    hit = cache.get("paket untuk nadia", "v1")
+    assert hit == OPEN
+    hit["name"] = "X"
+    assert cache.get("paket untuk nadia", "v1") == OPEN
+
+
+def test_lru_evicts_least_recently_used():
+    cache = DecisionCache(maxsize=2)
+    cache.put("satu", "v1", {"n": 1})
+    cache.put("dua", "v1", {"n": 2})
+    assert cache.get("satu", "v1")  # "satu" jadi paling baru dipakai
+    cache.put("tiga", "v1", {"n": 3})
+    assert cache.get("dua", "v1") is None
+    assert cache.get("satu", "v1") and cache.get("tiga", "v1")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = DecisionCache(ttl=0.05)
+    cache.put("satu", "v1", OPEN)
+    assert cache.get("satu", "v1")
+    time.sleep(0.06)
+    assert cache.get("satu", "v1") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_recipient_list_change_clears_cache():
+    cache = DecisionCache()
+    cache.put("paket untuk nadia", "v1", OPEN)
+    assert cache.get("paket untuk nadia", "v2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_snapshot_round_trip_skips_expired_and_stale_versions(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = DecisionCache(ttl=60, path=path)
+    cache.put("paket untuk nadia", "v1", OPEN)
+    cache.put("lama", "v1", OPEN)
+    cache._data["lama"] = (time.time() - 1, OPEN)  # Sudah kedaluwarsa
+    cache.save()
+
+    warm = DecisionCache(path=path)
+    assert warm.load("v1") == 1
+    assert warm.get("paket untuk nadia", "v1") == OPEN
+    assert DecisionCache(path=path).load("v2") == 0
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text("{rusak")
+    assert DecisionCache(path=str(path)).load("v1") == 0
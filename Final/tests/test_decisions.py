@@ -0,0 +1,30 @@
+import pytest
+
+from decisions import DecisionPipeline
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return DecisionPipeline(db_path=str(tmp_path / "recipients.db"), poll_interval=0)
+
+
+def test_open_for_known_recipient_is_cached(pipeline):
+    result = {"action": "open", "name": "aisyah", "message": "Silakan"}
+    assert pipeline.remember("buat aisyah", result) == result
+    assert pipeline.cache.get("buat aisyah", pipeline.index.version) == result
+
+
+def test_open_for_unknown_name_asks_again_and_is_not_cached(pipeline):
+    result = pipeline.remember("buat bambang", {"action": "open", "name": "bambang"})
+    assert result["action"] == "ask_name"
+    assert pipeline.cache.get("buat bambang", pipeline.index.version) is None
+
+
+def test_open_without_name_is_rejected(pipeline):
+    assert pipeline.remember("buka saja", {"action": "open"})["action"] == "ask_name"
+
+
+def test_deny_is_cached_unchanged(pipeline):
+    result = {"action": "deny", "message": "Bukan penghuni"}
+    assert pipeline.remember("paket tetangga", result) == result
+    assert pipeline.cache.get("paket tetangga", pipeline.index.version) == result
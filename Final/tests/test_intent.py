@@ -0,0 +1,72 @@
+import pytest
+
+from intent import IntentEngine
+from recipients import RecipientIndex
+
+NAMES = ["aisyah", "nadia", "rabiathul"]
+
+
+@pytest.fixture
+def engine():
+    index = RecipientIndex(NAMES)
+    return IntentEngine(index.names, conversational=False, index=index)
+
+
+@pytest.mark.parametrize("text, name", [
+    ("aisyah", "Aisyah"),
+    ("paket untuk aisyah", "Aisyah"),
+    ("Permisi mbak, paket atas nama Nadia ya", "Nadia"),
+    ("paket untuk aisah", "Aisyah"),  # Kunci fonetik sama persis
+    ("rabi athul", "Rabiathul"),      # STT memecah nama jadi dua kata
+])
+def test_name_alone_opens_locally(engine, text, name):
+    decision = engine.classify(text)
+    assert decision["action"] == "open" and decision["name"] == name
+
+
+@pytest.mark.parametrize("text", [
+    "bukan nadia, paket untuk budi",
+    "dari nadia untuk budi",
+    "nadia bukan, ini untuk budi",
+    "aisyah temannya siapa",
+    "paket dari nadia",
+    "nadia dan aisyah",
+    "bukan aisah",
+    "tidak untuk aisyah",
+    "buat kadia",  # Hanya mirip → Gemini yang memutuskan dengan kandidat
+])
+def test_name_with_other_content_goes_to_gemini(engine, text):
+    assert engine.classify(text) is None
+
+
+@pytest.mark.parametrize("text", [
+    "bukan nadia, paket untuk budi",
+    "dari nadia untuk budi",
+    "aisyah temannya siapa",
+    "buat kadia",
+])
+def test_degraded_fallback_never_opens_on_ambiguous_text(engine, text):
+    assert engine.fallback(text)["action"] == "ask_name"
+
+
+def test_fallback_opens_only_for_the_name_alone(engine):
+    assert engine.fallback("paket untuk nadia")["action"] == "open"
+    assert engine.fallback("ini buat budi")["action"] == "deny"
+
+
+def test_unregistered_name_after_carrier_is_denied(engine):
+    assert engine.classify("ini buat budi")["action"] == "deny"
+    assert engine.classify("paket")["action"] == "ask_name"
+    assert engine.classify("untuk siapa ya") is None
+
+
+def test_conversational_wake_and_sleep():
+    engine = IntentEngine(NAMES)
+    assert engine.classify("hallo")["action"] == "wake"
+    assert engine.classify("sudah diambil, terima kasih")["action"] == "sleep"
+    assert engine.classify("sudah untuk nadia, bukan aisyah") is None
+
+
+def test_set_names_updates_matching(engine):
+    engine.set_names(NAMES + ["budi"])
+    assert engine.classify("ini buat budi")["action"] == "open"
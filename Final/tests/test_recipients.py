@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from recipients import DeletionIndex, RecipientIndex, edit_distance, phonetic_key
+
+
+@pytest.mark.parametrize("a, b", [
+    ("aisyah", "aisah"),
+    ("aisyah", "aisya"),
+    ("nadia", "nadiyah"),
+    ("rabiathul", "rabiatul"),
+    ("annisa", "anisa"),
+    ("zulfa", "sulfa"),
+])
+def test_spelling_variants_share_a_phonetic_key(a, b):
+    assert phonetic_key(a) == phonetic_key(b)
+
+
+def test_different_names_keep_different_keys():
+    assert phonetic_key("nadia") != phonetic_key("kadia")
+    assert phonetic_key("aisyah") != phonetic_key("aisyi")
+
+
+def test_edit_distance_with_limit():
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("kitten", "sitting", limit=1) == 2  # Berhenti lebih awal: > limit
+    assert edit_distance("abc", "abc") == 0
+
+
+def test_deletion_index_matches_brute_force():
+    rng = random.Random(0)
+    words = {"".join(rng.choice("aiunsdrk") for _ in range(rng.randint(3, 8))) for _ in range(300)}
+    index = DeletionIndex(max_distance=2)
+    for word in words:
+        index.add(word)
+    for query in list(words)[:40] + ["nadia", "rabiatul", "xyz"]:
+        for tolerance in (1, 2):
+            expected = sorted((edit_distance(query, w), w) for w in words if edit_distance(query, w) <= tolerance)
+            assert index.search(query, tolerance) == expected
+
+
+@pytest.fixture
+def index():
+    return RecipientIndex(["Aisyah", "nadia", "rabiathul"])
+
+
+def test_lookup_scores_exact_phonetic_and_fuzzy(index):
+    assert index.lookup("aisah") == ("aisyah", 1.0)
+    name, score = index.lookup("kadia")
+    assert name == "nadia" and 0.8 <= score < 1.0
+    assert index.lookup("budi") is None
+    assert index.lookup("ai") is None  # Terlalu pendek untuk dicocokkan
+
+
+def test_resolve_accepts_only_exact_directory_names(index):
+    assert index.resolve("Aisyah") == "aisyah"
+    assert index.resolve("  NADIA ") == "nadia"
+    assert index.resolve("aisah") is None  # Mirip saja tidak cukup untuk membuka kotak
+    assert index.resolve(None) is None
+
+
+def test_best_match_and_candidates(index):
+    assert index.best_match("paket untuk rabi atul") == ("rabiathul", 1.0)
+    assert index.candidates("buat kadia")[0] == "nadia"
+    assert index.candidates("untuk siapa ya") == []
+
+
+def test_set_names_changes_version(index):
+    before = index.version
+    index.set_names(["aisyah", "nadia", "rabiathul", "budi"])
+    assert index.version != before
+    assert index.resolve("budi") == "budi"
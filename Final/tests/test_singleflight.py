@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_callers_share_one_call_and_get_independent_copies():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"action": "open", "name": "Aisyah"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert len(results) == 4 and all(r == results[0] for r in results)
+    results[1]["name"] = "X"  # Penunggu dapat salinan, bukan objek yang sama
+    assert results[0]["name"] == "Aisyah"
+
+
+def test_error_reaches_every_waiter_and_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def broken():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("gemini down")
+
+    errors = []
+
+    def caller():
+        try:
+            flight.do("k", broken)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=caller) for _ in range(2)]
+    for t in followers:
+        t.start()
+    for t in [leader, *followers]:
+        t.join()
+    assert len(errors) == 3
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("k", lambda: "ok") == "ok"
+
+
+def test_async_error_propagates_to_followers():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def broken():
+            await asyncio.sleep(0.02)
+            raise ValueError("bad json")
+
+        return await asyncio.gather(*(flight.do("k", broken) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"action": "open"}
+
+        leader = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.create_task(flight.do("k", slow)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        results = await asyncio.gather(*followers)
+        return results, calls, flight
+
+    results, calls, flight = asyncio.run(scenario())
+    assert results == [{"action": "open"}] * 3
+    assert len(calls) == 2  # Satu follower mengambil alih panggilan
+    assert flight.stats()["in_flight"] == 0
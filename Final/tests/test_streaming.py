@@ -0,0 +1,48 @@
+import pytest
+
+from streaming import StreamingJSONParser
+
+
+def feed_all(parser, chunks):
+    pairs = []
+    for chunk in chunks:
+        pairs.extend(parser.feed(chunk))
+    return pairs
+
+
+def test_fields_are_emitted_as_soon_as_their_value_is_complete():
+    parser = StreamingJSONParser()
+    assert parser.feed('```json\n{"action": "op') == []
+    assert parser.feed('en", "na') == [("action", "open")]
+    assert parser.feed('me": "Aisyah", "tts": "Baik, paket') == [("name", "Aisyah")]
+    assert parser.feed(' atas nama Aisyah."}\n```') == [("tts", "Baik, paket atas nama Aisyah.")]
+    assert parser.result() == {"action": "open", "name": "Aisyah", "tts": "Baik, paket atas nama Aisyah."}
+
+
+def test_number_split_across_chunks_is_not_emitted_early():
+    parser = StreamingJSONParser()
+    assert parser.feed('{"score": 12') == []
+    assert parser.feed('3, "ok": true}') == [("score", 123), ("ok", True)]
+
+
+def test_escaped_quotes_inside_strings():
+    parser = StreamingJSONParser()
+    pairs = feed_all(parser, ['{"tts": "Dia bilang \\"ha', 'lo\\"", "action": "deny"}'])
+    assert pairs == [("tts", 'Dia bilang "halo"'), ("action", "deny")]
+
+
+def test_truncated_stream_returns_partial_fields_unless_strict():
+    chunks = ['{"action": "open", "name": "Nadia", "tts": "Sila']
+    parser = StreamingJSONParser()
+    feed_all(parser, chunks)
+    assert parser.result() == {"action": "open", "name": "Nadia"}
+    with pytest.raises(ValueError):
+        parser.result(strict=True)
+
+
+@pytest.mark.parametrize("text", ["", "Maaf, saya tidak mengerti.", '{"action" "open"}', "[1, 2]"])
+def test_invalid_stream_raises(text):
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    with pytest.raises(ValueError):
+        parser.result()
@@ -0,0 +1,46 @@
+from collections import Counter
+
+import pytest
+
+from topics import DEFAULT_BOX, ShardFilter, ShardRing, parse_topic, subscriptions, topic_for
+
+
+def test_topic_round_trip_and_legacy_topics():
+    assert topic_for("box01", "response") == "package/box01/response"
+    assert topic_for(DEFAULT_BOX, "response") == "package/response"
+    assert parse_topic("package/box01/text") == ("box01", "text")
+    assert parse_topic("package/text") == (DEFAULT_BOX, "text")
+    assert parse_topic("other/box01/text") == (None, None)
+    assert parse_topic("package/a/b/c") == (None, None)
+
+
+def test_subscriptions_with_share_group():
+    assert subscriptions("text") == ["package/+/text", "package/text"]
+    assert subscriptions("status", "grp") == ["$share/grp/package/+/status", "$share/grp/package/status"]
+
+
+def test_every_box_has_exactly_one_owner():
+    boxes = [f"box{i:03d}" for i in range(600)]
+    shards = [ShardFilter(f"{i}/3") for i in range(3)]
+    owners = Counter(sum(s.owns(b) for s in shards) for b in boxes)
+    assert owners == {1: len(boxes)}
+    per_shard = [sum(s.owns(b) for b in boxes) for s in shards]
+    assert min(per_shard) > len(boxes) / 3 * 0.6  # Pembagian kira-kira rata
+
+
+def test_adding_a_shard_moves_only_a_fraction_of_boxes():
+    boxes = [f"box{i:03d}" for i in range(1000)]
+    before, after = ShardRing(3), ShardRing(4)
+    moved = sum(before.owner(b) != after.owner(b) for b in boxes)
+    assert moved < len(boxes) * 0.4  # ~1/4 idealnya, jauh di bawah hash modulo (~3/4)
+
+
+def test_without_shard_every_box_is_owned():
+    shard = ShardFilter("")
+    assert shard.owns("box01") and shard.describe() == "all"
+
+
+def test_shard_and_share_group_together_are_rejected():
+    with pytest.raises(ValueError):
+        ShardFilter("0/2", share_group="grp")
+    assert ShardFilter("", share_group="grp").owns("box01")
@@ -0,0 +1,28 @@
+import json
+
+import tracing
+
+
+def test_client_trace_id_is_adopted_only_when_valid_and_unused():
+    tracer = tracing.Tracer()
+    adopted = tracer.start("0123456789abcdef")
+    assert adopted.trace_id == "0123456789abcdef"
+    assert tracer.start("0123456789abcdef").trace_id != adopted.trace_id  # Bentrok → id baru
+    assert tracer.start("../etc/passwd").trace_id != "../etc/passwd"
+    assert tracer.get("0123456789abcdef") is adopted
+    assert tracer.stats()["rejected_ids"] == 2
+
+
+def test_record_status_closes_the_trace():
+    trace = tracing.tracer.start(source="test")
+    payload = json.dumps({"status": "opened", "trace": trace.trace_id})
+    assert tracing.record_status(payload) == "opened"
+    assert "utterance_to_servo_ms" in trace.to_dict()
+    assert tracing.record_status("boot_ready") == "boot_ready"  # Format lama tanpa trace
+
+
+def test_tag_adds_active_trace_to_commands():
+    trace = tracing.tracer.start()
+    with tracing.activate(trace):
+        assert tracing.tag({"action": "open"}) == {"action": "open", "trace": trace.trace_id}
+    assert tracing.tag({"action": "open"}) == {"action": "open"}
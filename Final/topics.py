@@ -0,0 +1,83 @@
+# ================= MQTT TOPICS PER BOX =================
+# Skema baru: package/<box_id>/<jenis>, contoh package/box01/text, package/box01/response.
+# Server subscribe pakai wildcard (package/+/text) jadi satu proses bisa melayani banyak box.
+# Topic lama tanpa box id (package/text, package/response, ...) tetap didukung sebagai DEFAULT_BOX.
+#
+# Membagi armada ke beberapa server:
+#   - MQTT_SHARE_GROUP=grp → shared subscription ($share/grp/package/+/text), broker yang membagi
+#     pesan. Cocok untuk server stateless (Final/main.py).
+#   - SERVER_SHARD=i/n     → semua server subscribe wildcard, tapi hanya memproses box yang
+#     jatuh ke shard i pada consistent-hash ring. Pesan satu box selalu ke server yang sama,
+#     jadi state sesi (sleep mode) tetap konsisten.
+#   Keduanya tidak bisa digabung: broker hanya mengirim tiap pesan ke satu anggota group, lalu
+#   ShardFilter membuangnya kalau box itu milik shard lain → pesan hilang tanpa jejak.
+import bisect
+import hashlib
+import os
+
+TOPIC_PREFIX = os.getenv('MQTT_TOPIC_PREFIX', "package")
+DEFAULT_BOX = "esp32"
+
+
+def topic_for(box_id, kind):
+    """Topic tujuan untuk satu box; box lama (tanpa id) tetap di topic lama."""
+    if box_id == DEFAULT_BOX:
+        return f"{TOPIC_PREFIX}/{kind}"
+    return f"{TOPIC_PREFIX}/{box_id}/{kind}"
+
+
+def parse_topic(topic):
+    """'package/box01/text' → ('box01', 'text'); 'package/text' → (DEFAULT_BOX, 'text')."""
+    parts = topic.split("/")
+    if len(parts) == 3 and parts[0] == TOPIC_PREFIX:
+        return parts[1], parts[2]
+    if len(parts) == 2 and parts[0] == TOPIC_PREFIX:
+        return DEFAULT_BOX, parts[1]
+    return None, None
+
+
+def subscriptions(kind, share_group=None):
+    """Daftar topic filter untuk satu jenis pesan (wildcard + topic lama)."""
+    filters = [f"{TOPIC_PREFIX}/+/{kind}", f"{TOPIC_PREFIX}/{kind}"]
+    if share_group:
+        filters = [f"$share/{share_group}/{f}" for f in filters]
+    return filters
+
+
+def _hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:8], 16)
+
+
+class ShardRing:
+    """Consistent hashing box_id → shard. Tambah/kurang server hanya memindah ~1/n box."""
+
+    def __init__(self, shards, vnodes=160):
+        self.shards = shards
+        self._ring = sorted((_hash(f"shard-{s}#{v}"), s) for s in range(shards) for v in range(vnodes))
+        self._keys = [h for h, _ in self._ring]
+
+    def owner(self, box_id):
+        i = bisect.bisect(self._keys, _hash(box_id)) % len(self._ring)
+        return self._ring[i][1]
+
+
+class ShardFilter:
+    """Dibaca dari env SERVER_SHARD='i/n'; tanpa env semua box diproses."""
+
+    def __init__(self, spec=None, share_group=None):
+        spec = spec if spec is not None else os.getenv('SERVER_SHARD', "")
+        if spec and share_group:
+            raise ValueError(
+                f"SERVER_SHARD={spec} tidak bisa dipakai bersama MQTT_SHARE_GROUP={share_group}: "
+                "broker membagi pesan ke server yang belum tentu pemilik box-nya. Pilih salah satu.")
+        if spec:
+            index, count = spec.split("/")
+            self.index, self.ring = int(index), ShardRing(int(count))
+        else:
+            self.index, self.ring = 0, None
+
+    def owns(self, box_id):
+        return self.ring is None or self.ring.owner(box_id) == self.index
+
+    def describe(self):
+        return f"{self.index}/{self.ring.shards}" if self.ring else "all"
@@ -0,0 +1,181 @@
+# ================= TRACING (correlation id) =================
+# Satu pengantaran melewati HTTP/MQTT, Gemini, TTS, beberapa publish ke ESP32, lalu status
+# "opened" dari firmware. Trace id dibuat di ingress, ikut di setiap perintah MQTT
+# ("trace": ...), dan dikembalikan firmware di status {"status": "opened", "trace": ...}.
+# Span diambil otomatis dari metrics.timed() selama trace aktif di thread itu.
+# Trace terakhir disimpan di ring buffer (TRACE_BUFFER) dan bisa di-dump sebagai JSON.
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import metrics
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+_TRACE_ID = re.compile(r"[0-9a-f]{16}")
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    __slots__ = ("trace_id", "started", "wall_start", "attrs", "spans", "events", "_lock")
+
+    def __init__(self, trace_id, attrs):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.attrs = attrs
+        self.spans = []   # (nama, offset_ms, durasi_ms, thread)
+        self.events = []  # (nama, offset_ms)
+        self._lock = threading.Lock()
+
+    def offset_ms(self, at=None):
+        return round(((time.perf_counter() if at is None else at) - self.started) * 1000, 2)
+
+    def add_span(self, name, started, seconds):
+        span = (name, self.offset_ms(started), round(seconds * 1000, 2), threading.current_thread().name)
+        with self._lock:
+            self.spans.append(span)
+
+    def event(self, name):
+        offset = self.offset_ms()
+        with self._lock:
+            self.events.append((name, offset))
+        return offset
+
+    def to_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+            events = list(self.events)
+        data = {
+            "trace": self.trace_id,
+            "start": self.wall_start,
+            **self.attrs,
+            "spans": [{"name": n, "offset_ms": o, "duration_ms": d, "thread": t} for n, o, d, t in spans],
+            "events": [{"name": n, "offset_ms": o} for n, o in events],
+        }
+        opened = next((o for n, o in events if n == "opened"), None)
+        if opened is not None:
+            data["utterance_to_servo_ms"] = opened
+        return data
+
+
+class Tracer:
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._traces = OrderedDict()  # trace_id -> Trace, paling lama di depan
+        self._lock = threading.Lock()
+        self.started = 0
+        self.unknown_echoes = 0
+        self.rejected_ids = 0  # X-Trace-Id klien yang tidak valid/bentrok
+
+    def start(self, trace_id=None, **attrs):
+        """Trace baru. trace_id dari klien (X-Trace-Id) hanya dipakai kalau formatnya sama dengan
+        id buatan server dan belum ada di buffer; selain itu dibuat id baru supaya trace lain
+        tidak tertimpa."""
+        with self._lock:
+            if not trace_id or not _TRACE_ID.fullmatch(trace_id) or trace_id in self._traces:
+                if trace_id:
+                    self.rejected_ids += 1
+                trace_id = new_trace_id()
+            trace = Trace(trace_id, attrs)
+            self._traces[trace.trace_id] = trace
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+            self.started += 1
+        return trace
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def event(self, trace_id, name):
+        """Catat event untuk trace_id (mis. echo "opened" dari firmware); offset ms atau None."""
+        trace = self.get(trace_id)
+        if trace is None:
+            with self._lock:
+                self.unknown_echoes += 1
+            return None
+        return trace.event(name)
+
+    def dump(self, limit=100):
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        return [trace.to_dict() for trace in reversed(traces)]
+
+    def stats(self):
+        with self._lock:
+            return {"buffered": len(self._traces), "capacity": self.capacity,
+                    "started": self.started, "unknown_echoes": self.unknown_echoes,
+                    "rejected_ids": self.rejected_ids}
+
+
+tracer = Tracer(capacity=int(os.getenv('TRACE_BUFFER', 1024)))
+
+
+def current():
+    return _current.get()
+
+
+def current_id():
+    trace = _current.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def activate(trace):
+    """Jadikan `trace` trace aktif di thread/konteks ini selama blok berjalan."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def _record_stage(stage, started, seconds):
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(stage, started, seconds)
+
+
+metrics.add_listener(_record_stage)
+
+
+def tag(payload):
+    """Tambahkan "trace" ke perintah MQTT (dict baru) kalau ada trace aktif."""
+    trace_id = current_id()
+    if trace_id and isinstance(payload, dict) and "trace" not in payload:
+        return {**payload, "trace": trace_id}
+    return payload
+
+
+def parse_status(payload):
+    """Status firmware: "opened" (lama) atau {"status": "opened", "trace": "..."} → (status, trace_id)."""
+    if payload.startswith("{"):
+        try:
+            data = json.loads(payload)
+            return data.get("status", ""), data.get("trace")
+        except ValueError:
+            pass
+    return payload, None
+
+
+def record_status(payload):
+    """Catat status firmware ke trace-nya (+ metrik utterance_to_servo saat "opened"); kembalikan status."""
+    status, trace_id = parse_status(payload)
+    if trace_id:
+        offset_ms = tracer.event(trace_id, status)
+        if offset_ms is not None and status == "opened":
+            metrics.observe("utterance_to_servo", offset_ms / 1000)
+            print(f"⏱️ Trace {trace_id}: servo terbuka {offset_ms:.0f} ms setelah ucapan masuk")
+    return status
@@ -0,0 +1,110 @@
+# ================= BOUNDED WORKER POOL =================
+# Callback paho (on_message) jalan di thread network MQTT. Kalau di situ kita nunggu
+# Gemini 1-3 detik, keepalive macet dan pesan box lain ikut antre. Jadi callback cukup
+# memasukkan job ke antrean terbatas; thread worker yang memproses.
+import queue
+import threading
+import time
+
+
+class WorkerPool:
+    def __init__(self, name="worker", workers=4, queue_size=64, deadline=10.0, on_wait=None):
+        self.name = name
+        self.deadline = deadline
+        self.on_wait = on_wait  # on_wait(detik) per job, mis. untuk histogram metrics
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, on_expired=None):
+        """Masukkan job; False kalau antrean penuh (backpressure, jangan blok thread MQTT)."""
+        now = time.monotonic()
+        job = (now, now + self.deadline, fn, args, on_expired)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            print(f"[{self.name}] Antrean penuh ({self._queue.maxsize}), job ditolak")
+            return False
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            enqueued_at, deadline_at, fn, args, on_expired = job
+            started = time.monotonic()
+            waited = started - enqueued_at
+            with self._lock:
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            if self.on_wait:
+                self.on_wait(waited)
+
+            if started > deadline_at:
+                # Sudah lewat batas waktu: jawaban telat lebih buruk daripada tidak menjawab
+                with self._lock:
+                    self.expired += 1
+                print(f"[{self.name}] Job kedaluwarsa setelah antre {waited:.2f}s")
+                if on_expired:
+                    try:
+                        on_expired(*args)
+                    except Exception as e:
+                        print(f"[{self.name}] on_expired error: {e}")
+                continue
+
+            try:
+                fn(*args)
+                ok = True
+            except Exception as e:
+                ok = False
+                print(f"[{self.name}] Job error: {e}")
+            with self._lock:
+                self._run_total += time.monotonic() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            started = self.completed + self.failed + self.expired
+            finished = self.completed + self.failed
+            return {
+                "workers": len(self._threads),
+                "queue_depth": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 1) if started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 1),
+                "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join(timeout=1)
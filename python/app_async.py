@@ -0,0 +1,181 @@
+# ================= ASGI BRIDGE (asyncio) =================
+# Versi async dari app.py: Quart + aiomqtt + generate_content_async di satu event loop.
+# Request yang menunggu Gemini tidak memakan thread; jumlah panggilan Gemini paralel
+# dibatasi GEMINI_CONCURRENCY.
+#   pip install quart quart-cors aiomqtt
+#   python app_async.py   atau   uvicorn app_async:app --port 5000
+from quart import Quart, request, jsonify
+from quart_cors import cors
+import google.generativeai as genai
+import os
+from dotenv import load_dotenv
+import aiomqtt
+import asyncio
+import json
+
+load_dotenv()
+app = cors(Quart(__name__))
+
+# ================= MQTT SETUP =================
+MQTT_BROKER = "broker.hivemq.com"
+MQTT_PORT = 1883
+MQTT_PUB_TOPIC = "package/chat"        # Kirim perintah ke ESP32
+MQTT_SUB_TOPIC_CONFIRM = "package/confirm"  # Terima konfirmasi
+
+mqtt_state = {'client': None, 'last_confirm': None}
+
+async def send_to_esp32(command):
+    client = mqtt_state['client']
+    if client is None:
+        print(f"[MQTT] Belum terhubung, perintah dibuang: {command}")
+        return
+    await client.publish(MQTT_PUB_TOPIC, command)
+    print(f"📡 → ESP32: {command}")
+
+async def mqtt_loop():
+    while True:
+        try:
+            async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as client:
+                await client.subscribe(MQTT_SUB_TOPIC_CONFIRM)
+                mqtt_state['client'] = client
+                async for message in client.messages:
+                    payload = message.payload.decode()
+                    print(f"📥 Konfirmasi dari ESP32: {payload}")
+                    mqtt_state['last_confirm'] = payload  # Simpan untuk kurir_suara cek
+        except aiomqtt.MqttError as e:
+            mqtt_state['client'] = None
+            print(f"[MQTT] Terputus: {e}, coba lagi 5 detik")
+            await asyncio.sleep(5)
+        except Exception as e:
+            # Error lain (payload rusak, bug handler) jangan sampai mematikan task diam-diam
+            mqtt_state['client'] = None
+            print(f"[MQTT] Loop error: {e!r}, sambung ulang 5 detik")
+            await asyncio.sleep(5)
+
+# ================= GEMINI AI SETUP =================
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+
+MODEL_NAME = "gemini-1.5-flash"
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', 64))
+GEMINI_TIMEOUT_S = float(os.getenv('GEMINI_TIMEOUT_S', 5))
+gemini_slots = None  # asyncio.Semaphore, dibuat saat startup
+
+model = genai.GenerativeModel(
+    MODEL_NAME,
+    system_instruction="""
+Kamu adalah asisten pintar untuk Smart Package Box.
+Tugasmu: dari ucapan pengguna, tentukan apakah nama yang disebutkan termasuk dalam daftar penerima paket resmi.
+
+Daftar nama resmi (case-insensitive):
+- aisyah
+- rabiathul
+- nadia
+
+Aturan:
+1. Jika ucapan mengandung salah satu nama di atas (bisa dengan tambahan kata seperti "untuk", "buat", "mbak", "paket untuk", dll), kembalikan JSON:
+   {"action": "open", "name": "NamaAsli"}
+
+2. Jika nama tidak ada di daftar, kembalikan:
+   {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
+
+3. Jika belum jelas atau tidak ada nama sama sekali, kembalikan:
+   {"action": "ask_name", "message": "Paket atas nama siapa ya?"}
+
+Hanya kembalikan JSON valid. Jangan tambahkan teks lain.
+Contoh:
+Input: "Paket untuk Aisyah"
+Output: {"action": "open", "name": "Aisyah"}
+
+Input: "Ini buat Budi"
+Output: {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
+"""
+)
+
+# Fallback whitelist
+WHITELIST = ["aisyah", "rabiathul", "nadia"]
+
+async def extract_name_with_gemini(text):
+    try:
+        async with gemini_slots:
+            response = await asyncio.wait_for(model.generate_content_async(text), GEMINI_TIMEOUT_S)
+        result = json.loads(response.text.strip())
+        return result
+    except Exception as e:
+        print(f"[Gemini Error] Fallback aktif: {e!r}")
+        text_lower = text.lower()
+        for name in WHITELIST:
+            if name in text_lower:
+                return {"action": "open", "name": name.capitalize()}
+        return {"action": "deny", "message": "Maaf, nama tidak terdaftar."}
+
+@app.before_serving
+async def startup():
+    global gemini_slots
+    gemini_slots = asyncio.Semaphore(GEMINI_CONCURRENCY)
+    app.mqtt_task = asyncio.get_running_loop().create_task(mqtt_loop())
+
+@app.after_serving
+async def shutdown():
+    app.mqtt_task.cancel()
+
+# ================= ROUTE UTAMA =================
+@app.route('/package-voice', methods=['POST'])
+async def handle_voice_input():
+    try:
+        data = await request.get_json()
+        if not data or 'text' not in data:
+            return jsonify({"error": "Text input required"}), 400
+
+        user_speech = data['text'].strip()
+        print(f"👤 Pengguna berkata: {user_speech}")
+
+        decision = await extract_name_with_gemini(user_speech)
+
+        action = decision.get("action")
+        name = decision.get("name")
+        message = decision.get("message", "")
+
+        if action == "open":
+            # KIRIM PERINTAH KE ESP32: buka kotak
+            await send_to_esp32(f"name:{name.lower()}")
+            return jsonify({
+                "status": "success",
+                "action": "open",
+                "name": name,
+                "speak": f"Selamat! Paket untuk {name}. Kotak akan terbuka sekarang."
+            })
+
+        elif action == "deny":
+            await send_to_esp32("invalid_name")
+            return jsonify({
+                "status": "success",
+                "action": "deny",
+                "speak": message or "Maaf, nama tidak terdaftar. Paket tidak bisa diambil."
+            })
+
+        elif action == "ask_name":
+            await send_to_esp32("ask_name")
+            return jsonify({
+                "status": "success",
+                "action": "ask_name",
+                "speak": message
+            })
+
+        else:
+            return jsonify({"error": "Unknown action"}), 500
+
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return jsonify({"error": "Server error"}), 500
+
+@app.route('/health')
+async def health():
+    return jsonify({"status": "OK", "model": MODEL_NAME, "mode": "asgi",
+                    "mqtt_connected": mqtt_state['client'] is not None,
+                    "last_confirm": mqtt_state['last_confirm']})
+
+if __name__ == '__main__':
+    print("🚀 Smart Package Box AI Bridge dengan Gemini aktif! (ASGI/asyncio)")
+    print(f"   Model: {MODEL_NAME}, Gemini paralel maks {GEMINI_CONCURRENCY}")
+    print("   Siap menerima suara → analisis → kontrol ESP32")
+    app.run(host='0.0.0.0', port=5000)
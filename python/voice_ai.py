@@ -1,8 +1,11 @@
 import time
 import speech_recognition as sr
+import numpy as np
 import pyttsx3
 import requests
 import paho.mqtt.client as mqtt
+import vad
+from kws import KeywordSpotter
 
 # ================= KONFIG =================
 FLASK_SERVER_URL = "http://127.0.0.1:5000/package-voice"
@@ -41,14 +44,31 @@ def speak(text, delay=1.0):
 
 r = sr.Recognizer()
 mic = sr.Microphone()
+# Kalibrasi noise cukup sekali (dulu 0.5 detik di setiap listen); selanjutnya ambang
+# menyesuaikan sendiri (dynamic_energy_threshold) dan hening dipotong oleh vad.trim
+with mic as source:
+    r.adjust_for_ambient_noise(source, duration=0.5)
+
+# Nama penerima, "hallo", dan "sudah/ya/selesai" dikenali offline dari contoh rekaman
+# (kws_templates/<keyword>/*.wav); hanya ucapan lain yang dikirim ke recognize_google
+spotter = KeywordSpotter()
+print(f"[KWS] {spotter.load_dir('kws_templates')} contoh keyword dimuat")
 
 def listen(timeout=10):
     with mic as source:
         print("🎧 Mendengarkan...")
-        r.adjust_for_ambient_noise(source, duration=0.5)
         audio = r.listen(source, timeout=timeout, phrase_time_limit=10)
+    pcm = np.frombuffer(audio.get_raw_data(convert_rate=16000, convert_width=2), dtype=np.int16)
+    speech = vad.trim(pcm)
+    if speech is None:
+        print("🔇 Tidak ada ucapan, STT dilewati")
+        return ""
+    hit = spotter.spot(speech)
+    if hit:
+        print(f"👤 Pengguna (KWS {hit.elapsed_ms} ms): {hit.keyword}")
+        return hit.keyword
     try:
-        text = r.recognize_google(audio, language="id-ID").lower()
+        text = r.recognize_google(sr.AudioData(speech.tobytes(), 16000, 2), language="id-ID").lower()
         print(f"👤 Pengguna: {text}")
         return text
     except:
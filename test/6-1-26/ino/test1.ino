@@ -145,12 +145,20 @@ void mqttCallback(char* topic, byte* payload, unsigned int length) {
   if (deserializeJson(doc, msg)) return;
 
   String cmd = doc["cmd"] | "";
+  const char* trace = doc["trace"] | "";
   if (cmd == "open_box") {
     oledUpdate("Box Open");
     myServo.write(90);
     delay(800);
     myServo.write(0);
-    mqttPublishStatus("opened");
+    if (trace[0]) {
+      // Echo trace id → server menghitung latency audio masuk sampai servo terbuka
+      char status[64];
+      snprintf(status, sizeof(status), "{\"status\":\"opened\",\"trace\":\"%s\"}", trace);
+      mqttPublishStatus(status);
+    } else {
+      mqttPublishStatus("opened");
+    }
   }
 }
 
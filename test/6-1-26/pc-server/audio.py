@@ -0,0 +1,128 @@
+# ================= AUDIO INGEST (PCM mentah tanpa salinan) =================
+# ESP32 mengirim PCM 16 kHz, 16-bit, mono. Dulu body dibungkus AudioSegment, di-export ke
+# WAV BytesIO, lalu sr.AudioFile mem-parse WAV itu lagi: 10 detik audio disalin & di-encode/
+# decode beberapa kali per request. Sekarang body dilihat langsung sebagai array int16
+# (np.frombuffer di atas memoryview, tanpa salinan) dan AudioData dibuat dari buffer yang sama.
+import numpy as np
+import speech_recognition as sr
+
+from vad import FRAME_MS, frame_features, speech_frames, trim
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+
+def pcm_view(raw):
+    """Body request → array int16 read-only yang berbagi memori dengan `raw`."""
+    view = memoryview(raw)
+    if view.nbytes % SAMPLE_WIDTH:
+        view = view[:view.nbytes - view.nbytes % SAMPLE_WIDTH]  # Byte ganjil terakhir dibuang
+    return np.frombuffer(view, dtype=np.int16)
+
+
+def audio_data(pcm, rate=SAMPLE_RATE):
+    """AudioData untuk recognizer langsung dari array int16 (tanpa WAV perantara)."""
+    return sr.AudioData(memoryview(pcm).cast("B"), rate, SAMPLE_WIDTH)
+
+
+class NoSpeech(Exception):
+    """Rekaman tidak berisi ucapan; STT tidak perlu dipanggil."""
+
+
+def speech_only(pcm, rate=SAMPLE_RATE):
+    """Potong hening awal/akhir (view); NoSpeech kalau tidak ada ucapan sama sekali."""
+    trimmed = trim(pcm, rate)
+    if trimmed is None:
+        raise NoSpeech()
+    return trimmed
+
+
+class SpeechStream:
+    """VAD inkremental untuk upload chunked: PCM masuk ke buffer berukuran tetap (max_seconds),
+    energi dihitung per frame 30 ms, dan setiap segmen ucapan yang selesai (jeda >= pause_ms)
+    langsung dikembalikan feed() supaya STT bisa mulai sebelum upload selesai. Setelah
+    hening >= end_ms sesudah ucapan, `done` = True dan sisa upload tidak perlu dibaca."""
+
+    def __init__(self, rate=SAMPLE_RATE, max_seconds=15.0, threshold=500.0, start_frames=2,
+                 pause_ms=600, end_ms=900, preroll_ms=150):
+        self.rate = rate
+        self.frame = rate * FRAME_MS // 1000
+        self.threshold = threshold
+        self.start_frames = start_frames
+        self.pause = rate * pause_ms // 1000
+        self.end = rate * end_ms // 1000
+        self.preroll = rate * preroll_ms // 1000
+        self.buffer = np.empty(int(max_seconds * rate), dtype=np.int16)  # Batas memori per request
+        self.length = 0            # Sampel yang sudah masuk
+        self.segments = []         # (awal, akhir) dalam sampel
+        self.done = False
+        self.ended_at = None       # Sampel saat end-of-speech terdeteksi
+        self._carry = b""          # Byte ganjil yang belum membentuk satu sampel
+        self._analysed = 0
+        self._voiced_run = 0
+        self._segment_start = None
+        self._last_voice = None
+
+    def feed(self, chunk):
+        """Tambahkan bytes dari upload; kembalikan segmen ucapan (view int16) yang baru selesai."""
+        if self.done or not chunk:
+            return []
+        if self._carry:
+            chunk = self._carry + bytes(chunk)
+        usable = len(chunk) - len(chunk) % SAMPLE_WIDTH
+        self._carry = bytes(chunk[usable:])
+        samples = np.frombuffer(memoryview(chunk)[:usable], dtype=np.int16)
+        room = self.buffer.size - self.length
+        if samples.size >= room:
+            samples = samples[:room]
+            self.done = True  # Buffer penuh → anggap ucapan selesai
+        self.buffer[self.length:self.length + samples.size] = samples
+        self.length += samples.size
+        new = self._analyse()
+        if self.done:
+            new += self._close(self.length)
+        return new
+
+    def finish(self):
+        """Upload habis: tutup segmen yang masih terbuka."""
+        new = [] if self.done else self._close(self.length)
+        self.done = True
+        return new
+
+    def _close(self, end):
+        if self._segment_start is None:
+            return []
+        start, self._segment_start = self._segment_start, None
+        self.segments.append((start, end))
+        return [self.buffer[start:end]]
+
+    def _analyse(self):
+        count = (self.length - self._analysed) // self.frame
+        if count <= 0:
+            return []
+        rms, zcr = frame_features(self.buffer[self._analysed:self._analysed + count * self.frame], self.frame)
+        new = []
+        for voiced in speech_frames(rms, zcr, self.threshold):
+            start = self._analysed
+            end = self._analysed = start + self.frame
+            if voiced:
+                self._voiced_run += 1
+                self._last_voice = end
+                if self._segment_start is None and self._voiced_run >= self.start_frames:
+                    onset = end - self.start_frames * self.frame
+                    self._segment_start = max(0, onset - self.preroll)
+                continue
+            self._voiced_run = 0
+            if self._last_voice is None:
+                continue
+            silence = end - self._last_voice
+            if self._segment_start is not None and silence >= self.pause:
+                new += self._close(self._last_voice)
+            if silence >= self.end:
+                self.done = True
+                self.ended_at = end
+                break
+        return new
+
+    def duration_s(self):
+        return self.length / self.rate
@@ -0,0 +1,141 @@
+# ================= AUDIO STORE (file per isi, tulis atomik, batas ukuran) =================
+# Dulu setiap jawaban ditulis ke static/response.wav: dua request /audio_stream yang
+# bersamaan saling menimpa sebelum ESP32 sempat mengambil filenya lewat /audio/<filename>.
+# Sekarang nama file = hash isi audio, jadi tiap jawaban punya file sendiri dan audio yang
+# sama (frasa tetap dari PhraseCache) selalu dapat nama yang sama. File ditulis ke temp file
+# unik lalu di-rename, jadi ESP32 tidak pernah membaca file setengah jadi. Karena isi file
+# tidak pernah berubah untuk nama yang sama, respons /audio boleh di-cache selamanya.
+#
+# Isi folder dicatat di index memori (nama -> ukuran, urut LRU) supaya /audio dan put() tidak
+# perlu os.path.exists tiap request. Janitor di background membuang file yang paling lama
+# tidak diakses sampai total ukuran di bawah max_bytes; file yang baru ditulis/diakses dalam
+# `grace` detik terakhir tidak disentuh (ESP32 mungkin belum selesai mengunduhnya).
+# File lama dari sebelum store ini (`legacy`, mis. response.wav/welcome.wav) tidak pernah
+# disajikan lagi oleh /audio, jadi dibuang saat scan awal supaya tidak memakan disk selamanya.
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AudioStore:
+    def __init__(self, directory="static", fmt="wav", max_bytes=64 * 1024 * 1024, grace=120.0,
+                 legacy=()):
+        self.directory = directory
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._pattern = re.compile(rf"[0-9a-f]{{32}}\.{re.escape(fmt)}")
+        self._index = OrderedDict()  # nama -> [ukuran, akses terakhir], paling lama di depan
+        self._size = 0
+        self._lock = threading.Lock()
+        self._janitor = None
+        os.makedirs(directory, exist_ok=True)
+        self._scan(set(legacy))
+
+    def _scan(self, legacy):
+        """Bangun index dari isi folder (urut mtime); sisa temp file & file lama dibuang."""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                os.unlink(entry.path)
+            elif entry.name in legacy:
+                os.unlink(entry.path)
+                self.evictions += 1
+            elif self._pattern.fullmatch(entry.name):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._index[name] = [size, mtime]
+            self._size += size
+
+    def name(self, data):
+        return f"{hashlib.sha256(data).hexdigest()[:32]}.{self.fmt}"
+
+    def _touch(self, name):
+        entry = self._index.get(name)
+        if entry is not None:
+            entry[1] = time.time()
+            self._index.move_to_end(name)
+        return entry
+
+    def put(self, data):
+        """Simpan audio; kembalikan nama file unik untuk perintah play_audio."""
+        name = self.name(data)
+        with self._lock:
+            if self._touch(name) is not None:
+                return name  # Isi sama → file yang sudah ada dipakai ulang
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(self.directory, name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            if self._touch(name) is None:  # Thread lain bisa menulis isi yang sama bersamaan
+                self._index[name] = [len(data), time.time()]
+                self._size += len(data)
+                self.writes += 1
+        return name
+
+    def path(self, name):
+        """Path file untuk /audio/<name> dari index, atau None kalau tidak ada."""
+        with self._lock:
+            if self._touch(name) is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return os.path.join(self.directory, name)
+
+    def sweep(self):
+        """Buang file LRU sampai total ukuran <= max_bytes; kembalikan jumlah file yang dibuang."""
+        victims = []
+        with self._lock:
+            cutoff = time.time() - self.grace
+            for name, (size, accessed) in list(self._index.items()):
+                if self._size <= self.max_bytes or accessed > cutoff:
+                    break  # Urut LRU: sisanya lebih baru
+                del self._index[name]
+                self._size -= size
+                victims.append(name)
+            self.evictions += len(victims)
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return len(victims)
+
+    def start_janitor(self, interval=30.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    evicted = self.sweep()
+                    if evicted:
+                        print(f"[AudioStore] {evicted} file dibuang ({self._size // 1024} KB tersisa)")
+                except Exception as e:
+                    print(f"[AudioStore] Janitor gagal: {e}")
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=run, name="audio-janitor", daemon=True)
+            self._janitor.start()
+        return self._janitor
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._index), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                    "writes": self.writes, "evictions": self.evictions}
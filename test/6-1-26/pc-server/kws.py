@@ -0,0 +1,199 @@
+# ================= KEYWORD SPOTTER (offline, CPU) =================
+# Kosakata yang benar-benar menentukan alur sangat kecil: nama penerima, "hallo", dan
+# "sudah/ya/selesai". Untuk itu tidak perlu recognize_google (round trip jaringan 1-3 detik).
+# Tiap keyword punya beberapa rekaman contoh (kws_templates/<keyword>/*.wav, 16 kHz mono).
+# Audio masuk → MFCC (NumPy murni) → subsequence DTW terhadap tiap contoh, jadi nama tetap
+# ketemu walau diucapkan di tengah kalimat ("paket untuk aisyah"). Hit hanya dipakai kalau
+# skornya di bawah ambang keyword itu, jelas lebih baik dari keyword lain, DAN keyword itu
+# mengisi hampir seluruh ucapan: "bukan aisyah" atau "paket aisyah? bukan untuk saya" punya
+# ucapan lain di luar nama, jadi tidak boleh diringkas jadi "aisyah". Selain itu spot()
+# mengembalikan None dan pemanggil tetap memakai STT biasa.
+import os
+import sys
+import time
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+from vad import trim
+
+Hit = namedtuple("Hit", "keyword score threshold elapsed_ms")
+
+
+def _hz_to_mel(f):
+    return 2595.0 * np.log10(1.0 + f / 700.0)
+
+
+def _mel_to_hz(m):
+    return 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+
+
+def mel_filterbank(n_mels, n_fft, rate, fmin=20.0, fmax=None):
+    points = _mel_to_hz(np.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax or rate / 2), n_mels + 2))
+    bins = np.floor((n_fft + 1) * points / rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1), dtype=np.float32)
+    for m in range(1, n_mels + 1):
+        left, center, right = bins[m - 1], bins[m], bins[m + 1]
+        if center > left:
+            bank[m - 1, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[m - 1, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+
+def dct_matrix(n_out, n_in):
+    k = np.arange(n_out)[:, None]
+    n = np.arange(n_in)[None, :]
+    matrix = np.cos(np.pi * k * (2 * n + 1) / (2 * n_in)) * np.sqrt(2.0 / n_in)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+class MFCC:
+    """MFCC tanpa librosa: pre-emphasis, frame 25 ms / hop 10 ms, Hamming, FFT, mel, log, DCT.
+    Koefisien ke-0 (energi) dibuang supaya skor tidak tergantung keras-pelannya suara."""
+
+    def __init__(self, rate=16000, n_mfcc=13, n_mels=26, win_ms=25, hop_ms=10, n_fft=512):
+        self.win = rate * win_ms // 1000
+        self.hop = rate * hop_ms // 1000
+        self.n_fft = n_fft
+        self.window = np.hamming(self.win).astype(np.float32)
+        self.bank = mel_filterbank(n_mels, n_fft, rate)
+        self.dct = dct_matrix(n_mfcc, n_mels)
+
+    def __call__(self, pcm):
+        x = pcm.astype(np.float32) / 32768.0
+        x[1:] -= 0.97 * x[:-1].copy()
+        if x.size < self.win:
+            x = np.pad(x, (0, self.win - x.size))
+        count = 1 + (x.size - self.win) // self.hop
+        frames = np.lib.stride_tricks.as_strided(
+            x, shape=(count, self.win), strides=(x.strides[0] * self.hop, x.strides[0]))
+        power = np.abs(np.fft.rfft(frames * self.window, self.n_fft)) ** 2
+        log_mel = np.log(power @ self.bank.T + 1e-10)
+        return (log_mel @ self.dct.T)[:, 1:]
+
+
+def subsequence_dtw(template, query):
+    """Jarak rata-rata per frame template terbaik di mana pun template muncul di dalam query.
+    Langkah (1,1), (1,2), (2,1): tiap baris hanya bergantung pada dua baris sebelumnya, jadi
+    satu baris dihitung sekaligus dengan NumPy (laju ucapan boleh 0.5x-2x contoh)."""
+    n, m = len(template), len(query)
+    if n == 0 or m < n // 2:
+        return np.inf
+    cost = np.sqrt(np.maximum(
+        (template ** 2).sum(1)[:, None] + (query ** 2).sum(1)[None, :] - 2.0 * template @ query.T, 0.0))
+    prev2 = np.full(m, np.inf, dtype=np.float32)
+    prev = cost[0].astype(np.float32)  # Boleh mulai di frame query mana pun
+    best = np.empty(m, dtype=np.float32)
+    for i in range(1, n):
+        best.fill(np.inf)
+        best[1:] = prev[:-1]
+        np.minimum(best[2:], prev[:-2], out=best[2:])
+        np.minimum(best[1:], prev2[:-1], out=best[1:])
+        prev2, prev = prev, cost[i] + best
+    return float(prev.min()) / n
+
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        if wf.getsampwidth() != 2 or wf.getnchannels() != 1:
+            raise ValueError(f"{path}: harus PCM 16-bit mono")
+        return np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16), wf.getframerate()
+
+
+class KeywordSpotter:
+    def __init__(self, rate=16000, threshold=3.0, margin=0.85, slack=1.3, max_seconds=2.5, coverage=1.4):
+        self.rate = rate
+        self.threshold = threshold      # Ambang default kalau keyword hanya punya satu contoh
+        self.margin = margin            # Skor terbaik harus <= margin x skor keyword lain
+        self.slack = slack
+        self.max_samples = int(max_seconds * rate)  # Ucapan panjang = kalimat → serahkan ke STT
+        self.coverage = coverage        # Ucapan maks coverage x panjang contoh yang cocok
+        self.mfcc = MFCC(rate)
+        self.templates = {}   # keyword -> [matriks MFCC]
+        self.thresholds = {}  # keyword -> ambang hasil kalibrasi
+        self.hits = 0
+        self.misses = 0
+        self.extra_speech = 0  # Keyword cocok tapi ada ucapan lain → tetap ke STT
+
+    def __bool__(self):
+        return bool(self.templates)
+
+    def enroll(self, keyword, pcm):
+        speech = trim(pcm, self.rate)  # Dipotong sama seperti ucapan yang dicocokkan
+        self.templates.setdefault(keyword.lower(), []).append(self.mfcc(pcm if speech is None else speech))
+        self._calibrate(keyword.lower())
+
+    def _calibrate(self, keyword):
+        """Ambang = jarak terjauh antar contoh keyword yang sama x slack."""
+        feats = self.templates[keyword]
+        pairs = [subsequence_dtw(a, b) for i, a in enumerate(feats) for j, b in enumerate(feats) if i != j]
+        pairs = [d for d in pairs if np.isfinite(d)]
+        self.thresholds[keyword] = max(pairs) * self.slack if pairs else self.threshold
+
+    def load_dir(self, path):
+        """kws_templates/<keyword>/*.wav → enroll semua; jumlah contoh yang dimuat."""
+        loaded = 0
+        if not os.path.isdir(path):
+            return 0
+        for keyword in sorted(os.listdir(path)):
+            folder = os.path.join(path, keyword)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if not name.lower().endswith(".wav"):
+                    continue
+                pcm, rate = read_wav(os.path.join(folder, name))
+                if rate != self.rate:
+                    print(f"[KWS] {keyword}/{name} dilewati: {rate} Hz != {self.rate} Hz")
+                    continue
+                self.enroll(keyword, pcm)
+                loaded += 1
+        return loaded
+
+    def _match(self, query):
+        """keyword -> (skor terbaik, panjang frame contoh yang memberi skor itu)."""
+        return {keyword: min((subsequence_dtw(t, query), len(t)) for t in feats)
+                for keyword, feats in self.templates.items()}
+
+    def scores(self, pcm):
+        return {keyword: score for keyword, (score, _) in self._match(self.mfcc(pcm)).items()}
+
+    def spot(self, pcm):
+        """Hit kalau yakin, None kalau tidak (atau audio terlalu panjang/spotter kosong)."""
+        if not self.templates or pcm.size == 0 or pcm.size > self.max_samples:
+            return None
+        started = time.perf_counter()
+        speech = trim(pcm, self.rate)
+        if speech is None:
+            return None
+        query = self.mfcc(speech)
+        ranked = sorted(self._match(query).items(), key=lambda kv: kv[1][0])
+        keyword, (score, length) = ranked[0]
+        runner_up = ranked[1][1][0] if len(ranked) > 1 else np.inf
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if score <= self.thresholds[keyword] and score <= runner_up * self.margin:
+            if len(query) > self.coverage * length:
+                self.extra_speech += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return Hit(keyword, round(score, 2), round(self.thresholds[keyword], 2), round(elapsed_ms, 2))
+        self.misses += 1
+        return None
+
+    def stats(self):
+        return {"keywords": sorted(self.templates), "templates": sum(map(len, self.templates.values())),
+                "thresholds": {k: round(v, 2) for k, v in self.thresholds.items()},
+                "hits": self.hits, "misses": self.misses, "extra_speech": self.extra_speech}
+
+
+if __name__ == "__main__":
+    # python kws.py kws_templates rekaman.wav  → skor tiap keyword, untuk menyetel ambang
+    spotter = KeywordSpotter()
+    print(f"{spotter.load_dir(sys.argv[1])} contoh dimuat, ambang: {spotter.stats()['thresholds']}")
+    for path in sys.argv[2:]:
+        pcm, _ = read_wav(path)
+        print(path, spotter.spot(pcm), {k: round(v, 2) for k, v in spotter.scores(pcm).items()})
@@ -1,14 +1,25 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
 import json
+import time
+import contextvars
+import metrics
+import tracing
 import speech_recognition as sr
 from gtts import gTTS
 from pydub import AudioSegment
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from sessions import SessionStore
+from audio_store import CACHE_CONTROL, AudioStore
+from audio import NoSpeech, SpeechStream, audio_data, pcm_view, speech_only
+from kws import KeywordSpotter
+from phrase_cache import PhraseCache
+from templates import SpeechTemplates
 
 load_dotenv()
 app = Flask(__name__)
@@ -24,7 +35,9 @@ mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
 mqtt_client.loop_start()
 
 def send_cmd_to_esp(cmd_json):
-    mqtt_client.publish(MQTT_PUB_TOPIC, json.dumps(cmd_json))
+    cmd_json = tracing.tag(cmd_json)  # Firmware mengembalikan trace id di status "opened"
+    with metrics.timed("mqtt_publish"):
+        mqtt_client.publish(MQTT_PUB_TOPIC, json.dumps(cmd_json))
     print(f"📡 Cmd ke ESP32: {cmd_json}")
 
 # Gemini
@@ -35,18 +48,24 @@ Dialog natural seperti manusia, dengan empati dan profesional.
 Whitelist nama penerima dari database internal.
 Output SELALU JSON dengan keys: 'cmd': 'set_status'/'open_box'/'sleep', 'state'/'name', 'tts_text', 'file': 'response.wav'""")
 
-SLEEP_MODE = False
+# Status sleep per box (dulu satu SLEEP_MODE global untuk semua box)
+sessions = SessionStore(idle_ttl=int(os.getenv('SESSION_IDLE_TTL', 15 * 60)))
 
-def process_voice(text):
-    global SLEEP_MODE
-    if SLEEP_MODE and "hallo" not in text.lower():
-        return {"cmd": "sleep", "tts_text": "Saya sedang istirahat. Katakan 'hallo'."}
+def process_voice(text, device_id):
+    session = sessions.get(device_id)
+    if session.sleeping and "hallo" not in text.lower():
+        return {"cmd": "sleep", "tts_text": SLEEP_TEXT}
     if "hallo" in text.lower():
-        SLEEP_MODE = False
-        return {"cmd": "set_status", "state": "Mendengarkan", "tts_text": "Permisi, ada paket. Dengan siapa saya berbicara?"}
-    response = model.generate_content(text)
-    result = json.loads(response.text.strip())
-    if result.get("action") == "sleep": SLEEP_MODE = True
+        session.sleeping = False
+        return {"cmd": "set_status", "state": "Mendengarkan", "tts_text": WAKE_TEXT}
+    name = next((n for n in RECIPIENTS if n.lower() == text.strip().lower()), None)
+    if name:  # Seluruh ucapan hanya nama terdaftar (STT, atau KWS yang mencakup seluruh ucapan) → tanpa Gemini
+        return {"cmd": "open_box", "name": name, "tts_text": speech_templates.text("open_box", name=name)}
+    with metrics.timed("gemini"):
+        response = model.generate_content(text)
+    with metrics.timed("json_parse"):
+        result = json.loads(response.text.strip())
+    if result.get("action") == "sleep": session.sleeping = True
     return result
 
 # STT
@@ -54,77 +73,248 @@ recognizer = sr.Recognizer()
 recognizer.energy_threshold = 300
 
 # Generate TTS WAV
-def generate_tts_wav(text, filename):
-    tts = gTTS(text, lang='id', slow=False)
-    tts_io = BytesIO()
-    tts.write_to_fp(tts_io)
-    tts_io.seek(0)
-    response_audio = AudioSegment.from_mp3(tts_io)
-    response_audio = response_audio.set_frame_rate(16000).set_channels(1).set_sample_width(2)
-    response_path = os.path.join("static", filename)
-    os.makedirs("static", exist_ok=True)
-    response_audio.export(response_path, format="wav")
+TTS_VOICE = "id"
+TTS_RATE = 16000
+GREETING_TEXT = "Halo, perangkat siap digunakan. Silakan berbicara."
+WAKE_TEXT = "Permisi, ada paket. Dengan siapa saya berbicara?"
+SLEEP_TEXT = "Saya sedang istirahat. Katakan 'hallo'."
+DEFAULT_TEXT = "Respons default"
+# Kalimat tetap yang paling sering diucapkan → dirender sekali saat startup
+FIXED_PHRASES = [GREETING_TEXT, WAKE_TEXT, SLEEP_TEXT, DEFAULT_TEXT,
+                 "Maaf, nama tersebut tidak terdaftar pada paket ini."]
+phrase_cache = PhraseCache(
+    max_bytes=int(os.getenv('TTS_CACHE_MB', 32)) * 1024 * 1024,
+    voice=TTS_VOICE,
+    rate=TTS_RATE,
+    directory=os.getenv('TTS_CACHE_DIR', "tts_cache"),
+)
+
+def synthesize_wav(text):
+    with metrics.timed("tts"):
+        tts = gTTS(text, lang=TTS_VOICE, slow=False)
+        tts_io = BytesIO()
+        tts.write_to_fp(tts_io)
+        tts_io.seek(0)
+    with metrics.timed("resample"):
+        response_audio = AudioSegment.from_mp3(tts_io)
+        response_audio = response_audio.set_frame_rate(TTS_RATE).set_channels(1).set_sample_width(2)
+        wav_io = BytesIO()
+        response_audio.export(wav_io, format="wav")
+    return wav_io.getvalue()
+
+# Tiap audio disimpan dengan nama = hash isinya (bukan response.wav bersama)
+# Folder dibatasi AUDIO_STORE_MB; janitor membuang file yang paling lama tidak diputar
+audio_store = AudioStore(
+    os.getenv('AUDIO_DIR', "static"),
+    max_bytes=int(os.getenv('AUDIO_STORE_MB', 64)) * 1024 * 1024,
+    grace=float(os.getenv('AUDIO_GRACE_S', 120)),
+    legacy=("response.wav", "welcome.wav"),  # Nama file tetap versi lama, tidak disajikan lagi
+)
+audio_store.start_janitor(float(os.getenv('AUDIO_JANITOR_S', 30)))
+
+def generate_tts_wav(text):
+    filename = audio_store.put(phrase_cache.render(text, synthesize_wav))
     print(f"Generated {filename}: {text}")
     return filename
 
+# Jawaban yang hanya beda nama dirakit dari potongan audio yang sudah dirender
+RECIPIENTS = [n.strip() for n in os.getenv('RECIPIENTS', "aisyah,rabiathul,nadia").split(",") if n.strip()]
+speech_templates = SpeechTemplates(
+    phrase_cache,
+    synthesize_wav,
+    {"open_box": "Baik, paket atas nama {name}. Silakan diambil."},
+    crossfade_ms=int(os.getenv('TTS_CROSSFADE_MS', 12)),
+)
+
+def generate_template_wav(template, **values):
+    with metrics.timed("tts"):
+        data = speech_templates.render(template, **values)
+    filename = audio_store.put(data)
+    print(f"Generated {filename}: {speech_templates.text(template, **values)} (template)")
+    return filename
+
+phrase_cache.warm(FIXED_PHRASES, synthesize_wav)
+speech_templates.warm({"name": RECIPIENTS})
+
+# ================= STT =================
+STREAM_CHUNK = 4096
+stt_pool = ThreadPoolExecutor(max_workers=int(os.getenv('STT_WORKERS', 8)), thread_name_prefix="stt")
+
+# Keyword spotter offline: nama penerima, "hallo", "sudah/ya/selesai" dikenali lokal (< 10 ms)
+# dari contoh rekaman di KWS_DIR/<keyword>/*.wav. Hanya dipakai kalau ucapannya HANYA keyword itu;
+# yang tidak yakin atau ada ucapan lain ("bukan aisyah") tetap ke recognize_google
+spotter = KeywordSpotter(
+    threshold=float(os.getenv('KWS_THRESHOLD', 3.0)),
+    max_seconds=float(os.getenv('KWS_MAX_S', 2.5)),
+)
+print(f"[KWS] {spotter.load_dir(os.getenv('KWS_DIR', 'kws_templates'))} contoh keyword dimuat")
+
+def spot_keyword(pcm):
+    with metrics.timed("kws"):
+        hit = spotter.spot(pcm)
+    if hit:
+        tracing.current().event(f"kws:{hit.keyword}")
+    return hit
+
+def recognize(pcm):
+    with metrics.timed("stt"):
+        return recognizer.recognize_google(audio_data(pcm), language='id-ID')
+
+def transcribe(pcm):
+    hit = spot_keyword(pcm)
+    return hit.keyword if hit else recognize(pcm)
+
+def transcribe_segment(pcm):
+    try:
+        return recognize(pcm)
+    except sr.UnknownValueError:
+        return ""  # Segmen tanpa kata (batuk, noise) tidak menggagalkan seluruh ucapan
+
+def new_speech_stream():
+    return SpeechStream(
+        max_seconds=float(os.getenv('STREAM_MAX_S', 15)),
+        threshold=float(os.getenv('VAD_THRESHOLD', 500)),
+        pause_ms=int(os.getenv('VAD_PAUSE_MS', 600)),
+        end_ms=int(os.getenv('VAD_END_MS', 900)),
+    )
+
+def transcribe_stream(stream):
+    """Baca upload chunked per potong; segmen ucapan langsung di-STT paralel selagi upload berjalan."""
+    speech = new_speech_stream()
+    pending = []
+    held = []  # Segmen pertama yang cocok keyword; STT ditunda sampai jelas ucapannya hanya itu
+    def stt(pcm):
+        pending.append(stt_pool.submit(contextvars.copy_context().run, transcribe_segment, pcm))
+    def submit(segments):
+        for pcm in segments:
+            if not pending and not held:
+                hit = spot_keyword(pcm)
+                if hit:
+                    held.append((pcm, hit))
+                    continue
+            if held:
+                stt(held.pop()[0])  # Ada ucapan lain → keyword tadi ikut di-STT bersama sisanya
+            stt(pcm)
+    while not speech.done:
+        chunk = stream.read(STREAM_CHUNK)
+        if not chunk:
+            break
+        submit(speech.feed(chunk))
+    if speech.ended_at is not None:
+        tracing.current().event("end_of_speech")  # Sisa upload tidak dibaca
+    submit(speech.finish())
+    if not speech.segments:
+        raise NoSpeech()
+    if held:
+        return held[0][1].keyword  # Satu-satunya segmen = keyword → tanpa recognize_google
+    text = " ".join(t for t in (f.result() for f in pending) if t)
+    if not text:
+        raise sr.UnknownValueError()
+    print(f"🎙️ Stream: {speech.duration_s():.1f} s dibaca, {len(speech.segments)} segmen")
+    return text
+
 # ================= ROUTES =================
 @app.route('/audio_stream', methods=['POST'])
 def audio_stream():
+    device_id = request.headers.get("X-Device-Id") or request.remote_addr
+    if request.headers.get("Transfer-Encoding", "").lower() == "chunked":
+        # Upload chunked: VAD + STT jalan sambil audio masih dikirim, memori per request terbatas
+        trace = tracing.tracer.start(request.headers.get("X-Trace-Id"), source="audio_stream",
+                                     device=device_id, streaming=True)
+        with tracing.activate(trace):
+            return process_audio(lambda: transcribe_stream(request.stream), device_id)
+    raw_pcm = request.get_data()
+    if not raw_pcm:
+        return jsonify({"error": "No audio"}), 400
+    trace = tracing.tracer.start(request.headers.get("X-Trace-Id"), source="audio_stream",
+                                 device=device_id, audio_bytes=len(raw_pcm))
+    with tracing.activate(trace):
+        # Body dipakai langsung sebagai int16 (tanpa AudioSegment → WAV → AudioFile),
+        # hening awal/akhir dipotong dan rekaman tanpa ucapan tidak dikirim ke STT
+        return process_audio(lambda: transcribe(speech_only(pcm_view(raw_pcm))), device_id)
+
+def process_audio(listen, device_id):
     try:
-        raw_pcm = request.get_data()
-        if not raw_pcm:
-            return jsonify({"error": "No audio"}), 400
-        # Convert raw PCM to WAV
-        audio = AudioSegment(
-            raw_pcm,
-            frame_rate=16000,
-            sample_width=2,
-            channels=1
-        )
-        wav_io = BytesIO()
-        audio.export(wav_io, format="wav")
-        wav_io.seek(0)
-        # STT
-        with sr.AudioFile(wav_io) as source:
-            audio_data = recognizer.record(source)
-            text = recognizer.recognize_google(audio_data, language='id-ID')
-        print(f"👤 STT: {text}")
+        text = listen()
+        print(f"👤 STT ({device_id}) [{tracing.current_id()}]: {text}")
         # Gemini
-        decision = process_voice(text)
-        tts_text = decision.get("tts_text", "Respons default")
+        decision = process_voice(text, device_id)
+        tts_text = decision.get("tts_text", DEFAULT_TEXT)
         # TTS
-        filename = "response.wav"
-        generate_tts_wav(tts_text, filename)
+        if decision.get("cmd") == "open_box" and decision.get("name"):
+            filename = generate_template_wav("open_box", name=decision["name"])
+        else:
+            filename = generate_tts_wav(tts_text)
         # MQTT cmds
         send_cmd_to_esp({"cmd": "set_status", "state": "Berpikir"})
         if decision.get("cmd") == "open_box":
             send_cmd_to_esp({"cmd": "open_box", "name": decision.get("name")})
         send_cmd_to_esp({"cmd": "play_audio", "file": filename})
         send_cmd_to_esp({"cmd": "set_status", "state": "Menjawab"})
-        return jsonify({"status": "processed", "text": text}), 200
+        return jsonify({"status": "processed", "text": text, "trace": tracing.current_id()}), 200
+    except NoSpeech:
+        tracing.current().event("no_speech")
+        print(f"🔇 Tidak ada ucapan dari {device_id}, STT dilewati")
+        return jsonify({"status": "no_speech", "trace": tracing.current_id()}), 200
     except Exception as e:
         print(f"[Error]: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/audio/<filename>')
 def serve_audio(filename):
-    return send_file(os.path.join("static", filename))
+    path = audio_store.path(filename)
+    if path is None:
+        return jsonify({"error": "Audio tidak ditemukan"}), 404
+    response = send_file(path, mimetype="audio/wav")
+    response.headers["Cache-Control"] = CACHE_CONTROL  # Nama = hash isi, file tidak pernah berubah
+    return response
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/traces')
+def traces():
+    return jsonify(tracing.tracer.dump(request.args.get('limit', 100, type=int)))
+
+@app.route('/traces/<trace_id>')
+def trace_detail(trace_id):
+    trace = tracing.tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace tidak ditemukan"}), 404
+    return jsonify(trace.to_dict())
 
 @app.route('/health')
 def health():
-    return jsonify({"status": "OK"})
+    return jsonify({"status": "OK", "sessions": sessions.stats(),
+                    "phrase_cache": phrase_cache.stats(), "audio_store": audio_store.stats(),
+                    "templates": speech_templates.stats(), "kws": spotter.stats(), "tracing": tracing.tracer.stats()})
 
 # ================= MQTT HANDLER =================
 def on_mqtt_message(client, userdata, msg):
-    topic = msg.topic
-    payload = msg.payload.decode().strip()
-    if topic == MQTT_STATUS_TOPIC and payload == "boot_ready":
+    with metrics.timed("mqtt_receive"):
+        handle_mqtt_message(msg)
+
+def handle_mqtt_message(msg):
+    if msg.topic != MQTT_STATUS_TOPIC:
+        return
+    payload = tracing.record_status(msg.payload.decode().strip())
+    if payload == "boot_ready":
         print("🤖 ESP32 Online — kirim suara sambutan")
-        send_cmd_to_esp({"cmd": "set_status", "state": "Menyapa"})  // Fase 3: Update OLED
-        greeting_text = "Halo, perangkat siap digunakan. Silakan berbicara."
-        filename = "welcome.wav"
-        generate_tts_wav(greeting_text, filename)
-        send_cmd_to_esp({"cmd": "play_audio", "file": filename})
+        with tracing.activate(tracing.tracer.start(source="boot_ready")):
+            send_cmd_to_esp({"cmd": "set_status", "state": "Menyapa"})  # Fase 3: Update OLED
+            filename = generate_tts_wav(GREETING_TEXT)
+            send_cmd_to_esp({"cmd": "play_audio", "file": filename})
 
 mqtt_client.on_message = on_mqtt_message
 mqtt_client.subscribe(MQTT_STATUS_TOPIC)
@@ -0,0 +1,378 @@
+# ================= PC SERVER (ASGI/asyncio) =================
+# Versi async dari main.py. HTTP (Quart), MQTT (aiomqtt) dan Gemini (generate_content_async)
+# berjalan di satu event loop; STT (recognize_google) dan gTTS yang blocking dipindah ke
+# thread pool kecil dengan ukuran tetap (STT_WORKERS, TTS_WORKERS), jadi ratusan upload
+# yang sedang menunggu tidak berarti ratusan thread.
+#   pip install quart quart-cors aiomqtt
+#   python main_async.py   atau   uvicorn main_async:app --port 5000
+from quart import Quart, Response, g, request, jsonify, send_file
+from quart_cors import cors
+import google.generativeai as genai
+import os
+from dotenv import load_dotenv
+import aiomqtt
+import asyncio
+import contextvars
+import json
+import time
+import metrics
+import tracing
+import speech_recognition as sr
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from gtts import gTTS
+from pydub import AudioSegment
+from io import BytesIO
+from sessions import SessionStore
+from audio_store import CACHE_CONTROL, AudioStore
+from audio import NoSpeech, SpeechStream, audio_data, pcm_view, speech_only
+from kws import KeywordSpotter
+from phrase_cache import PhraseCache
+from templates import SpeechTemplates
+
+load_dotenv()
+app = cors(Quart(__name__))
+
+# MQTT
+MQTT_BROKER = "broker.hivemq.com"
+MQTT_PORT = 1883
+MQTT_PUB_TOPIC = "package/command"
+MQTT_STATUS_TOPIC = "package/status"
+mqtt_client = None  # aiomqtt.Client yang sedang terhubung
+
+async def send_cmd_to_esp(cmd_json):
+    cmd_json = tracing.tag(cmd_json)  # Firmware mengembalikan trace id di status "opened"
+    if mqtt_client is None:
+        print(f"[MQTT] Belum terhubung, cmd dibuang: {cmd_json}")
+        return
+    with metrics.timed("mqtt_publish"):
+        await mqtt_client.publish(MQTT_PUB_TOPIC, json.dumps(cmd_json))
+    print(f"📡 Cmd ke ESP32: {cmd_json}")
+
+# Batas konkurensi
+GEMINI_CONCURRENCY = int(os.getenv('GEMINI_CONCURRENCY', 64))
+stt_pool = ThreadPoolExecutor(max_workers=int(os.getenv('STT_WORKERS', 8)), thread_name_prefix="stt")
+tts_pool = ThreadPoolExecutor(max_workers=int(os.getenv('TTS_WORKERS', 4)), thread_name_prefix="tts")
+gemini_slots = None  # asyncio.Semaphore, dibuat saat startup
+in_flight = {"audio": 0, "gemini": 0}
+_tasks = set()
+
+async def offload(pool, fn, *args):
+    """Jalankan fn (blocking) di pool; trace aktif ikut ke thread worker."""
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(pool, ctx.run, fn, *args)
+
+# Gemini
+genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+MODEL_NAME = "gemini-1.5-flash"
+model = genai.GenerativeModel(MODEL_NAME, system_instruction="""Anda adalah kurir pintar berbasis AI.
+Dialog natural seperti manusia, dengan empati dan profesional.
+Whitelist nama penerima dari database internal.
+Output SELALU JSON dengan keys: 'cmd': 'set_status'/'open_box'/'sleep', 'state'/'name', 'tts_text', 'file': 'response.wav'""")
+
+# Status sleep per box (dulu satu SLEEP_MODE global untuk semua box)
+sessions = SessionStore(idle_ttl=int(os.getenv('SESSION_IDLE_TTL', 15 * 60)))
+
+async def process_voice(text, device_id):
+    session = sessions.get(device_id)
+    if session.sleeping and "hallo" not in text.lower():
+        return {"cmd": "sleep", "tts_text": SLEEP_TEXT}
+    if "hallo" in text.lower():
+        session.sleeping = False
+        return {"cmd": "set_status", "state": "Mendengarkan", "tts_text": WAKE_TEXT}
+    name = next((n for n in RECIPIENTS if n.lower() == text.strip().lower()), None)
+    if name:  # Seluruh ucapan hanya nama terdaftar (STT, atau KWS yang mencakup seluruh ucapan) → tanpa Gemini
+        return {"cmd": "open_box", "name": name, "tts_text": speech_templates.text("open_box", name=name)}
+    waiting = time.perf_counter()
+    async with gemini_slots:
+        metrics.observe("queue_wait", time.perf_counter() - waiting)
+        in_flight["gemini"] += 1
+        try:
+            with metrics.timed("gemini"):
+                response = await model.generate_content_async(text)
+        finally:
+            in_flight["gemini"] -= 1
+    with metrics.timed("json_parse"):
+        result = json.loads(response.text.strip())
+    if result.get("action") == "sleep": session.sleeping = True
+    return result
+
+# STT
+recognizer = sr.Recognizer()
+recognizer.energy_threshold = 300
+
+# Keyword spotter offline: nama penerima, "hallo", "sudah/ya/selesai" dikenali lokal (< 10 ms)
+# dari contoh rekaman di KWS_DIR/<keyword>/*.wav. Hanya dipakai kalau ucapannya HANYA keyword itu;
+# yang tidak yakin atau ada ucapan lain ("bukan aisyah") tetap ke recognize_google
+spotter = KeywordSpotter(
+    threshold=float(os.getenv('KWS_THRESHOLD', 3.0)),
+    max_seconds=float(os.getenv('KWS_MAX_S', 2.5)),
+)
+print(f"[KWS] {spotter.load_dir(os.getenv('KWS_DIR', 'kws_templates'))} contoh keyword dimuat")
+
+def spot_keyword(pcm):
+    with metrics.timed("kws"):
+        hit = spotter.spot(pcm)
+    if hit:
+        tracing.current().event(f"kws:{hit.keyword}")
+    return hit
+
+def recognize(pcm):
+    with metrics.timed("stt"):
+        return recognizer.recognize_google(audio_data(pcm), language='id-ID')
+
+def transcribe(pcm):
+    hit = spot_keyword(pcm)
+    return hit.keyword if hit else recognize(pcm)
+
+def transcribe_segment(pcm):
+    try:
+        return recognize(pcm)
+    except sr.UnknownValueError:
+        return ""  # Segmen tanpa kata (batuk, noise) tidak menggagalkan seluruh ucapan
+
+def new_speech_stream():
+    return SpeechStream(
+        max_seconds=float(os.getenv('STREAM_MAX_S', 15)),
+        threshold=float(os.getenv('VAD_THRESHOLD', 500)),
+        pause_ms=int(os.getenv('VAD_PAUSE_MS', 600)),
+        end_ms=int(os.getenv('VAD_END_MS', 900)),
+    )
+
+async def transcribe_stream(body):
+    """Baca upload chunked per potong; segmen ucapan langsung di-STT paralel selagi upload berjalan."""
+    speech = new_speech_stream()
+    pending = []
+    held = []  # Segmen pertama yang cocok keyword; STT ditunda sampai jelas ucapannya hanya itu
+    def stt(pcm):
+        pending.append(asyncio.ensure_future(offload(stt_pool, transcribe_segment, pcm)))
+    async def submit(segments):
+        for pcm in segments:
+            if not pending and not held:
+                hit = await offload(stt_pool, spot_keyword, pcm)
+                if hit:
+                    held.append((pcm, hit))
+                    continue
+            if held:
+                stt(held.pop()[0])  # Ada ucapan lain → keyword tadi ikut di-STT bersama sisanya
+            stt(pcm)
+    async for chunk in body:
+        await submit(speech.feed(chunk))
+        if speech.done:
+            break
+    if speech.ended_at is not None:
+        tracing.current().event("end_of_speech")  # Sisa upload tidak dibaca
+    await submit(speech.finish())
+    if not speech.segments:
+        raise NoSpeech()
+    if held:
+        return held[0][1].keyword  # Satu-satunya segmen = keyword → tanpa recognize_google
+    text = " ".join(t for t in await asyncio.gather(*pending) if t)
+    if not text:
+        raise sr.UnknownValueError()
+    print(f"🎙️ Stream: {speech.duration_s():.1f} s dibaca, {len(speech.segments)} segmen")
+    return text
+
+# Generate TTS WAV
+TTS_VOICE = "id"
+TTS_RATE = 16000
+GREETING_TEXT = "Halo, perangkat siap digunakan. Silakan berbicara."
+WAKE_TEXT = "Permisi, ada paket. Dengan siapa saya berbicara?"
+SLEEP_TEXT = "Saya sedang istirahat. Katakan 'hallo'."
+DEFAULT_TEXT = "Respons default"
+# Kalimat tetap yang paling sering diucapkan → dirender sekali saat startup
+FIXED_PHRASES = [GREETING_TEXT, WAKE_TEXT, SLEEP_TEXT, DEFAULT_TEXT,
+                 "Maaf, nama tersebut tidak terdaftar pada paket ini."]
+phrase_cache = PhraseCache(
+    max_bytes=int(os.getenv('TTS_CACHE_MB', 32)) * 1024 * 1024,
+    voice=TTS_VOICE,
+    rate=TTS_RATE,
+    directory=os.getenv('TTS_CACHE_DIR', "tts_cache"),
+)
+
+def synthesize_wav(text):
+    with metrics.timed("tts"):
+        tts = gTTS(text, lang=TTS_VOICE, slow=False)
+        tts_io = BytesIO()
+        tts.write_to_fp(tts_io)
+        tts_io.seek(0)
+    with metrics.timed("resample"):
+        response_audio = AudioSegment.from_mp3(tts_io)
+        response_audio = response_audio.set_frame_rate(TTS_RATE).set_channels(1).set_sample_width(2)
+        wav_io = BytesIO()
+        response_audio.export(wav_io, format="wav")
+    return wav_io.getvalue()
+
+# Tiap audio disimpan dengan nama = hash isinya (bukan response.wav bersama)
+# Folder dibatasi AUDIO_STORE_MB; janitor membuang file yang paling lama tidak diputar
+audio_store = AudioStore(
+    os.getenv('AUDIO_DIR', "static"),
+    max_bytes=int(os.getenv('AUDIO_STORE_MB', 64)) * 1024 * 1024,
+    grace=float(os.getenv('AUDIO_GRACE_S', 120)),
+    legacy=("response.wav", "welcome.wav"),  # Nama file tetap versi lama, tidak disajikan lagi
+)
+audio_store.start_janitor(float(os.getenv('AUDIO_JANITOR_S', 30)))
+
+def generate_tts_wav(text):
+    filename = audio_store.put(phrase_cache.render(text, synthesize_wav))
+    print(f"Generated {filename}: {text}")
+    return filename
+
+# Jawaban yang hanya beda nama dirakit dari potongan audio yang sudah dirender
+RECIPIENTS = [n.strip() for n in os.getenv('RECIPIENTS', "aisyah,rabiathul,nadia").split(",") if n.strip()]
+speech_templates = SpeechTemplates(
+    phrase_cache,
+    synthesize_wav,
+    {"open_box": "Baik, paket atas nama {name}. Silakan diambil."},
+    crossfade_ms=int(os.getenv('TTS_CROSSFADE_MS', 12)),
+)
+
+def generate_template_wav(template, **values):
+    with metrics.timed("tts"):
+        data = speech_templates.render(template, **values)
+    filename = audio_store.put(data)
+    print(f"Generated {filename}: {speech_templates.text(template, **values)} (template)")
+    return filename
+
+phrase_cache.warm(FIXED_PHRASES, synthesize_wav)
+speech_templates.warm({"name": RECIPIENTS})
+
+# ================= ROUTES =================
+@app.route('/audio_stream', methods=['POST'])
+async def audio_stream():
+    device_id = request.headers.get("X-Device-Id") or request.remote_addr
+    in_flight["audio"] += 1
+    try:
+        if request.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            # Upload chunked: VAD + STT jalan sambil audio masih dikirim, memori per request terbatas
+            trace = tracing.tracer.start(request.headers.get("X-Trace-Id"), source="audio_stream",
+                                         device=device_id, streaming=True)
+            with tracing.activate(trace):
+                return await process_audio(lambda: transcribe_stream(request.body), device_id)
+        raw_pcm = await request.get_data()
+        if not raw_pcm:
+            return jsonify({"error": "No audio"}), 400
+        trace = tracing.tracer.start(request.headers.get("X-Trace-Id"), source="audio_stream",
+                                     device=device_id, audio_bytes=len(raw_pcm))
+        with tracing.activate(trace):
+            # Body dipakai langsung sebagai int16 (tanpa AudioSegment → WAV → AudioFile),
+            # hening awal/akhir dipotong dan rekaman tanpa ucapan tidak dikirim ke STT
+            return await process_audio(lambda: offload(stt_pool, transcribe, speech_only(pcm_view(raw_pcm))), device_id)
+    finally:
+        in_flight["audio"] -= 1
+
+async def process_audio(listen, device_id):
+    try:
+        text = await listen()
+        print(f"👤 STT ({device_id}) [{tracing.current_id()}]: {text}")
+        # Gemini
+        decision = await process_voice(text, device_id)
+        tts_text = decision.get("tts_text", DEFAULT_TEXT)
+        # TTS
+        if decision.get("cmd") == "open_box" and decision.get("name"):
+            filename = await offload(tts_pool, partial(generate_template_wav, "open_box", name=decision["name"]))
+        else:
+            filename = await offload(tts_pool, generate_tts_wav, tts_text)
+        # MQTT cmds
+        await send_cmd_to_esp({"cmd": "set_status", "state": "Berpikir"})
+        if decision.get("cmd") == "open_box":
+            await send_cmd_to_esp({"cmd": "open_box", "name": decision.get("name")})
+        await send_cmd_to_esp({"cmd": "play_audio", "file": filename})
+        await send_cmd_to_esp({"cmd": "set_status", "state": "Menjawab"})
+        return jsonify({"status": "processed", "text": text, "trace": tracing.current_id()}), 200
+    except NoSpeech:
+        tracing.current().event("no_speech")
+        print(f"🔇 Tidak ada ucapan dari {device_id}, STT dilewati")
+        return jsonify({"status": "no_speech", "trace": tracing.current_id()}), 200
+    except Exception as e:
+        print(f"[Error]: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/audio/<filename>')
+async def serve_audio(filename):
+    path = audio_store.path(filename)
+    if path is None:
+        return jsonify({"error": "Audio tidak ditemukan"}), 404
+    response = await send_file(path, mimetype="audio/wav")
+    response.headers["Cache-Control"] = CACHE_CONTROL  # Nama = hash isi, file tidak pernah berubah
+    return response
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+async def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/traces')
+async def traces():
+    return jsonify(tracing.tracer.dump(request.args.get('limit', 100, type=int)))
+
+@app.route('/traces/<trace_id>')
+async def trace_detail(trace_id):
+    trace = tracing.tracer.get(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace tidak ditemukan"}), 404
+    return jsonify(trace.to_dict())
+
+@app.route('/health')
+async def health():
+    return jsonify({"status": "OK", "mode": "asgi", "in_flight": dict(in_flight),
+                    "mqtt_connected": mqtt_client is not None,
+                    "sessions": sessions.stats(),
+                    "phrase_cache": phrase_cache.stats(), "audio_store": audio_store.stats(),
+                    "templates": speech_templates.stats(), "kws": spotter.stats(), "tracing": tracing.tracer.stats()})
+
+# ================= MQTT HANDLER =================
+async def handle_mqtt_message(message):
+    payload = tracing.record_status(message.payload.decode().strip())
+    if payload == "boot_ready":
+        print("🤖 ESP32 Online — kirim suara sambutan")
+        # Jangan tahan loop pesan MQTT selama TTS berjalan
+        task = asyncio.create_task(greet())
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+async def greet():
+    with tracing.activate(tracing.tracer.start(source="boot_ready")):
+        await send_cmd_to_esp({"cmd": "set_status", "state": "Menyapa"})  # Fase 3: Update OLED
+        filename = await offload(tts_pool, generate_tts_wav, GREETING_TEXT)
+        await send_cmd_to_esp({"cmd": "play_audio", "file": filename})
+
+async def mqtt_loop():
+    global mqtt_client
+    while True:
+        try:
+            async with aiomqtt.Client(MQTT_BROKER, MQTT_PORT, keepalive=60) as client:
+                await client.subscribe(MQTT_STATUS_TOPIC)
+                mqtt_client = client
+                async for message in client.messages:
+                    with metrics.timed("mqtt_receive"):
+                        await handle_mqtt_message(message)
+        except aiomqtt.MqttError as e:
+            mqtt_client = None
+            print(f"[MQTT] Terputus: {e}, coba lagi 5 detik")
+            await asyncio.sleep(5)
+
+@app.before_serving
+async def startup():
+    global gemini_slots
+    gemini_slots = asyncio.Semaphore(GEMINI_CONCURRENCY)
+    app.mqtt_task = asyncio.get_running_loop().create_task(mqtt_loop())
+
+@app.after_serving
+async def shutdown():
+    app.mqtt_task.cancel()
+    stt_pool.shutdown(wait=False)
+    tts_pool.shutdown(wait=False)
+
+if __name__ == '__main__':
+    print("🚀 PC Server Aktif! (ASGI/asyncio: HTTP + MQTT)")
+    app.run(host='0.0.0.0', port=5000)
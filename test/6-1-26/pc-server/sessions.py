@@ -0,0 +1,81 @@
+# ================= SESSION STORE (per box) =================
+# Dulu status percakapan disimpan di satu flag global SLEEP_MODE, jadi kalau satu box
+# masuk mode tidur semua box ikut diam. Sekarang tiap device punya record sendiri.
+# Record pakai __slots__ supaya ribuan box tetap hemat memori.
+import sys
+import threading
+import time
+
+
+class Session:
+    __slots__ = ("device_id", "sleeping", "turns", "created", "last_seen")
+
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.sleeping = False
+        self.turns = 0
+        self.created = self.last_seen = time.monotonic()
+
+    def touch(self):
+        self.turns += 1
+        self.last_seen = time.monotonic()
+
+    def to_dict(self):
+        return {
+            "device_id": self.device_id,
+            "sleeping": self.sleeping,
+            "turns": self.turns,
+            "idle_s": round(time.monotonic() - self.last_seen, 1),
+        }
+
+
+class SessionStore:
+    def __init__(self, idle_ttl=15 * 60, sweep_every=256):
+        self.idle_ttl = idle_ttl
+        self.sweep_every = sweep_every
+        self.evictions = 0
+        self._sessions = {}
+        self._sweep_lock = threading.Lock()
+        self._gets = 0
+
+    def get(self, device_id):
+        # dict.get / setdefault atomik di CPython → jalur baca tidak perlu lock
+        session = self._sessions.get(device_id)
+        if session is None:
+            session = self._sessions.setdefault(device_id, Session(device_id))
+        session.touch()
+        self._gets += 1
+        if self._gets % self.sweep_every == 0:
+            self.sweep()
+        return session
+
+    def peek(self, device_id):
+        return self._sessions.get(device_id)
+
+    def sweep(self):
+        """Buang sesi yang idle lebih lama dari idle_ttl."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return 0  # Sweep lain sedang jalan
+        try:
+            cutoff = time.monotonic() - self.idle_ttl
+            stale = [k for k, s in list(self._sessions.items()) if s.last_seen < cutoff]
+            for key in stale:
+                self._sessions.pop(key, None)
+            self.evictions += len(stale)
+            return len(stale)
+        finally:
+            self._sweep_lock.release()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        sessions = list(self._sessions.values())
+        per_session = sys.getsizeof(sessions[0]) if sessions else 0
+        return {
+            "sessions": len(sessions),
+            "sleeping": sum(1 for s in sessions if s.sleeping),
+            "evictions": self.evictions,
+            "idle_ttl_s": self.idle_ttl,
+            "approx_bytes": sys.getsizeof(self._sessions) + per_session * len(sessions),
+        }
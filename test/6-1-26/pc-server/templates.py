@@ -0,0 +1,127 @@
+# ================= SPEECH TEMPLATES (rakit audio dari potongan) =================
+# "Baik, paket atas nama {name}. Silakan diambil." hanya beda di nama, tapi dulu tiap
+# jawaban disintesis utuh lewat gTTS (round trip jaringan). Di sini template dipecah jadi
+# potongan tetap + slot; tiap potongan dan tiap nama dirender SEKALI lewat PhraseCache,
+# disimpan sebagai array int16 (np.frombuffer = view di atas bytes WAV, tanpa salinan),
+# lalu jawaban dirakit dengan satu alokasi output + crossfade pendek di tiap sambungan.
+import string
+import threading
+import wave
+from io import BytesIO
+
+import numpy as np
+
+
+def wav_to_pcm(data):
+    with wave.open(BytesIO(data), "rb") as wf:
+        frames = wf.readframes(wf.getnframes())
+        rate = wf.getframerate()
+    return np.frombuffer(frames, dtype=np.int16), rate
+
+
+def pcm_to_wav(pcm, rate):
+    wav_io = BytesIO()
+    with wave.open(wav_io, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+    return wav_io.getvalue()
+
+
+def trim_silence(pcm, threshold=300):
+    """Potong hening di awal/akhir potongan (gTTS menambah jeda), supaya sambungan rapat."""
+    loud = np.flatnonzero(np.abs(pcm) > threshold)
+    if loud.size == 0:
+        return pcm[:0]
+    return pcm[loud[0]:loud[-1] + 1]  # Slice = view, bukan salinan
+
+
+def crossfade_concat(segments, overlap):
+    """Gabungkan potongan int16; `overlap` sampel terakhir/pertama di tiap sambungan di-crossfade."""
+    segments = [s for s in segments if s.size]
+    if not segments:
+        return np.zeros(0, dtype=np.int16)
+    out = np.empty(sum(s.size for s in segments), dtype=np.int16)
+    pos = 0
+    for seg in segments:
+        n = min(overlap, pos, seg.size)
+        if n:
+            fade = np.linspace(0.0, 1.0, n, dtype=np.float32)
+            tail = out[pos - n:pos].astype(np.float32)
+            out[pos - n:pos] = (tail * (1.0 - fade) + seg[:n] * fade).astype(np.int16)
+        out[pos:pos + seg.size - n] = seg[n:]
+        pos += seg.size - n
+    return out[:pos]
+
+
+class SpeechTemplates:
+    def __init__(self, cache, synthesize, templates, crossfade_ms=12):
+        self.cache = cache
+        self.synthesize = synthesize
+        self.crossfade_ms = crossfade_ms
+        self.rate = cache.rate
+        self.sources = dict(templates)
+        self.templates = {name: self._parse(text) for name, text in templates.items()}
+        self.rendered = 0
+        self._pcm = {}  # teks potongan -> array int16 (sudah di-trim)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse(template):
+        """Template → [("text", "Baik, paket atas nama"), ("field", "name"), ("text", "Silakan diambil.")]"""
+        parts = []
+        for literal, field, _, _ in string.Formatter().parse(template):
+            literal = literal.strip().lstrip(",.").strip()
+            if literal:
+                parts.append(("text", literal))
+            if field:
+                parts.append(("field", field))
+        return parts
+
+    @staticmethod
+    def _value(value):
+        return " ".join(str(value).split()).title()
+
+    def segment(self, text, pin=False):
+        pcm = self._pcm.get(text)
+        if pcm is None:
+            pcm, rate = wav_to_pcm(self.cache.render(text, self.synthesize, pin=pin))
+            if rate != self.rate:
+                raise ValueError(f"Sample rate potongan {rate} != {self.rate}")
+            pcm = trim_silence(pcm)
+            with self._lock:
+                self._pcm[text] = pcm
+        return pcm
+
+    def text(self, template, **values):
+        return self.sources[template].format(**{k: self._value(v) for k, v in values.items()})
+
+    def render(self, template, **values):
+        """Audio WAV (bytes) untuk template terisi; hanya potongan baru yang disintesis."""
+        segments = [self.segment(self._value(values[v]) if kind == "field" else v)
+                    for kind, v in self.templates[template]]
+        pcm = crossfade_concat(segments, self.rate * self.crossfade_ms // 1000)
+        self.rendered += 1
+        return pcm_to_wav(pcm, self.rate)
+
+    def warm(self, fields):
+        """Render semua potongan tetap + nilai slot yang sudah diketahui (mis. nama penerima) di background."""
+        texts = [v for parts in self.templates.values() for kind, v in parts if kind == "text"]
+        for values in fields.values():
+            texts += [self._value(v) for v in values]
+
+        def run():
+            for text in dict.fromkeys(texts):
+                try:
+                    self.segment(text, pin=True)
+                except Exception as e:
+                    print(f"[Templates] Gagal render potongan '{text}': {e}")
+            print(f"[Templates] {len(self._pcm)} potongan siap")
+        thread = threading.Thread(target=run, name="template-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {"templates": len(self.templates), "segments": len(self._pcm), "rendered": self.rendered,
+                "segment_bytes": sum(p.nbytes for p in list(self._pcm.values()))}
@@ -0,0 +1,5 @@
+# Modul pc-server ada langsung di folder ini (bukan package), jadi folder itu dimasukkan ke sys.path
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
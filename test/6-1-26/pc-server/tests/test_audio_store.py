@@ -0,0 +1,101 @@
+import os
+import threading
+
+from audio_store import AudioStore
+
+
+def files(store):
+    return sorted(os.listdir(store.directory))
+
+
+def test_name_is_content_hash(tmp_path):
+    store = AudioStore(str(tmp_path))
+    name = store.put(b"halo")
+    assert name == store.name(b"halo")
+    assert len(name) == len("0" * 32 + ".wav")
+    assert store.put(b"dunia") != name
+    with open(os.path.join(store.directory, name), "rb") as f:
+        assert f.read() == b"halo"
+
+
+def test_identical_content_reuses_file(tmp_path):
+    store = AudioStore(str(tmp_path))
+    assert store.put(b"frasa tetap") == store.put(b"frasa tetap")
+    assert files(store) == [store.name(b"frasa tetap")]
+    assert store.stats()["writes"] == 1
+
+
+def test_concurrent_puts_leave_no_temp_files(tmp_path):
+    store = AudioStore(str(tmp_path))
+    payloads = [bytes([i]) * 1000 for i in range(8)] * 4
+    threads = [threading.Thread(target=store.put, args=(p,)) for p in payloads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert files(store) == sorted(store.name(p) for p in set(payloads))
+    assert store.stats()["entries"] == 8
+    assert store.stats()["bytes"] == 8 * 1000
+
+
+def test_path_lookup(tmp_path):
+    store = AudioStore(str(tmp_path))
+    name = store.put(b"halo")
+    assert store.path(name) == os.path.join(store.directory, name)
+    assert store.path("0" * 32 + ".wav") is None
+    assert store.path("../rahasia.wav") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_scan_indexes_existing_files_and_drops_temp_files(tmp_path):
+    store = AudioStore(str(tmp_path))
+    name = store.put(b"halo")
+    (tmp_path / "abc.tmp").write_bytes(b"setengah")
+    (tmp_path / "catatan.txt").write_bytes(b"lain")
+    reopened = AudioStore(str(tmp_path))
+    assert reopened.path(name) is not None
+    assert files(reopened) == sorted([name, "catatan.txt"])
+    assert reopened.stats()["bytes"] == len(b"halo")
+
+
+def age(store, name, seconds):
+    store._index[name][1] -= seconds
+
+
+def test_sweep_evicts_least_recently_used_first(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=2500, grace=60)
+    a, b, c = (store.put(bytes([i]) * 1000) for i in range(3))
+    for name in (a, b, c):
+        age(store, name, 300)
+    store.path(a)  # a baru diakses → b jadi yang paling lama
+    age(store, a, 300)
+    assert store.sweep() == 1
+    assert files(store) == sorted([a, c])
+    stats = store.stats()
+    assert (stats["evictions"], stats["bytes"], stats["entries"]) == (1, 2000, 2)
+    assert store.path(b) is None
+
+
+def test_sweep_respects_grace_period(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=1000, grace=60)
+    names = [store.put(bytes([i]) * 1000) for i in range(3)]
+    assert store.sweep() == 0  # Semua baru ditulis → ESP32 mungkin masih mengunduh
+    age(store, names[0], 300)
+    assert store.sweep() == 1
+    assert files(store) == sorted(names[1:])
+
+
+def test_sweep_under_limit_keeps_everything(tmp_path):
+    store = AudioStore(str(tmp_path), max_bytes=10_000, grace=0)
+    names = [store.put(bytes([i]) * 1000) for i in range(3)]
+    assert store.sweep() == 0
+    assert files(store) == sorted(names)
+
+
+def test_legacy_files_are_removed_on_scan(tmp_path):
+    (tmp_path / "response.wav").write_bytes(b"lama")
+    (tmp_path / "welcome.wav").write_bytes(b"lama")
+    store = AudioStore(str(tmp_path), legacy=("response.wav", "welcome.wav"))
+    assert files(store) == []
+    assert store.stats()["evictions"] == 2
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from kws import KeywordSpotter
+
+RATE = 16000
+# "Kata" sintetis: sapuan tiga formant (Hz awal → akhir) supaya tiap keyword punya bentuk MFCC sendiri
+WORDS = {
+    "hallo": [(300, 500), (900, 1200), (2400, 2200)],
+    "aisyah": [(700, 300), (1800, 2500), (3000, 2800)],
+    "sudah": [(500, 500), (1500, 900), (2600, 2600)],
+}
+BUKAN = [(200, 250), (1100, 1000), (2000, 2100)]
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def word(rng, formants, dur, stretch=1.0, gain=1.0):
+    n = int(dur * stretch * RATE)
+    sig = np.zeros(n)
+    for k, (f0, f1) in enumerate(formants):
+        sig += np.sin(2 * np.pi * np.cumsum(np.linspace(f0, f1, n)) / RATE) / (k + 1)
+    return (sig * np.hanning(n) * 6000 * gain + rng.normal(0, 150, n)).astype(np.int16)
+
+
+def noise(rng, seconds):
+    return rng.normal(0, 150, int(seconds * RATE)).astype(np.int16)
+
+
+@pytest.fixture
+def spotter(rng):
+    spotter = KeywordSpotter()
+    for keyword, formants in WORDS.items():
+        for stretch in (0.85, 1.0, 1.15):
+            spotter.enroll(keyword, np.concatenate([
+                noise(rng, 0.3), word(rng, formants, 0.6, stretch, rng.uniform(0.6, 1.4)), noise(rng, 0.3)]))
+    return spotter
+
+
+@pytest.mark.parametrize("keyword", sorted(WORDS))
+def test_single_keyword_is_spotted(spotter, rng, keyword):
+    pcm = np.concatenate([noise(rng, 0.4), word(rng, WORDS[keyword], 0.6, 1.05, 0.8), noise(rng, 0.4)])
+    hit = spotter.spot(pcm)
+    assert hit is not None and hit.keyword == keyword
+
+
+@pytest.mark.parametrize("parts", [
+    ["bukan", "aisyah"],
+    ["aisyah", "bukan"],
+    ["bukan", "bukan", "aisyah"],
+])
+def test_keyword_inside_longer_utterance_is_not_a_hit(spotter, rng, parts):
+    # "bukan aisyah" tidak boleh jadi hit "aisyah" → server harus lewat STT
+    segments = [noise(rng, 0.2)]
+    for part in parts:
+        segments += [word(rng, WORDS["aisyah"] if part == "aisyah" else BUKAN, 0.5), noise(rng, 0.1)]
+    assert spotter.spot(np.concatenate(segments)) is None
+    assert spotter.stats()["hits"] == 0
+
+
+def test_silence_and_unknown_words_are_not_hits(spotter, rng):
+    assert spotter.spot(noise(rng, 1.0)) is None
+    assert spotter.spot(np.concatenate([noise(rng, 0.3), word(rng, BUKAN, 0.6), noise(rng, 0.3)])) is None
+
+
+def test_long_audio_goes_to_stt(spotter, rng):
+    long_pcm = np.concatenate([word(rng, WORDS["hallo"], 0.6), noise(rng, 2.5)])
+    assert spotter.spot(long_pcm) is None
+
+
+def test_empty_spotter_never_hits(rng):
+    assert not KeywordSpotter()
+    assert KeywordSpotter().spot(word(rng, WORDS["hallo"], 0.6)) is None
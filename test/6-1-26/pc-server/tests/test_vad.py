@@ -0,0 +1,37 @@
+import numpy as np
+
+from vad import speech_bounds, trim
+
+RATE = 16000
+
+
+def tone(seconds, freq=440.0, amp=6000):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (np.sin(2 * np.pi * freq * t) * amp).astype(np.int16)
+
+
+def noise(rng, seconds, amp=150):
+    return rng.normal(0, amp, int(seconds * RATE)).astype(np.int16)
+
+
+def test_silence_has_no_speech():
+    rng = np.random.default_rng(0)
+    assert trim(noise(rng, 1.0)) is None
+    assert trim(np.zeros(RATE, dtype=np.int16)) is None
+
+
+def test_trim_cuts_leading_and_trailing_noise_without_copying():
+    rng = np.random.default_rng(0)
+    pcm = np.concatenate([noise(rng, 0.5), tone(0.4), noise(rng, 0.5)])
+    start, end = speech_bounds(pcm, pad_ms=0)
+    # Batas frame 30 ms: toleransi satu frame di tiap sisi
+    assert abs(start - int(0.5 * RATE)) <= 480
+    assert abs(end - int(0.9 * RATE)) <= 480
+    speech = trim(pcm)
+    assert speech.base is pcm or np.shares_memory(speech, pcm)
+
+
+def test_clicks_shorter_than_min_speech_are_ignored():
+    rng = np.random.default_rng(0)
+    pcm = np.concatenate([noise(rng, 0.5), tone(0.06), noise(rng, 0.5)])
+    assert trim(pcm) is None
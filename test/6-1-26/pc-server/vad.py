@@ -0,0 +1,63 @@
+# ================= VAD (energi + zero-crossing, NumPy) =================
+# Rekaman dari box sering kebanyakan isinya noise ruangan; dulu semuanya dikirim ke
+# recognize_google, termasuk rekaman yang sama sekali tanpa suara. Di sini PCM int16 dipotong
+# per frame 30 ms dan dihitung sekaligus (tanpa loop Python): energi RMS dan zero-crossing
+# rate. Frame dianggap ucapan kalau energinya di atas ambang, atau agak di atas ambang dengan
+# ZCR tinggi (konsonan desis seperti "s", "sy" yang energinya kecil). Ambang mengikuti noise
+# floor rekaman itu sendiri, pengganti adjust_for_ambient_noise.
+import numpy as np
+
+FRAME_MS = 30
+
+
+def frame_features(pcm, frame):
+    """(rms, zcr) per frame utuh; sisa sampel di ujung yang tidak genap satu frame diabaikan."""
+    count = pcm.size // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    frames = pcm[:count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / np.float32(frame - 1)
+    return rms, zcr
+
+
+def speech_frames(rms, zcr, threshold, noise=0.0, zcr_threshold=0.25):
+    """Mask boolean frame ucapan. Jalur ZCR tetap harus jelas di atas noise floor, supaya
+    desis kipas/AC (ZCR-nya juga tinggi) tidak dianggap ucapan."""
+    quiet = max(threshold * 0.5, noise * 2.0)
+    return (rms > threshold) | ((rms > quiet) & (zcr > zcr_threshold))
+
+
+def noise_and_threshold(rms, floor_threshold=300.0, factor=3.0):
+    """(noise floor, ambang). Noise floor = persentil 10 energi frame, ambang = factor x noise.
+    Kalau energi hampir rata (noise saja), ambang diturunkan ke dekat persentil 90."""
+    if rms.size == 0:
+        return 0.0, floor_threshold
+    low, high = (float(v) for v in np.percentile(rms, [10, 90]))
+    threshold = low * factor
+    if threshold > high:
+        threshold = max(high * 0.5, low * 1.5)
+    return low, max(floor_threshold, threshold)
+
+
+def speech_bounds(pcm, rate=16000, threshold=None, min_speech_ms=150, pad_ms=150):
+    """(awal, akhir) sampel bagian yang berisi ucapan (+ padding), atau None kalau tidak ada ucapan."""
+    frame = rate * FRAME_MS // 1000
+    rms, zcr = frame_features(pcm, frame)
+    noise, adaptive = noise_and_threshold(rms)
+    voiced = np.flatnonzero(speech_frames(rms, zcr, threshold or adaptive, noise))
+    if voiced.size * FRAME_MS < min_speech_ms:
+        return None
+    pad = rate * pad_ms // 1000
+    start = max(0, int(voiced[0]) * frame - pad)
+    end = min(pcm.size, (int(voiced[-1]) + 1) * frame + pad)
+    return start, end
+
+
+def trim(pcm, rate=16000, **kwargs):
+    """View `pcm` tanpa hening di awal/akhir (tanpa salinan), atau None kalau tidak ada ucapan."""
+    bounds = speech_bounds(pcm, rate, **kwargs)
+    if bounds is None:
+        return None
+    return pcm[bounds[0]:bounds[1]]
@@ -1,25 +1,36 @@
 import os
 import json
 import base64
+import io
 import wave
 import soundfile as sf
 from scipy import signal
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.genai import types
 import paho.mqtt.client as mqtt_client
 import threading
 import random
 import numpy as np
 from copy import deepcopy
 import time
+from model_router import ModelRouter
+from circuit import CircuitBreaker
+from phrase_cache import PhraseCache
+from audio_store import CACHE_CONTROL, AudioStore
+import metrics
 
 # Load environment variables
 load_dotenv()
+if os.getenv('GEMINI_FAKE') == '1':
+    import fake_genai as genai  # Offline benchmarking, see fake_genai.py
+    types = genai.types
+else:
+    import google.generativeai as genai
+    from google.genai import types
+
 app = Flask(__name__)
 CORS(app)
 
@@ -29,38 +40,45 @@ def initialize_gemini():
     try:
         genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
        
-        model_names = [
-            'gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro',
-            'models/gemini-2.5-flash', 'models/gemini-1.5-flash', 'models/gemini-1.5-pro'
-        ]
+        # Preference order; GEMINI_MODELS=name1,name2 pins the list explicitly
+        configured = [n.strip() for n in os.getenv('GEMINI_MODELS', '').split(',') if n.strip()]
+        model_names = configured or ['gemini-2.5-flash', 'gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-pro']
        
-        available_models = []
+        available_models = {}  # short name -> name as listed by the API ("models/..." prefix)
         try:
             for model in genai.list_models():
-                available_models.append(model.name)
+                available_models[model.name.split('/')[-1]] = model.name
                 print(f"[AI] Available model: {model.name}")
         except Exception as e:
             print(f"[AI] Warning: Could not list models: {e}")
        
+        # Register discovered models only, each once; the router picks the fastest healthy one per call.
+        # If listing failed, fall back to explicitly configured names rather than guessing.
+        router = ModelRouter(
+            hedge=os.getenv('GEMINI_HEDGE', 'true').lower() == 'true',
+            hedge_percentile=float(os.getenv('GEMINI_HEDGE_PERCENTILE', 0.95)),
+        )
+        registered = set()  # short names, so "x" and "models/x" count once
         for model_name in model_names:
-            try:
-                if available_models and model_name not in available_models:
-                    full_model_name = f"models/{model_name}" if not model_name.startswith('models/') else model_name
-                    if full_model_name not in available_models:
-                        continue
-                    model_name = full_model_name
-               
-                test_model = genai.GenerativeModel(model_name)
-                test_response = test_model.generate_content("Hello")
-                print(f"[AI] Successfully initialized Gemini AI with model: {model_name}")
-                return test_model, model_name
-               
-            except Exception as model_error:
-                print(f"[AI] Failed to initialize model {model_name}: {model_error}")
+            short_name = model_name.split('/')[-1]
+            if available_models:
+                model_name = available_models.get(short_name)
+            elif not configured:
                 continue
+            if model_name and short_name not in registered:
+                registered.add(short_name)
+                router.add(model_name, genai.GenerativeModel(model_name))
+        if not router.names:
+            print("[AI] No Gemini model to register (set GEMINI_MODELS if listing is unavailable)")
+            return None, None
        
-        print("[AI] No working Gemini model found")
-        return None, None
+        try:
+            response = router.generate_content("Hello")
+            print(f"[AI] Successfully initialized Gemini AI router: {router.names} (using {response.model_used})")
+            return router, response.model_used
+        except Exception as model_error:
+            print(f"[AI] No working Gemini model found: {model_error}")
+            return None, None
        
     except Exception as e:
         print(f"[AI] Error configuring Gemini API: {e}")
@@ -69,11 +87,22 @@ def initialize_gemini():
 # Initialize Gemini AI
 model, model_name = initialize_gemini()
 
+# Circuit breaker: when Gemini keeps failing, skip it and answer from the local fallback
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=float(os.getenv('GEMINI_CB_THRESHOLD', 0.5)),
+    cooldown=float(os.getenv('GEMINI_CB_COOLDOWN_S', 30)),
+    call_timeout=float(os.getenv('GEMINI_TIMEOUT_S', 8)),
+)
+
 # Helper function to check model availability
+last_init_attempt = 0.0
+
 def ensure_model_available():
-    """Ensure model is available, reinitialize if necessary."""
-    global model, model_name
-    if model is None:
+    """Ensure model is available, reinitialize if necessary (at most once per cool-down)."""
+    global model, model_name, last_init_attempt
+    if model is None and time.time() - last_init_attempt > gemini_breaker.cooldown:
+        last_init_attempt = time.time()
         print("[AI] Attempting to reinitialize Gemini AI...")
         model, model_name = initialize_gemini()
     return model is not None
@@ -214,6 +243,25 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 client = None
 model_tts_name = None
 
+# Fixed phrases are rendered once and served from the cache afterwards
+TTS_VOICE = "Kore"
+TTS_RATE = 16000
+ACTIVE_TEXT = "Sistem paket pintar ESP32 aktif dan siap digunakan!"
+TTS_PHRASES = [ACTIVE_TEXT]
+tts_cache = PhraseCache(
+    max_bytes=int(os.getenv('TTS_CACHE_MB', 32)) * 1024 * 1024,
+    voice=TTS_VOICE,
+    rate=TTS_RATE,
+    directory=os.getenv('TTS_CACHE_DIR', "tts_cache"),
+)
+# Served audio lives in a size-bounded, content-addressed store instead of the working directory
+audio_store = AudioStore(
+    os.getenv('AUDIO_DIR', "static"),
+    max_bytes=int(os.getenv('AUDIO_STORE_MB', 64)) * 1024 * 1024,
+    grace=float(os.getenv('AUDIO_GRACE_S', 120)),
+)
+audio_store.start_janitor(float(os.getenv('AUDIO_JANITOR_S', 30)))
+
 def initialize_gemini_tts():
     global client, model_tts_name
     try:
@@ -272,27 +320,27 @@ def initialize_gemini_tts():
     except Exception as e:
         print(f"[TTS] Error: {e}")
 
-def save_wav(filename, pcm_data, rate=24000, channels=1, sample_width=2, target_rate=None):
-    """Save raw PCM bytes to WAV file; resample if target_rate specified."""
-    with wave.open(filename, "wb") as wf:
+def pcm_to_wav(pcm_data, rate=24000, channels=1, sample_width=2, target_rate=None):
+    """Wrap raw PCM bytes in a WAV container; resample if target_rate specified."""
+    wav_io = io.BytesIO()
+    with wave.open(wav_io, "wb") as wf:
         wf.setnchannels(channels)
         wf.setsampwidth(sample_width)
         wf.setframerate(rate)
         wf.writeframes(pcm_data)
-    print(f"🔊 Audio tersimpan: {filename} ({rate}Hz, mono)")
-    
+
     if target_rate and target_rate != rate:
-        audio, sr = sf.read(filename)
-        target_len = int(len(audio) * target_rate / sr)
-        resampled = signal.resample(audio, target_len)
-        sf.write(filename, resampled, target_rate)
-        print(f"🔄 Resampled to {target_rate}Hz: {filename}")
-
-def gemini_text_to_speech(text, output_file="output.wav", voice_name="Kore", target_rate=16000):
-    """Generate TTS audio using Gemini."""
-    if not client:
-        return False
-    
+        with metrics.timed("resample"):
+            wav_io.seek(0)
+            audio, sr = sf.read(wav_io)
+            target_len = int(len(audio) * target_rate / sr)
+            resampled = signal.resample(audio, target_len)
+            wav_io = io.BytesIO()
+            sf.write(wav_io, resampled, target_rate, format="WAV", subtype="PCM_16")
+    return wav_io.getvalue()
+
+def synthesize_speech(text, voice_name=TTS_VOICE, target_rate=TTS_RATE):
+    """Generate TTS audio using Gemini; returns WAV bytes."""
     config = types.GenerateContentConfig(
         response_modalities=["AUDIO"],
         speech_config=types.SpeechConfig(
@@ -305,18 +353,18 @@ def gemini_text_to_speech(text, output_file="output.wav", voice_name="Kore", tar
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            response = client.models.generate_content(
-                model=model_tts_name,
-                contents=text,
-                config=config
-            )
+            with metrics.timed("tts"):
+                response = client.models.generate_content(
+                    model=model_tts_name,
+                    contents=text,
+                    config=config
+                )
             
             if (response.candidates and 
                 response.candidates[0].content.parts and 
                 hasattr(response.candidates[0].content.parts[0].inline_data, 'data')):
                 audio_bytes = response.candidates[0].content.parts[0].inline_data.data
-                save_wav(output_file, audio_bytes, target_rate=target_rate)
-                return True
+                return pcm_to_wav(audio_bytes, target_rate=target_rate)
             else:
                 raise ValueError("No audio in response.")
                 
@@ -325,15 +373,27 @@ def gemini_text_to_speech(text, output_file="output.wav", voice_name="Kore", tar
             if attempt == max_retries - 1:
                 raise
             time.sleep(1)
-    
-    return False
+
+def gemini_text_to_speech(text, voice_name=TTS_VOICE, target_rate=TTS_RATE):
+    """Store TTS audio for text and return its filename, reusing cached renders of the default voice."""
+    if not client:
+        return None
+    if (voice_name, target_rate) == (TTS_VOICE, TTS_RATE):
+        wav_bytes = tts_cache.render(text, synthesize_speech)
+    else:
+        wav_bytes = synthesize_speech(text, voice_name, target_rate)
+    filename = audio_store.put(wav_bytes)
+    print(f"🔊 Audio tersimpan: {filename} ({target_rate}Hz, mono)")
+    return filename
 
 # Initialize TTS
 initialize_gemini_tts()
+if client:
+    tts_cache.warm(TTS_PHRASES, synthesize_speech)
 
 # ================= MQTT CONFIG =================
-MQTT_BROKER = "broker.hivemq.com"
-MQTT_PORT = 1883
+MQTT_BROKER = os.getenv('MQTT_BROKER', "broker.hivemq.com")
+MQTT_PORT = int(os.getenv('MQTT_PORT', 1883))
 MQTT_STATUS_TOPIC = "package/status"
 MQTT_COMMAND_TOPIC = "package/command"
 
@@ -353,16 +413,15 @@ def on_mqtt_message(client, userdata, msg):
     
     if payload == "boot_ready" and topic == MQTT_STATUS_TOPIC:
         print("[MQTT] ESP32 ready! Generating 'system active' audio...")
-        text = "Sistem paket pintar ESP32 aktif dan siap digunakan!"
         try:
-            success = gemini_text_to_speech(text, output_file="active.wav")
-            if success:
-                print("✅ TTS generated: active.wav")
+            filename = gemini_text_to_speech(ACTIVE_TEXT)
+            if filename:
+                print(f"✅ TTS generated: {filename}")
                 client.publish(MQTT_COMMAND_TOPIC, json.dumps({
                     "cmd": "play_audio",
-                    "file": "active.wav"
+                    "file": filename
                 }))
-                print("[MQTT] Command sent: Play active.wav on ESP32")
+                print(f"[MQTT] Command sent: Play {filename} on ESP32")
         except Exception as e:
             print(f"[ERROR] Auto-TTS failed: {e}")
 
@@ -437,6 +496,21 @@ def index():
         'timestamp': datetime.now().isoformat()
     })
 
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if request.path != '/metrics' and 'started' in g:
+        metrics.observe("http_response", time.perf_counter() - g.started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Per-stage latency histograms in Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -447,6 +521,8 @@ def health_check():
         'status': 'healthy' if db_status and ai_status else 'degraded',
         'database': 'connected' if db_status else 'disconnected',
         'ai_service': f'available ({model_name})' if ai_status else 'unavailable',
+        'tts_cache': tts_cache.stats(),
+        'audio_store': audio_store.stats(),
         'timestamp': datetime.now().isoformat()
     })
 
@@ -681,8 +757,6 @@ def chat_assistant():
             return jsonify(create_response('error', 'User ID diperlukan')), 400
         if not message:
             return jsonify(create_response('error', 'Pesan tidak boleh kosong')), 400
-        if not ensure_model_available():
-            return jsonify(create_response('error', 'AI service tidak tersedia saat ini')), 503
         schedules = get_user_schedules(user_id) or []
         schedule_context = format_schedule_for_ai(schedules)
        
@@ -708,46 +782,45 @@ Tugas kamu:
 Pertanyaan pengguna: {message}
 Berikan jawaban yang singkat, jelas, dan membantu. Jika ada jadwal yang relevan, tampilkan dalam format yang mudah dibaca.
 """
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(
+        try:
+            if not ensure_model_available():
+                raise RuntimeError("AI service tidak tersedia saat ini")
+            with metrics.timed("gemini"):
+                response = gemini_breaker.call(
+                    model.generate_content,
                     system_prompt,
                     generation_config=genai.types.GenerationConfig(
                         temperature=0.7,
                         max_output_tokens=1000
                     )
                 )
-                ai_response = response.text
-               
-                try:
-                    save_chat_history(user_id, message, ai_response)
-                except Exception as save_error:
-                    print(f"[WARNING] Failed to save chat history: {save_error}")
-               
-                return jsonify(create_response('success', ai_response, {
-                    'type': 'ai_response',
-                    'current_day': current_day_indo,
-                    'current_time': current_time,
-                    'model_used': model_name,
-                    'schedules': schedules if 'jadwal' in message.lower() or 'schedule' in message.lower() else None
-                })), 200
-               
-            except Exception as gemini_error:
-                print(f"[ERROR] Gemini AI attempt {attempt + 1}: {gemini_error}")
-               
-                if attempt == max_retries - 1:
-                    model, model_name = initialize_gemini()
-                    fallback_response = generate_fallback_response(message, schedules, current_day_indo)
-                   
-                    return jsonify(create_response('success', fallback_response, {
-                        'type': 'fallback',
-                        'current_day': current_day_indo,
-                        'current_time': current_time,
-                        'schedules': schedules if 'jadwal' in message.lower() else None
-                    })), 200
-               
-                time.sleep(1)
+            ai_response = response.text
+           
+            try:
+                save_chat_history(user_id, message, ai_response)
+            except Exception as save_error:
+                print(f"[WARNING] Failed to save chat history: {save_error}")
+           
+            return jsonify(create_response('success', ai_response, {
+                'type': 'ai_response',
+                'current_day': current_day_indo,
+                'current_time': current_time,
+                'model_used': response.model_used,
+                'schedules': schedules if 'jadwal' in message.lower() or 'schedule' in message.lower() else None
+            })), 200
+           
+        except Exception as gemini_error:
+            # No retries/sleep here: the router already fails over between models and the
+            # circuit breaker short-circuits to the fallback while Gemini is unhealthy
+            print(f"[ERROR] Gemini AI: {gemini_error}")
+            fallback_response = generate_fallback_response(message, schedules, current_day_indo)
+           
+            return jsonify(create_response('success', fallback_response, {
+                'type': 'fallback',
+                'current_day': current_day_indo,
+                'current_time': current_time,
+                'schedules': schedules if 'jadwal' in message.lower() else None
+            })), 200
     except Exception as e:
         print(f"[ERROR] Chat endpoint: {e}")
         return jsonify(create_response('error', 'Maaf, terjadi kesalahan sistem')), 500
@@ -818,6 +891,15 @@ def schedule_query():
         print(f"[ERROR] Schedule query: {e}")
         return jsonify(create_response('error', 'Terjadi kesalahan sistem')), 500
 
+@app.route('/api/model-stats', methods=['GET'])
+def model_stats():
+    """Endpoint to inspect per-model latency, error rate and routing decisions."""
+    if not isinstance(model, ModelRouter):
+        return jsonify(create_response('error', 'AI service tidak tersedia saat ini')), 503
+    stats = model.stats()
+    stats['circuit'] = gemini_breaker.stats()
+    return jsonify(create_response('success', 'Model router stats', stats)), 200
+
 @app.route('/api/list-models', methods=['GET'])
 def list_available_models():
     """Endpoint to list available AI models."""
@@ -950,49 +1032,44 @@ Berikan jawaban yang singkat, jelas, dan membantu.
 """
         if not ensure_model_available():
             return jsonify(create_response('error', 'AI service tidak tersedia saat ini')), 503
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(
+        try:
+            with metrics.timed("gemini"):
+                response = gemini_breaker.call(
+                    model.generate_content,
                     system_prompt,
                     generation_config=genai.types.GenerationConfig(
                         temperature=0.7,
                         max_output_tokens=1000
                     )
                 )
-                ai_response = response.text
-               
-                try:
-                    save_chat_history(user_id, "Optimasi jadwal", ai_response)
-                except Exception as save_error:
-                    print(f"[WARNING] Failed to save chat history: {save_error}")
-               
-                return jsonify(create_response('success', ai_response, {
-                    'type': 'optimized_schedule',
-                    'current_day': current_day_indo,
-                    'current_time': current_time,
-                    'model_used': model_name,
-                    'optimized_schedules': optimized_schedules
-                })), 200
-               
-            except Exception as gemini_error:
-                print(f"[ERROR] Gemini AI attempt {attempt + 1}: {gemini_error}")
-               
-                if attempt == max_retries - 1:
-                    model, model_name = initialize_gemini()
-                    fallback_response = f"""
+            ai_response = response.text
+           
+            try:
+                save_chat_history(user_id, "Optimasi jadwal", ai_response)
+            except Exception as save_error:
+                print(f"[WARNING] Failed to save chat history: {save_error}")
+           
+            return jsonify(create_response('success', ai_response, {
+                'type': 'optimized_schedule',
+                'current_day': current_day_indo,
+                'current_time': current_time,
+                'model_used': response.model_used,
+                'optimized_schedules': optimized_schedules
+            })), 200
+           
+        except Exception as gemini_error:
+            print(f"[ERROR] Gemini AI: {gemini_error}")
+            fallback_response = f"""
 Jadwal telah dioptimasi menggunakan algoritma genetika. Berikut adalah jadwal yang dioptimasi:
 {optimized_context}
 Silakan periksa jadwal ini untuk memastikan tidak ada konflik waktu dan beban SKS seimbang.
 """
-                    return jsonify(create_response('success', fallback_response, {
-                        'type': 'fallback_optimized',
-                        'current_day': current_day_indo,
-                        'current_time': current_time,
-                        'optimized_schedules': optimized_schedules
-                    })), 200
-               
-                time.sleep(1)
+            return jsonify(create_response('success', fallback_response, {
+                'type': 'fallback_optimized',
+                'current_day': current_day_indo,
+                'current_time': current_time,
+                'optimized_schedules': optimized_schedules
+            })), 200
     except Exception as e:
         print(f"[ERROR] Optimize schedule: {e}")
         return jsonify(create_response('error', 'Terjadi kesalahan sistem')), 500
@@ -1000,9 +1077,12 @@ Silakan periksa jadwal ini untuk memastikan tidak ada konflik waktu dan beban SK
 # Audio Serve Route
 @app.route('/audio/<filename>')
 def serve_audio(filename):
-    if os.path.exists(filename):
-        return send_file(filename, mimetype='audio/wav')
-    return jsonify(create_response('error', 'File tidak ditemukan')), 404
+    path = audio_store.path(filename)  # Index lookup, no filesystem probe
+    if path is None:
+        return jsonify(create_response('error', 'File tidak ditemukan')), 404
+    response = send_file(path, mimetype='audio/wav')
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
 
 # Error Handlers
 @app.errorhandler(404)
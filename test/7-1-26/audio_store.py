@@ -0,0 +1,144 @@
+# ================= AUDIO STORE (one file per content, atomic writes, size cap) =================
+# The Flask server used to synthesise every reply into fixed files in the working directory
+# (active.wav, output.wav): concurrent /api/chat requests and MQTT play_audio commands
+# overwrote each other before the ESP32 had fetched the file through /audio/<filename>.
+# Now the file name is a hash of the audio, so every reply gets its own file and identical
+# audio (fixed phrases from PhraseCache) always maps to the same name. Files are written to a
+# unique temp file and renamed, so the ESP32 never reads a half-written file. Since a name's
+# content never changes, /audio responses can be cached forever.
+#
+# The directory contents are tracked in an in-memory index (name -> size, LRU order) so /audio
+# and put() do not call os.path.exists per request. A background janitor removes the least
+# recently used files until the total is under max_bytes; files written or read within the
+# last `grace` seconds are left alone (the ESP32 may still be downloading them).
+# Fixed-name files from before this store that sit in the same directory can be passed as
+# `legacy`; /audio never serves them again, so they are removed by the initial scan. The old
+# active.wav/output.wav of this server lived in the working directory, outside the store, and
+# are deliberately not touched here.
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AudioStore:
+    def __init__(self, directory="static", fmt="wav", max_bytes=64 * 1024 * 1024, grace=120.0,
+                 legacy=()):
+        self.directory = directory
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._pattern = re.compile(rf"[0-9a-f]{{32}}\.{re.escape(fmt)}")
+        self._index = OrderedDict()  # name -> [size, last access], oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+        self._janitor = None
+        os.makedirs(directory, exist_ok=True)
+        self._scan(set(legacy))
+
+    def _scan(self, legacy):
+        """Build the index from the directory (mtime order); drop leftover temp and legacy files."""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                os.unlink(entry.path)
+            elif entry.name in legacy:
+                os.unlink(entry.path)
+                self.evictions += 1
+            elif self._pattern.fullmatch(entry.name):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._index[name] = [size, mtime]
+            self._size += size
+
+    def name(self, data):
+        return f"{hashlib.sha256(data).hexdigest()[:32]}.{self.fmt}"
+
+    def _touch(self, name):
+        entry = self._index.get(name)
+        if entry is not None:
+            entry[1] = time.time()
+            self._index.move_to_end(name)
+        return entry
+
+    def put(self, data):
+        """Store audio; return the unique file name for the play_audio command."""
+        name = self.name(data)
+        with self._lock:
+            if self._touch(name) is not None:
+                return name  # Same content → reuse the existing file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(self.directory, name))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            if self._touch(name) is None:  # Another thread may write the same content concurrently
+                self._index[name] = [len(data), time.time()]
+                self._size += len(data)
+                self.writes += 1
+        return name
+
+    def path(self, name):
+        """File path for /audio/<name> from the index, or None if unknown."""
+        with self._lock:
+            if self._touch(name) is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return os.path.join(self.directory, name)
+
+    def sweep(self):
+        """Remove LRU files until the total size <= max_bytes; return the number removed."""
+        victims = []
+        with self._lock:
+            cutoff = time.time() - self.grace
+            for name, (size, accessed) in list(self._index.items()):
+                if self._size <= self.max_bytes or accessed > cutoff:
+                    break  # LRU order: the rest is newer
+                del self._index[name]
+                self._size -= size
+                victims.append(name)
+            self.evictions += len(victims)
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        return len(victims)
+
+    def start_janitor(self, interval=30.0):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    evicted = self.sweep()
+                    if evicted:
+                        print(f"[AudioStore] Removed {evicted} files ({self._size // 1024} KB left)")
+                except Exception as e:
+                    print(f"[AudioStore] Janitor failed: {e}")
+        if self._janitor is None:
+            self._janitor = threading.Thread(target=run, name="audio-janitor", daemon=True)
+            self._janitor.start()
+        return self._janitor
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._index), "bytes": self._size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                    "writes": self.writes, "evictions": self.evictions}
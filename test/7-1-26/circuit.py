@@ -0,0 +1,168 @@
+# ================= CIRCUIT BREAKER =================
+# Saat Gemini lambat/down, jangan tunggu tiap request timeout dulu baru fallback.
+# closed    → semua panggilan lewat, error & timeout dihitung di jendela terakhir
+# open      → error rate lewat ambang: semua panggilan langsung ditolak (fallback lokal)
+#             selama cooldown detik
+# half_open → setelah cooldown, satu panggilan percobaan; sukses → closed, gagal → open lagi
+# Timeout dihitung sejak panggilan mulai jalan di thread (bukan sejak masuk antrean), dan
+# antrean dibatasi: kalau penuh atau terlalu lama antre, panggilan ditolak (CircuitBusyError)
+# tanpa pernah menyentuh backend dan tanpa dihitung sebagai kegagalan Gemini.
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBusyError(CircuitOpenError):
+    """Semua slot panggilan terpakai; ditolak lokal, bukan kegagalan backend."""
+
+
+class CircuitBreaker:
+    def __init__(self, name="gemini", failure_threshold=0.5, min_calls=5, window=20,
+                 cooldown=30.0, call_timeout=5.0, max_workers=8, max_queue=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.call_timeout = call_timeout
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.short_circuited = 0
+        self.timeouts = 0
+        self.trips = 0
+        self.rejected = 0
+        # Panggilan yang boleh ada sekaligus: yang jalan + yang antre (default antre = max_workers)
+        self.max_pending = max_workers + (max_workers if max_queue is None else max_queue)
+        self._pending = 0
+        self._outcomes = deque(maxlen=window)
+        self._probe_running = False
+        self._lock = threading.Lock()
+        # Thread terpisah supaya timeout per panggilan bisa ditegakkan
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-call")
+
+    def _before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(f"Circuit {self.name} open")
+                self.state = "half_open"
+                print(f"[Circuit] {self.name}: half-open, coba satu panggilan")
+            if self.state == "half_open":
+                if self._probe_running:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(f"Circuit {self.name} half-open (probe berjalan)")
+                self._probe_running = True
+
+    def _after_call(self, ok):
+        with self._lock:
+            self._outcomes.append(ok)
+            if self.state == "half_open":
+                self._probe_running = False
+                if ok:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    print(f"[Circuit] {self.name}: closed lagi")
+                else:
+                    self._trip()
+                return
+            failures = self._outcomes.count(False)
+            if (self.state == "closed" and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_threshold):
+                self._trip()
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected += 1
+            if self.state == "half_open":
+                self._probe_running = False  # Probe tidak jadi jalan
+        raise CircuitBusyError(f"Circuit {self.name}: {reason}")
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        print(f"[Circuit] {self.name}: OPEN selama {self.cooldown:.0f}s → fallback lokal")
+
+    def call(self, fn, *args, **kwargs):
+        self._before_call()
+        with self._lock:
+            full = self._pending >= self.max_pending
+            if not full:
+                self._pending += 1
+        if full:
+            self._reject("antrean penuh")
+        # copy_context: trace aktif (tracing.py) ikut ke thread pemanggil
+        context = contextvars.copy_context()
+        started = threading.Event()
+
+        def run():
+            started.set()
+            return context.run(fn, *args, **kwargs)
+
+        future = self._executor.submit(run)
+        future.add_done_callback(self._finished)
+        # Deadline baru dihitung saat panggilan mulai jalan; yang antre terlalu lama dibatalkan
+        # sebelum sempat jalan (backend tidak dipanggil sama sekali)
+        if not started.wait(self.call_timeout) and future.cancel():
+            self._reject(f"antre lebih dari {self.call_timeout}s")
+        try:
+            result = future.result(timeout=self.call_timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            self._after_call(False)
+            raise TimeoutError(f"{self.name} tidak menjawab dalam {self.call_timeout}s")
+        except Exception:
+            self._after_call(False)
+            raise
+        self._after_call(True)
+        return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Sama seperti call(), untuk coroutine function (server ASGI); tanpa thread tambahan."""
+        self._before_call()
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), self.call_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            self._after_call(False)
+            raise TimeoutError(f"{self.name} tidak menjawab dalam {self.call_timeout}s")
+        except asyncio.CancelledError:
+            with self._lock:
+                self._probe_running = False  # request dibatalkan, bukan kegagalan Gemini
+            raise
+        except Exception:
+            self._after_call(False)
+            raise
+        self._after_call(True)
+        return result
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "error_rate": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "window_calls": calls,
+                "trips": self.trips,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "pending": self._pending,
+                "short_circuited": self.short_circuited,
+                "call_timeout_s": self.call_timeout,
+                "cooldown_s": self.cooldown,
+            }
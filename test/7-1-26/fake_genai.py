@@ -0,0 +1,168 @@
+# ================= FAKE GEMINI (offline) =================
+# Pengganti google.generativeai / google.genai untuk benchmark tanpa kuota API & internet.
+# Aktifkan di server dengan GEMINI_FAKE=1. Perilaku diatur lewat env:
+#   FAKE_GEMINI_LATENCY_MS     median latency (default 800)
+#   FAKE_GEMINI_LATENCY_SIGMA  sebaran lognormal (default 0.5; 0 = konstan)
+#   FAKE_GEMINI_ERROR_RATE     peluang error per panggilan (default 0)
+#   FAKE_GEMINI_NAMES          nama penerima valid kalau prompt tidak membawa "Kandidat penerima"
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import struct
+import time
+
+LATENCY_MS = float(os.getenv('FAKE_GEMINI_LATENCY_MS', 800))
+LATENCY_SIGMA = float(os.getenv('FAKE_GEMINI_LATENCY_SIGMA', 0.5))
+ERROR_RATE = float(os.getenv('FAKE_GEMINI_ERROR_RATE', 0))
+NAMES = [n.strip().lower() for n in os.getenv('FAKE_GEMINI_NAMES', "aisyah,rabiathul,nadia").split(",") if n.strip()]
+MODELS = ["models/gemini-2.5-flash", "models/gemini-1.5-flash", "models/gemini-2.5-flash-preview-tts"]
+TTS_RATE = 24000
+
+_NAME_RE = re.compile(r"\b(" + "|".join(map(re.escape, NAMES)) + r")\b", re.IGNORECASE) if NAMES else None
+_BATCH_ITEM_RE = re.compile(r'^\d+\.\s+(".*")\s*$', re.MULTILINE)
+_CANDIDATES_RE = re.compile(r"Kandidat penerima:\s*(.*)\n\s*Ucapan:\s*(.*)", re.DOTALL)
+
+
+class FakeGeminiError(Exception):
+    pass
+
+
+def _latency():
+    delay = LATENCY_MS / 1000.0
+    if LATENCY_SIGMA > 0:
+        delay *= random.lognormvariate(0, LATENCY_SIGMA)
+    return delay
+
+
+def _maybe_fail():
+    if random.random() < ERROR_RATE:
+        raise FakeGeminiError("503 Service Unavailable (fake)")
+
+
+def _simulate_call():
+    time.sleep(_latency())
+    _maybe_fail()
+
+
+def decide(utterance):
+    """Keputusan kaleng, bentuknya sama dengan JSON dari prompt Smart Package Box."""
+    retrieved = _CANDIDATES_RE.search(utterance)
+    text = (retrieved.group(2) if retrieved else utterance).lower()
+    if "hallo" in text or "halo" in text:
+        return {"action": "wake", "tts": "Permisi, ada paket. Dengan siapa saya berbicara?"}
+    if retrieved:
+        # Kandidat sudah disaring server (mirip ucapan) → anggap kandidat pertama yang dimaksud
+        candidates = [n.strip() for n in retrieved.group(1).split(",") if n.strip() not in ("", "-")]
+        name = candidates[0] if candidates else None
+    else:
+        match = _NAME_RE.search(text) if _NAME_RE else None
+        name = match.group(1) if match else None
+    if name:
+        name = name.capitalize()
+        return {"action": "open", "name": name, "tts": f"Baik, paket atas nama {name}. Silakan diambil."}
+    if not re.search(r"[a-z]{3,}", text):
+        return {"action": "ask_name", "message": "Paket atas nama siapa ya?",
+                "tts": "Permisi, ada paket. Dengan siapa saya berbicara?"}
+    return {"action": "deny", "message": "Maaf, nama tidak terdaftar.",
+            "tts": "Maaf, nama tersebut tidak terdaftar pada paket ini."}
+
+
+def _answer(contents, system_instruction):
+    prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+    items = _BATCH_ITEM_RE.findall(prompt)
+    if items and "JSON array" in prompt:
+        return json.dumps([decide(json.loads(item)) for item in items], ensure_ascii=False)
+    if system_instruction and "JSON" in system_instruction:
+        return json.dumps(decide(prompt), ensure_ascii=False)
+    return f"(fake) Jawaban singkat untuk: {prompt.strip()[-120:]}"
+
+
+def fake_pcm(text, rate=TTS_RATE):
+    """PCM 16-bit mono: nada 440 Hz, ~60 ms per karakter."""
+    samples = int(rate * min(10.0, 0.06 * max(1, len(text))))
+    step = 2 * math.pi * 440 / rate
+    return struct.pack(f"<{samples}h", *(int(8000 * math.sin(i * step)) for i in range(samples)))
+
+
+# ---------- permukaan google.generativeai ----------
+class _ModelInfo:
+    def __init__(self, name):
+        self.name = name
+        self.display_name = name.split("/")[-1]
+        self.description = "Fake Gemini model (offline)"
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+
+
+def configure(**kwargs):
+    pass
+
+
+def list_models():
+    return [_ModelInfo(name) for name in MODELS]
+
+
+class GenerativeModel:
+    def __init__(self, model_name, system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        _simulate_call()
+        text = _answer(contents, self.system_instruction)
+        if stream:
+            return self._stream(text)
+        return _Response(text)
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs):
+        await asyncio.sleep(_latency())
+        _maybe_fail()
+        return _Response(_answer(contents, self.system_instruction))
+
+    def _stream(self, text, chunk_size=16, chunk_delay=0.02):
+        for i in range(0, len(text), chunk_size):
+            if i:
+                time.sleep(chunk_delay)
+            yield _Response(text[i:i + chunk_size])
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class types:
+    """Pengganti genai.types / google.genai.types (cukup untuk menyimpan argumen)."""
+    GenerationConfig = _Namespace
+    GenerateContentConfig = _Namespace
+    SpeechConfig = _Namespace
+    VoiceConfig = _Namespace
+    PrebuiltVoiceConfig = _Namespace
+
+
+# ---------- permukaan google.genai.Client (TTS) ----------
+class _Models:
+    def generate_content(self, model, contents, config=None):
+        _simulate_call()
+        wants_audio = config is not None and "AUDIO" in (getattr(config, "response_modalities", None) or [])
+        if not wants_audio:
+            return _Response(_answer(contents, None))
+        part = _Namespace(inline_data=_Namespace(data=fake_pcm(str(contents)), mime_type=f"audio/L16;rate={TTS_RATE}"))
+        response = _Response("")
+        response.candidates = [_Namespace(content=_Namespace(parts=[part]))]
+        return response
+
+
+class Client:
+    def __init__(self, api_key=None, **kwargs):
+        self.models = _Models()
+
+    def list_models(self):
+        return list_models()
@@ -0,0 +1,176 @@
+"""Latency-aware router over several Gemini models with optional hedged requests."""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class ModelStats:
+    """Rolling latency and error window for one model."""
+
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True = success
+        self.calls = 0
+        self.errors = 0
+        self.backup_wins = 0  # won while not the first choice (hedge or failover)
+        self.unhealthy_until = 0.0
+
+    def record(self, latency, ok):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+
+class ModelRouter:
+    """Drop-in for a GenerativeModel: generate_content() goes to the fastest healthy model.
+
+    Each response carries `model_used`, the model that actually answered that call.
+    """
+
+    def __init__(self, window=50, hedge=True, hedge_percentile=0.95, default_hedge_delay=2.0,
+                 min_samples=5, error_threshold=0.5, cooldown=30.0, max_workers=8):
+        self.window = window
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_samples = min_samples
+        self.error_threshold = error_threshold
+        self.cooldown = cooldown
+        self.models = {}
+        self.stats_by_model = {}
+        self.last_model = None
+        self.hedged = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-router")
+
+    def __contains__(self, name):
+        return name in self.models
+
+    @property
+    def names(self):
+        return list(self.models)
+
+    def add(self, name, model):
+        self.models[name] = model
+        self.stats_by_model[name] = ModelStats(self.window)
+
+    def ranked(self):
+        """Healthy models first, fastest p50 first; unmeasured models get tried early."""
+        now = time.monotonic()
+
+        def key(name):
+            stats = self.stats_by_model[name]
+            unhealthy = stats.unhealthy_until > now
+            p50 = stats.percentile(0.5)
+            return (unhealthy, p50 is not None, p50 or 0.0)
+
+        return sorted(self.models, key=key)
+
+    def _call(self, name, args, kwargs):
+        started = time.monotonic()
+        try:
+            response = self.models[name].generate_content(*args, **kwargs)
+        except Exception:
+            self._record(name, time.monotonic() - started, False)
+            raise
+        self._record(name, time.monotonic() - started, True)
+        return name, response
+
+    def _record(self, name, latency, ok):
+        with self._lock:
+            stats = self.stats_by_model[name]
+            stats.record(latency, ok)
+            if (len(stats.outcomes) >= self.min_samples
+                    and stats.error_rate() >= self.error_threshold
+                    and stats.unhealthy_until < time.monotonic()):
+                stats.unhealthy_until = time.monotonic() + self.cooldown
+                print(f"[AI] Model {name} marked unhealthy for {self.cooldown:.0f}s "
+                      f"(error rate {stats.error_rate():.0%})")
+
+    def _hedge_delay(self, name):
+        stats = self.stats_by_model[name]
+        if len(stats.latencies) < self.min_samples:
+            return self.default_hedge_delay
+        return stats.percentile(self.hedge_percentile)
+
+    def generate_content(self, *args, **kwargs):
+        order = self.ranked()
+        if not order:
+            raise RuntimeError("No Gemini model registered")
+        last_error = None
+        pending = {}
+        index = 0
+
+        def launch():
+            nonlocal index
+            name = order[index]
+            index += 1
+            pending[self._executor.submit(self._call, name, args, kwargs)] = name
+
+        launch()
+        hedge_delay = self._hedge_delay(order[0])
+        while pending:
+            timeout = hedge_delay if self.hedge and index < len(order) and len(pending) == 1 else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than its usual p95: fire a hedged request at the next model
+                with self._lock:
+                    self.hedged += 1
+                print(f"[AI] Hedging: {order[index - 1]} > {hedge_delay:.2f}s, also asking {order[index]}")
+                launch()
+                continue
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    used, response = future.result()
+                except Exception as e:
+                    print(f"[AI] Model {name} failed: {e}")
+                    last_error = e
+                    continue
+                if index > 1 and used != order[0]:
+                    with self._lock:
+                        self.stats_by_model[used].backup_wins += 1
+                self.last_model = used  # For /health only; concurrent calls overwrite it
+                response.model_used = used  # Per-call answer to "which model replied?"
+                return response
+            if not pending and index < len(order):
+                launch()  # Every in-flight call failed: fall through to the next model
+        raise last_error
+
+    def stats(self):
+        now = time.monotonic()
+        models = {}
+        for name in self.ranked():
+            stats = self.stats_by_model[name]
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            models[name] = {
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'error_rate': round(stats.error_rate(), 3),
+                'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+                'healthy': stats.unhealthy_until <= now,
+                'backup_wins': stats.backup_wins,
+            }
+        return {
+            'preferred': self.ranked()[0] if self.models else None,
+            'last_model': self.last_model,
+            'hedging': self.hedge,
+            'hedged_requests': self.hedged,
+            'models': models,
+        }
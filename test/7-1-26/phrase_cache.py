@@ -0,0 +1,141 @@
+# ================= PHRASE CACHE (audio TTS siap pakai) =================
+# Sebagian besar jawaban adalah kalimat tetap ("Permisi, ada paket...", sapaan boot, "Maaf,
+# nama tersebut tidak terdaftar..."), tapi dulu tiap kali disintesis ulang lewat gTTS/Gemini.
+# Cache ini menyimpan hasil render (bytes WAV) dengan key hash(teks, suara, sample rate,
+# format): hit = nol sintesis. Frasa yang di-warm saat startup di-pin, sisanya LRU dengan
+# batas ukuran total (max_bytes). Kalau `directory` diisi, file juga disimpan di disk supaya
+# restart langsung hangat.
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class PhraseCache:
+    def __init__(self, max_bytes=32 * 1024 * 1024, voice="id", rate=16000, fmt="wav", directory=None):
+        self.max_bytes = max_bytes
+        self.voice = voice
+        self.rate = rate
+        self.fmt = fmt
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> bytes, paling lama di depan
+        self._pinned = set()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._rendering = {}  # key -> Lock, supaya teks yang sama tidak disintesis dua kali
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def key(self, text):
+        raw = f"{self.voice}|{self.rate}|{self.fmt}|{' '.join(text.split())}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.fmt}")
+
+    def _load(self):
+        suffix = f".{self.fmt}"
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".tmp"):
+                os.unlink(os.path.join(self.directory, name))  # Sisa tulis yang terputus
+            elif name.endswith(suffix):
+                with open(os.path.join(self.directory, name), "rb") as f:
+                    self._store(name[:-len(suffix)], f.read())
+
+    def get(self, text):
+        key = self.key(text)
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, text, data, pin=False):
+        key = self.key(text)
+        tmp = None
+        if self.directory:
+            # Tulis ke temp file unik di luar lock; rename + publish entri di bawah lock yang sama
+            # dengan eviction, jadi file di disk selalu sesuai isi index (tidak ada file yatim)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        with self._lock:
+            if tmp:
+                os.replace(tmp, self._path(key))
+            if pin:
+                self._pinned.add(key)
+            self._store(key, data)
+
+    def _store(self, key, data):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._data[key] = data
+        self._size += len(data)
+        # Buang yang paling lama tidak dipakai sampai muat; frasa pinned dilewati
+        for victim in list(self._data):
+            if self._size <= self.max_bytes:
+                break
+            if victim in self._pinned or victim == key:
+                continue
+            self._size -= len(self._data.pop(victim))
+            self.evictions += 1
+            if self.directory:
+                try:
+                    os.remove(self._path(victim))
+                except OSError:
+                    pass
+
+    def render(self, text, synthesize, pin=False):
+        """Bytes audio untuk `text`: dari cache, atau synthesize(text) sekali lalu disimpan."""
+        key = self.key(text)
+        if pin:
+            with self._lock:
+                self._pinned.add(key)  # Termasuk yang sudah ada dari disk
+        data = self.get(text)
+        if data is not None:
+            return data
+        with self._lock:
+            lock = self._rendering.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                data = self._data.get(key)  # Sudah dirender thread lain selagi menunggu
+                if data is not None:
+                    self.hits += 1
+            if data is None:
+                data = synthesize(text)
+                self.put(text, data, pin=pin)
+        with self._lock:
+            self._rendering.pop(key, None)
+        return data
+
+    def warm(self, phrases, synthesize):
+        """Render frasa tetap di background (di-pin); gagal satu tidak menghentikan yang lain."""
+        def run():
+            for text in phrases:
+                try:
+                    self.render(text, synthesize, pin=True)
+                except Exception as e:
+                    print(f"[PhraseCache] Gagal warm '{text}': {e}")
+            print(f"[PhraseCache] {len(phrases)} frasa siap ({self._size // 1024} KB)")
+        thread = threading.Thread(target=run, name="phrase-warm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "pinned": len(self._pinned), "bytes": self._size,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions}